@@ -7,16 +7,24 @@ from src.exception import CustomException
 from src.logger import logging
 
 # for creating web app
-from flask import Flask, render_template, request, redirect, url_for
-# for working with dataframes and arrays
-import pandas as pd
+from flask import Flask, render_template, request, redirect, url_for, jsonify, Response, g
+# for timing requests
+import time
+# for working with request bodies and arrays
+# (sklearn is not imported here: unpickling the saved artifacts imports only the estimator modules they need)
+import io
 import numpy as np
-# for data processing
-from sklearn.preprocessing import StandardScaler
 # for transforming the user input (front-end) in to required format
 from src.pipeline.predict_pipeline import CustomData
+from src.pipeline.predict_pipeline import CustomBatchData
 # for making predictions
 from src.pipeline.predict_pipeline import PredictPipeline
+# for monitoring the cached model & preprocessor
+from src.pipeline.artifact_cache import artifact_cache
+# for request & per-stage latency metrics and the sampling profiler
+from src.metrics import metrics, profiler, get_process_memory
+# for coalescing concurrent single record predictions into batches
+from src.pipeline.micro_batcher import MicroBatcher
 
 
 
@@ -26,6 +34,57 @@ application = Flask(__name__)
 # assign instance to `app` variable for ease of use
 app = application
 
+# the sampling profiler endpoint is only served if enabled (PROFILER_ENABLED=1)
+PROFILER_ENABLED = os.environ.get("PROFILER_ENABLED", "0") == "1"
+
+# micro-batching serving mode (PREDICT_BATCHING=1): concurrent `/predict_data` requests arriving
+# within BATCH_MAX_WAIT_MS milliseconds (up to BATCH_MAX_SIZE records) share one transform/predict call
+# (trades up to BATCH_MAX_WAIT_MS of extra latency for throughput under concurrent load)
+micro_batcher = None
+if os.environ.get("PREDICT_BATCHING", "0") == "1":
+    micro_batcher = MicroBatcher(
+        predict_function=PredictPipeline().predict_records,
+        max_batch_size=int(os.environ.get("BATCH_MAX_SIZE", 64)),
+        max_wait=float(os.environ.get("BATCH_MAX_WAIT_MS", 2)) / 1000
+    )
+
+
+# REQUEST METRICS
+@app.before_request
+def start_request_timer():
+    g.request_start_time = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    endpoint = request.endpoint or "not_found"
+    metrics.observe("request_duration_seconds", time.perf_counter() - g.request_start_time,
+                    help_text="Total time spent handling a request",
+                    endpoint=endpoint)
+    metrics.increment("requests_total", help_text="Number of handled requests",
+                      endpoint=endpoint, method=request.method, status=response.status_code)
+    return response
+
+# artifact cache counters exposed alongside the request metrics
+def collect_artifact_cache_metrics():
+    for name, value in artifact_cache.get_stats().items():
+        yield (f"artifact_cache_{name}_total", "counter",
+               f"Number of artifact cache {name}", {}, value)
+
+    # version being served (1 for the served version)
+    yield ("artifact_version_info", "gauge", "Artifact version being served",
+           {"version": artifact_cache.get_served_version()}, 1)
+
+metrics.register_collector(collect_artifact_cache_metrics)
+
+# memory of the process serving the scrape (per worker in a pre-fork server)
+def collect_process_memory_metrics():
+    pid = os.getpid()
+    for kind, value in get_process_memory().items():
+        yield ("process_memory_bytes", "gauge",
+               "Memory of the serving process (rss, pss, shared, private)", {"kind": kind, "pid": pid}, value)
+
+metrics.register_collector(collect_process_memory_metrics)
+
 
 # HOME PAGE
 @app.route("/", methods=["GET", "POST"])
@@ -45,40 +104,184 @@ def predict_data():
 
     # if user has submitted the input data via the forms in home page
     elif request.method == "POST":
-        gender = request.form.get("gender")
-        race_ethnicity = request.form.get("race_ethnicity")
-        parental_level_of_education = request.form.get("parental_level_of_education")
-        lunch = request.form.get("lunch")
-        test_preparation_course = request.form.get("test_preparation_course")
-        math_score = request.form.get("math_score")
-        reading_score = request.form.get("reading_score")
+        with metrics.time_stage("parse_form"):
+            gender = request.form.get("gender")
+            race_ethnicity = request.form.get("race_ethnicity")
+            parental_level_of_education = request.form.get("parental_level_of_education")
+            lunch = request.form.get("lunch")
+            test_preparation_course = request.form.get("test_preparation_course")
+            math_score = request.form.get("math_score")
+            reading_score = request.form.get("reading_score")
 
         # custom data
-        data = CustomData(
-            gender=gender,
-            race_ethnicity=race_ethnicity,
-            parental_level_of_education=parental_level_of_education,
-            lunch=lunch,
-            test_preparation_course=test_preparation_course,
-            math_score=math_score,
-            reading_score=reading_score
-        )
-        # convert data into dataframe
-        data_df = data.get_data_as_dataframe()
+        with metrics.time_stage("build_record"):
+            data = CustomData(
+                gender=gender,
+                race_ethnicity=race_ethnicity,
+                parental_level_of_education=parental_level_of_education,
+                lunch=lunch,
+                test_preparation_course=test_preparation_course,
+                math_score=math_score,
+                reading_score=reading_score
+            )
+            # convert data into a dict of input features (no dataframe needed for a single record)
+            data_record = data.get_data_as_dict()
 
         logging.info("Successfully fetched user inputs from front-end in its required format")
         
-        # create prediction pipeline object
-        prediction_pipeline = PredictPipeline()
+        if micro_batcher is not None:
+            # predicted together with the other requests of the current batch window
+            prediction = micro_batcher.predict(record=data_record)
+        else:
+            # create prediction pipeline object
+            prediction_pipeline = PredictPipeline()
 
-        # get model's prediction from the user input
-        prediction = (prediction_pipeline.predict(features=data_df))[0] # model prediction is a list with one item (the actual prediction)
+            # get model's prediction from the user input
+            prediction = (prediction_pipeline.predict_record(record=data_record))[0] # model prediction is a list with one item (the actual prediction)
         # round off predicted average score
         prediction = round(prediction, ndigits=2)
 
         logging.info(msg="Model's Prediction for user-input obtained successfully")
 
-        return render_template("home.html", results=prediction)
+        with metrics.time_stage("render_template"):
+            return render_template("home.html", results=prediction)
+
+
+# helper function to get the exception wrapped by (nested) `CustomException`s
+def _get_original_error(error:Exception):
+    while isinstance(error, CustomException) and error.args and isinstance(error.args[0], Exception):
+        error = error.args[0]
+    return error
+
+# helper function to answer a server-side failure (details are only logged)
+def _internal_error_response(msg:str):
+    logging.exception(msg=msg)
+    return jsonify({"error": "Internal server error"}), 500
+
+
+# BATCH PREDICTION API
+@app.route("/api/predict_batch", methods=["POST"])
+def predict_batch():
+    """
+    Scores many students in a single request.
+
+    Input (any one of) ->
+    - JSON body: list of records, or {"records": [...]}
+    - uploaded CSV file in the `file` form field
+    - raw CSV body with `Content-Type: text/csv`
+    (columns follow the `stud.csv` schema, extra columns are ignored)
+
+    Output ->
+    JSON {"count": n, "predictions": [...]} by default, or the
+    input rows with a `predicted_avg_score` column as CSV when
+    `?format=csv` is passed or `text/csv` is accepted.
+
+    Errors ->
+    400 {"error": ...} for an unreadable batch or missing columns,
+    with "invalid_records" (index & reason) if some records cannot
+    be scored; 500 for server-side failures (details are only logged).
+    """
+    try:
+        # parse the input batch
+        parse_start_time = time.perf_counter()
+        if request.is_json:
+            payload = request.get_json()
+            records = payload.get("records") if isinstance(payload, dict) else payload
+            batch_data = CustomBatchData.from_records(records=records)
+        elif "file" in request.files:
+            batch_data = CustomBatchData.from_csv(file_object=request.files["file"])
+        elif request.mimetype == "text/csv":
+            batch_data = CustomBatchData.from_csv(file_object=io.BytesIO(request.get_data()))
+        else:
+            return jsonify({"error": "Send JSON records, a CSV file upload or a text/csv body"}), 400
+
+        batch_df = batch_data.get_data_as_dataframe(coerce_numbers=True)
+        metrics.observe("stage_duration_seconds", time.perf_counter() - parse_start_time,
+                        help_text="Time spent in each stage of the prediction path",
+                        stage="parse_batch")
+
+    except CustomException as e:
+        # unreadable body, missing columns... -> the client's error (without the server-side details)
+        input_error = _get_original_error(e)
+        if not isinstance(input_error, ValueError):
+            return _internal_error_response(msg="Batch prediction request failed")
+        logging.info(msg=f"Batch prediction request rejected: {input_error}")
+        return jsonify({"error": str(input_error)}), 400
+
+    try:
+        # records the served preprocessor cannot transform (unknown categories, scores which are not numbers)
+        row_errors = PredictPipeline().check_batch(batch_data=batch_data, features_df=batch_df)
+        invalid_records = [{"index": i, "error": row_error}
+                           for i, row_error in enumerate(row_errors) if row_error is not None]
+        if invalid_records:
+            logging.info(msg=f"Batch prediction request rejected: {len(invalid_records)} invalid records")
+            return jsonify({"error": "Some records cannot be scored", "invalid_records": invalid_records}), 400
+
+        # a single vectorized transform & predict for the whole batch
+        predictions = PredictPipeline().predict(features=batch_df)
+
+    except CustomException:
+        return _internal_error_response(msg="Batch prediction failed")
+
+    logging.info(msg=f"Model's Predictions for a batch of {len(batch_df)} records obtained successfully")
+
+    # respond as CSV
+    output_format = request.args.get("format")
+    if output_format == "csv" or (output_format is None and request.accept_mimetypes.best == "text/csv"):
+        batch_df["predicted_avg_score"] = predictions
+        return Response(batch_df.to_csv(index=False), mimetype="text/csv")
+
+    # respond as JSON
+    return jsonify({
+        "count": len(predictions),
+        "predictions": np.asarray(predictions, dtype=float).tolist()
+    })
+
+
+# ARTIFACT CACHE STATS
+@app.route("/api/artifact_cache", methods=["GET"])
+def artifact_cache_stats():
+    # hit/miss/reload counters of the cached model & preprocessor and the version being served
+    return jsonify({**artifact_cache.get_stats(), "version": artifact_cache.get_served_version()})
+
+
+# WORKER INFO
+@app.route("/api/worker", methods=["GET"])
+def worker_info():
+    # process id & memory of the worker which served this request
+    return jsonify({"pid": os.getpid(), "memory_bytes": get_process_memory()})
+
+
+# PROMETHEUS METRICS
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    # request counts, request & per-stage latency histograms, artifact cache counters
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+# SAMPLING PROFILER
+@app.route("/debug/profiler", methods=["GET", "POST"])
+def sampling_profiler():
+    """
+    POST `?action=start` / `?action=stop` toggles the sampling profiler,
+    GET returns the sampled call stacks (collapsed stack format,
+    `?limit=n` for the n most frequent stacks).
+    """
+    if not PROFILER_ENABLED:
+        return jsonify({"error": "Sampling profiler is disabled (set PROFILER_ENABLED=1)"}), 404
+
+    if request.method == "POST":
+        action = request.args.get("action")
+        if action == "start":
+            profiler.start()
+        elif action == "stop":
+            profiler.stop()
+        else:
+            return jsonify({"error": "`action` must be `start` or `stop`"}), 400
+        return jsonify({"running": profiler.is_running(), "samples": profiler.n_samples})
+
+    limit = request.args.get("limit", type=int)
+    return Response(profiler.get_report(limit=limit), mimetype="text/plain")
 
 
 
@@ -0,0 +1,97 @@
+# GUNICORN CONFIG
+# production (pre-fork) server for the web app:
+#   gunicorn -c gunicorn.conf.py application:application
+#
+# the parent process imports the app and loads the artifacts once, then forks the workers
+# -> the model & preprocessor pages are shared copy-on-write instead of loaded once per worker
+#
+# a newly published artifact version (see `src/pipeline/artifact_registry.py`) is loaded & warmed up
+# by each worker in the background and swapped in without a restart; a HUP restart is only needed
+# to share the new version copy-on-write again
+#
+# graceful restarts:
+#   kill -HUP <parent pid>   -> new workers are forked (with the current artifacts), old ones finish their requests
+#   kill -TERM <parent pid>  -> stop accepting requests, finish the running ones (up to `graceful_timeout`)
+#
+# logging: every worker has its own log handler, so log to stderr (LOG_DESTINATION=stderr, collected
+# together with gunicorn's own logs) or rotate `logs/ml.log` externally (LOG_ROTATION=external + logrotate)
+#
+# metrics: every worker has its own metrics registry and a scrape of `/metrics` reaches any one of them,
+# so set PROMETHEUS_MULTIPROC_DIR (an empty directory, cleared on start) -> every worker saves its metrics
+# there and `/metrics` returns the sum over all workers (see `src/metrics.py`)
+
+import os
+import gc
+import shutil
+
+# address to listen on
+bind = f"0.0.0.0:{os.environ.get('PORT', 8080)}"
+
+# number of worker processes (default: one per core) & threads per worker
+workers = int(os.environ.get("WEB_WORKERS", os.cpu_count() or 1))
+threads = int(os.environ.get("WEB_THREADS", 4))
+worker_class = "gthread"
+
+# import the app (and load the artifacts, see `when_ready`) in the parent before forking
+# (WEB_PRELOAD=0 -> every worker imports the app & loads the artifacts itself)
+preload_app = os.environ.get("WEB_PRELOAD", "1") == "1"
+
+# seconds a worker gets to finish its requests on restart / shutdown
+graceful_timeout = int(os.environ.get("GRACEFUL_TIMEOUT", 30))
+timeout = int(os.environ.get("WORKER_TIMEOUT", 60))
+
+# restart a worker after this many requests (0 -> never)
+max_requests = int(os.environ.get("MAX_REQUESTS", 0))
+max_requests_jitter = max_requests // 10
+
+
+def _load_artifacts(server):
+    """
+    Loads the artifacts in the parent process and
+    freezes the garbage collector, so that the
+    objects are not touched (copied) by the workers'
+    garbage collection.
+    """
+    from src.pipeline.predict_pipeline import PredictPipeline
+
+    PredictPipeline().warm_up()
+    gc.collect()
+    gc.freeze()
+    server.log.info("Artifacts loaded in the parent process, %d objects frozen", gc.get_freeze_count())
+
+
+def on_starting(server):
+    # counters of a previous run must not be added to the new ones
+    multiprocess_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if multiprocess_dir:
+        shutil.rmtree(multiprocess_dir, ignore_errors=True)
+        os.makedirs(multiprocess_dir)
+
+
+def when_ready(server):
+    if preload_app:
+        _load_artifacts(server)
+
+
+def pre_fork(server, worker):
+    # switches to the current artifact version only if it changed (e.g. before a HUP restart)
+    if preload_app:
+        _load_artifacts(server)
+
+
+def post_fork(server, worker):
+    server.log.info("Worker %s started", worker.pid)
+
+
+def worker_exit(server, worker):
+    # last snapshot of the worker's metrics (they keep counting in the sum)
+    from src.metrics import metrics
+    if metrics.multiprocess_dir is not None:
+        metrics.flush()
+
+
+def child_exit(server, worker):
+    # gauges (e.g. memory) of an exited worker are no longer reported
+    from src.metrics import metrics
+    if metrics.multiprocess_dir is not None:
+        metrics.mark_process_dead(worker.pid)
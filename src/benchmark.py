@@ -0,0 +1,378 @@
+# DEPENDENCIES
+
+# for working with file paths, custom exception and custom logging
+import os
+import sys
+from src.exception import CustomException
+from src.logger import logging
+# for parsing command line arguments
+import argparse
+# for timing & describing the benchmark environment
+import time
+import json
+import platform
+import statistics
+import subprocess
+from datetime import datetime
+# for the temporary working directory of a run
+import tempfile
+import shutil
+# for working with dataframes and arrays
+import numpy as np
+import pandas as pd
+import sklearn
+
+# code paths being benchmarked
+from src.components.data_ingestion import DataIngestion
+from src.components.data_transformation import DataTransformation
+from src.components.model_trainer import ModelTrainer
+from src.components.model_trainer import create_model
+from src.pipeline.predict_pipeline import PredictPipeline
+from src.pipeline.tree_ensemble import FlatTreeEnsemble
+from src.utils import evaluate_model, load_object
+
+
+# default source dataset
+SOURCE_DATA_PATH = os.path.join("notebook", "data", "stud.csv")
+
+
+# helper function to build an upscaled copy of the dataset
+def make_upscaled_dataset(df:pd.DataFrame, scale:int, random_state:int=0):
+    """
+    Returns a synthetic copy of the dataset with
+    `scale` times as many rows: rows are sampled with
+    replacement and the scores are jittered by a few
+    points (clipped to 0-100) so that the copy is not
+    just the same rows repeated.
+
+    Input Parameters ->
+    `df`: (dataframe) source dataset (`stud.csv` schema)
+    `scale`: (int) row multiplier (1 returns the dataset unchanged)
+    `random_state`: (int) seed for the sampling & jitter
+    """
+    if scale == 1:
+        return df.copy()
+
+    random_generator = np.random.default_rng(random_state)
+    upscaled_df = df.sample(n=len(df) * scale, replace=True,
+                            random_state=random_state).reset_index(drop=True)
+    for column in ("math_score", "reading_score", "writing_score"):
+        jitter = random_generator.integers(-3, 4, size=len(upscaled_df))
+        upscaled_df[column] = np.clip(upscaled_df[column] + jitter, 0, 100)
+
+    return upscaled_df
+
+
+# helper function to time a function call
+def time_call(function, repeat:int=3, number:int=1):
+    """
+    Calls `function` `number` times per repetition
+    and returns the seconds per call of every repetition
+    (and the return value of the last call).
+
+    Input Parameters ->
+    `function`: function without arguments
+    `repeat`: (int) number of repetitions
+    `number`: (int) number of calls per repetition
+    """
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        for _ in range(number):
+            result = function()
+        timings.append((time.perf_counter() - start_time) / number)
+    return timings, result
+
+
+# helper function to describe the benchmark environment
+def get_environment():
+    """
+    Returns the versions, platform & git commit
+    the benchmark was run with.
+    """
+    try:
+        git_commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                                    capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        git_commit = None
+
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "sklearn": sklearn.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count()
+    }
+
+
+# BENCHMARK SUITE
+class BenchmarkSuite:
+    """
+    Times the training & inference hot paths on the
+    source dataset and upscaled copies of it:
+
+    - `DataIngestion.initiate_data_ingestion`
+    - `DataTransformation.initiate_data_transformation`
+    - `evaluate_model`, separately for each model family
+    - `PredictPipeline.predict` & `predict_record` for single rows and batches
+    - each tree model family's `predict` against its `FlatTreeEnsemble`
+
+    All artifacts of a run are written to a temporary
+    directory, the project's `artifact` folder is only
+    read (trained model & preprocessor for inference).
+    """
+    # variables
+    def __init__(self, scales:list=(1, 10, 100, 1000), repeat:int=3,
+                 full_grid:bool=False, max_model_rows:int=100_000,
+                 source_data_path:str=SOURCE_DATA_PATH):
+        self.scales = scales
+        self.repeat = repeat
+        # full parameter grids of `ModelTrainer`, otherwise only the first parameter set of each model
+        self.full_grid = full_grid
+        # model search is skipped for datasets with more rows than this
+        self.max_model_rows = max_model_rows
+        self.source_data_path = source_data_path
+        # benchmark name -> result dict
+        self.results = {}
+
+    # methods
+    def _record(self, name:str, timings:list, **extra):
+        self.results[name] = {
+            "seconds": timings,
+            "min": min(timings),
+            "median": statistics.median(timings),
+            **extra
+        }
+        logging.info(msg=f"Benchmark {name}: min {self.results[name]['min']:.6f}s, median {self.results[name]['median']:.6f}s")
+        print(f"{name:<55} min {self.results[name]['min']:>11.6f}s  median {self.results[name]['median']:>11.6f}s")
+
+    def _get_parameters(self):
+        """
+        Returns the parameter grids used for the model benchmarks.
+        """
+        parameters = ModelTrainer().get_parameters()
+        if self.full_grid:
+            return parameters
+        return {
+            model_name: {name: values[:1] for name, values in grid.items()}
+            for model_name, grid in parameters.items()
+        }
+
+    def run_training(self, work_dir:str, scale:int, source_df:pd.DataFrame):
+        """
+        Times ingestion, transformation & model search at one scale.
+        """
+        prefix = f"scale_{scale}"
+        source_path = os.path.join(work_dir, "source.csv")
+        make_upscaled_dataset(source_df, scale=scale).to_csv(source_path, index=False)
+
+        # data ingestion (reads the upscaled csv, writes raw/train/test into the working directory)
+        data_ingestion = DataIngestion()
+        ingestion_config = data_ingestion.ingestion_config
+        ingestion_config.source_data_path = source_path
+        ingestion_config.raw_data_path = os.path.join(work_dir, "raw.csv")
+        ingestion_config.train_data_path = os.path.join(work_dir, "train.csv")
+        ingestion_config.test_data_path = os.path.join(work_dir, "test.csv")
+        timings, (train_path, test_path) = time_call(data_ingestion.initiate_data_ingestion, repeat=self.repeat)
+        n_rows = len(source_df) * scale
+        self._record(f"{prefix}/data_ingestion", timings, rows=n_rows)
+
+        # data transformation
+        data_transformation = DataTransformation()
+        transformation_config = data_transformation.data_transformation_config
+        transformation_config.preprocessor_object_file_path = os.path.join(work_dir, "preprocessor.pkl")
+        transformation_config.transformed_data_dir_path = os.path.join(work_dir, "transformed")
+        timings, (X_train, y_train, X_test, y_test, _) = time_call(
+            lambda: data_transformation.initiate_data_transformation(train_path=train_path, test_path=test_path),
+            repeat=self.repeat
+        )
+        self._record(f"{prefix}/data_transformation", timings, rows=n_rows)
+
+        # model search, one model family at a time
+        if X_train.shape[0] > self.max_model_rows:
+            print(f"{prefix}/evaluate_model skipped ({X_train.shape[0]} training rows > {self.max_model_rows})")
+            return
+
+        models = ModelTrainer().get_models()
+        parameters = self._get_parameters()
+        for model_name, model in models.items():
+            timings, _ = time_call(
+                lambda: evaluate_model(X_train=X_train, y_train=y_train, X_test=X_test, y_test=y_test,
+                                       models={model_name: model}, params={model_name: parameters[model_name]},
+                                       n_jobs=1),
+                repeat=self.repeat
+            )
+            self._record(f"{prefix}/evaluate_model/{model_name}", timings, rows=n_rows,
+                         full_grid=self.full_grid)
+
+    def run_inference(self, source_df:pd.DataFrame):
+        """
+        Times single row & batch predictions with the saved artifacts.
+        """
+        prediction_pipeline = PredictPipeline()
+        input_df = source_df.drop(columns=["writing_score"])
+        records = input_df.to_dict(orient="records")
+
+        # warm up the artifact cache so that only prediction is timed
+        prediction_pipeline.predict(features=input_df.head(1))
+        prediction_pipeline.predict_record(record=records[0])
+
+        single_row_df = input_df.head(1)
+        timings, _ = time_call(lambda: prediction_pipeline.predict(features=single_row_df),
+                               repeat=self.repeat, number=200)
+        self._record("predict/single_row_dataframe", timings, rows=1)
+
+        timings, _ = time_call(lambda: prediction_pipeline.predict_record(record=records[0]),
+                               repeat=self.repeat, number=200)
+        self._record("predict/single_row_record", timings, rows=1)
+
+        for scale in self.scales:
+            batch_df = make_upscaled_dataset(source_df, scale=scale).drop(columns=["writing_score"])
+            timings, _ = time_call(lambda: prediction_pipeline.predict(features=batch_df), repeat=self.repeat)
+            self._record(f"predict/batch_{len(batch_df)}", timings, rows=len(batch_df))
+
+    def run_tree_ensembles(self, source_df:pd.DataFrame):
+        """
+        Times each tree model family's `predict` against
+        its flattened ensemble, for a single row and batches.
+        """
+        data_preprocessor = load_object(file_path=os.path.join("artifact", "preprocessor.pkl"))
+        X = np.asarray(data_preprocessor.transform(source_df), dtype=np.float32)
+        y = source_df["writing_score"].to_numpy()
+
+        for model_name, parameters in (("Random Forest Regressor", {"n_estimators": 128}),
+                                       ("Gradient Boost Regressor", {"n_estimators": 128}),
+                                       ("Ada Boost Regressor", {"n_estimators": 64}),
+                                       ("XGB Regressor", {"n_estimators": 128})):
+            model = create_model(model_name, **parameters).fit(X, y)
+            tree_ensemble = FlatTreeEnsemble.from_model(model)
+
+            for n_rows in [1, 64] + [len(source_df) * scale for scale in self.scales]:
+                batch = np.resize(X, (n_rows, X.shape[1]))
+                number = max(1, 200 // n_rows)
+                for name, predict_function in (("model", model.predict), ("flat", tree_ensemble.predict)):
+                    timings, _ = time_call(lambda: predict_function(batch), repeat=self.repeat, number=number)
+                    self._record(f"tree_ensemble/{model_name}/{name}_{n_rows}", timings, rows=n_rows)
+
+    def run(self):
+        """
+        Runs all benchmarks and returns the
+        results (with the environment) as a dict.
+        """
+        try:
+            source_df = pd.read_csv(self.source_data_path)
+
+            for scale in self.scales:
+                work_dir = tempfile.mkdtemp(prefix=f"benchmark_{scale}x_")
+                try:
+                    self.run_training(work_dir=work_dir, scale=scale, source_df=source_df)
+                finally:
+                    shutil.rmtree(work_dir, ignore_errors=True)
+
+            self.run_inference(source_df=source_df)
+            self.run_tree_ensembles(source_df=source_df)
+
+            return {
+                "environment": get_environment(),
+                "settings": {"scales": list(self.scales), "repeat": self.repeat,
+                             "full_grid": self.full_grid, "max_model_rows": self.max_model_rows},
+                "results": self.results
+            }
+
+        except Exception as e:
+            raise CustomException(error_message=e, error_detail=sys)
+
+
+# compare mode
+def compare_results(baseline:dict, candidate:dict, threshold:float=0.10):
+    """
+    Compares the fastest timings of two benchmark runs
+    (the minimum is the least affected by background noise).
+
+    Returns a list of (benchmark name, baseline time,
+    candidate time, ratio, status) rows, where status is
+    "REGRESSION" if the candidate is more than `threshold`
+    slower, "improved" if it is more than `threshold` faster,
+    and "ok" otherwise.
+
+    Input Parameters ->
+    `baseline`, `candidate`: (dict) outputs of `BenchmarkSuite.run`
+    `threshold`: (float) relative change that counts as a regression/improvement
+    """
+    rows = []
+    for name, baseline_result in baseline["results"].items():
+        candidate_result = candidate["results"].get(name)
+        if candidate_result is None:
+            continue
+        ratio = candidate_result["min"] / baseline_result["min"]
+        if ratio > 1 + threshold:
+            status = "REGRESSION"
+        elif ratio < 1 - threshold:
+            status = "improved"
+        else:
+            status = "ok"
+        rows.append((name, baseline_result["min"], candidate_result["min"], ratio, status))
+    return rows
+
+
+# command line entry point
+def main(argv:list=None):
+    """
+    `python -m src.benchmark run [--scales 1 10 100 1000] [--output benchmark.json]`
+    `python -m src.benchmark compare baseline.json candidate.json [--threshold 0.1]`
+
+    Input Parameters ->
+    `argv`: (list) command line arguments (default: `sys.argv[1:]`)
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the training & inference hot paths")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="run the benchmarks and save the results as JSON")
+    run_parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100, 1000],
+                            help="row multipliers of the upscaled datasets")
+    run_parser.add_argument("--repeat", type=int, default=3, help="repetitions of every benchmark")
+    run_parser.add_argument("--full-grid", action="store_true",
+                            help="search the full parameter grids instead of one parameter set per model")
+    run_parser.add_argument("--max-model-rows", type=int, default=100_000,
+                            help="skip the model search for larger training sets")
+    run_parser.add_argument("--output", default="benchmark.json", help="path of the results JSON file")
+
+    compare_parser = subparsers.add_parser("compare", help="flag regressions between two runs")
+    compare_parser.add_argument("baseline", help="results JSON of the baseline run")
+    compare_parser.add_argument("candidate", help="results JSON of the run to check")
+    compare_parser.add_argument("--threshold", type=float, default=0.10,
+                                help="relative slowdown that counts as a regression")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        benchmark_suite = BenchmarkSuite(scales=args.scales, repeat=args.repeat,
+                                         full_grid=args.full_grid, max_model_rows=args.max_model_rows)
+        results = benchmark_suite.run()
+        with open(args.output, "w") as file_object:
+            json.dump(results, file_object, indent=2)
+        print(f"Results saved to {args.output}")
+        return 0
+
+    with open(args.baseline, "r") as file_object:
+        baseline = json.load(file_object)
+    with open(args.candidate, "r") as file_object:
+        candidate = json.load(file_object)
+
+    rows = compare_results(baseline=baseline, candidate=candidate, threshold=args.threshold)
+    print(f"{'benchmark':<55} {'baseline':>12} {'candidate':>12} {'ratio':>7}  status")
+    for name, baseline_time, candidate_time, ratio, status in rows:
+        print(f"{name:<55} {baseline_time:>11.6f}s {candidate_time:>11.6f}s {ratio:>7.2f}  {status}")
+
+    # non-zero exit code so that CI can fail on regressions
+    n_regressions = sum(status == "REGRESSION" for *_, status in rows)
+    print(f"{n_regressions} regression(s) above {args.threshold:.0%}")
+    return 1 if n_regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
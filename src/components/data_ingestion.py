@@ -7,15 +7,20 @@ from src.exception import CustomException
 from src.logger import logging
 # for working with dataframes
 import pandas as pd
+import numpy as np
+# for reading the rows appended to a csv source
+import io
+# for fingerprinting the ingested part of the source & saving the ingestion state
+import hashlib
+import json
+# for removing datasets before re-ingesting the whole source
+import shutil
 # for dataset creation
 from sklearn.model_selection import train_test_split
 # for defining class variables
 from dataclasses import dataclass
-
-# for data transformation
-from src.components.data_transformation import DataTransformationConfig
-from src.components.data_transformation import DataTransformation
-from src.components.model_trainer import ModelTrainer
+# for saving & loading datasets in csv or binary formats
+from src.utils import get_dataset_path, save_dataframe, load_dataframe, append_dataframe, get_dataset_format
 
 # DATA INGESTION CONFIG
 @dataclass
@@ -34,6 +39,70 @@ class DataIngestionConfig:
     # path for storing the test data
     test_data_path: str = os.path.join("artifact", "test.csv") # "\artifact\test.csv"
 
+    # path of the source dataset
+    source_data_path: str = os.path.join("notebook", "data", "stud.csv") # "\notebook\data\stud.csv"
+
+    # fraction of samples in the test set
+    test_size: float = 0.2
+
+    # seed for the train-test split
+    random_state: int = 42
+
+    # format of the raw, train & test dataset artifacts: "csv", "parquet", "feather" or "npy"
+    # (binary formats keep dtypes & categoricals and are not re-parsed on load)
+    artifact_format: str = "csv"
+
+    # also save human readable csv copies when using a binary format
+    export_csv: bool = False
+
+    # incremental mode: only the rows appended to the source since the last run are ingested,
+    # and every row goes to the training or test set by a hash of its contents (see `get_test_mask`)
+    incremental: bool = False
+
+    # columns hashed for the split in incremental mode (default: all columns), e.g. a student id
+    split_key_columns: tuple = None
+
+    # how much of the source the incremental mode has ingested so far
+    ingestion_state_path: str = os.path.join("artifact", "ingestion_state.json")
+
+
+# number of bytes before the ingested offset of a csv source which are hashed to detect rewrites
+SOURCE_FINGERPRINT_BYTES = 1 << 16
+
+
+# helper function to get the size of a dataset artifact
+def _get_path_size(path:str):
+    """
+    Returns the size in bytes of a file, or of all
+    files in a directory (`npy` datasets), or None
+    if the path does not exist.
+    """
+    if os.path.isdir(path):
+        return sum(
+            os.path.getsize(os.path.join(dir_path, file_name))
+            for dir_path, _, file_names in os.walk(path)
+            for file_name in file_names
+        )
+    if os.path.exists(path):
+        return os.path.getsize(path)
+    return None
+
+
+# helper function to fingerprint the ingested part of a csv source
+def _get_source_fingerprint(file_path:str, offset:int):
+    """
+    Returns a hash of the header line and of the
+    last `SOURCE_FINGERPRINT_BYTES` bytes before `offset`,
+    which changes if the ingested rows are rewritten
+    (rather than new rows appended).
+    """
+    with open(file_path, "rb") as file_object:
+        fingerprint = hashlib.sha256(file_object.readline())
+        start = max(offset - SOURCE_FINGERPRINT_BYTES, 0)
+        file_object.seek(start)
+        fingerprint.update(file_object.read(offset - start))
+    return fingerprint.hexdigest()
+
 
 # DATA INGESTION
 class DataIngestion:
@@ -46,15 +115,265 @@ class DataIngestion:
         self.ingestion_config = DataIngestionConfig()
 
     # methods
+    def get_output_paths(self):
+        """
+        Returns a dict with the paths of the
+        raw, train & test dataset artifacts
+        (in the configured format, plus the
+        csv copies if they are exported).
+        """
+        ingestion_config = self.ingestion_config
+        output_paths = {}
+        file_formats = [ingestion_config.artifact_format]
+        if ingestion_config.export_csv and ingestion_config.artifact_format != "csv":
+            file_formats.append("csv")
+
+        for file_format in file_formats:
+            for data_path in (ingestion_config.raw_data_path,
+                              ingestion_config.train_data_path,
+                              ingestion_config.test_data_path):
+                dataset_path = get_dataset_path(file_path=data_path, file_format=file_format)
+                output_paths[os.path.basename(dataset_path)] = dataset_path
+
+        return output_paths
+
+    def _save_dataset(self, df:pd.DataFrame, data_path:str):
+        """
+        Saves a dataset in the configured
+        artifact format (and as csv if exported).
+
+        Returns the path of the saved dataset.
+        """
+        artifact_format = self.ingestion_config.artifact_format
+        dataset_path = get_dataset_path(file_path=data_path, file_format=artifact_format)
+        save_dataframe(df=df, file_path=dataset_path)
+
+        # csv copy for humans
+        if self.ingestion_config.export_csv and artifact_format != "csv":
+            save_dataframe(df=df, file_path=get_dataset_path(file_path=data_path, file_format="csv"))
+
+        return dataset_path
+
+    def _append_dataset(self, df:pd.DataFrame, data_path:str):
+        """
+        Appends rows to a dataset in the configured
+        artifact format (and to its csv copy if exported).
+
+        Returns the path of the dataset.
+        """
+        artifact_format = self.ingestion_config.artifact_format
+        dataset_path = get_dataset_path(file_path=data_path, file_format=artifact_format)
+        append_dataframe(df=df, file_path=dataset_path)
+
+        if self.ingestion_config.export_csv and artifact_format != "csv":
+            append_dataframe(df=df, file_path=get_dataset_path(file_path=data_path, file_format="csv"))
+
+        return dataset_path
+
+    def get_test_mask(self, df:pd.DataFrame):
+        """
+        Returns a boolean array which is True for the
+        rows assigned to the test set (incremental mode).
+
+        A row is assigned by a hash of its key columns
+        (salted with `random_state`), so the assignment
+        does not depend on the other rows: appended rows
+        never move earlier rows to the other set, and
+        duplicate rows always land in the same set.
+
+        Input Parameters ->
+        `df`: (pd.DataFrame) rows of the source dataset
+        """
+        ingestion_config = self.ingestion_config
+        key_columns = list(ingestion_config.split_key_columns or df.columns)
+
+        # hash the text form of the values, with numbers as floats so that
+        # e.g. 72 parses the same in a delta whose column also has missing values
+        key_df = pd.DataFrame(data={
+            column: (df[column].astype("float64") if pd.api.types.is_numeric_dtype(df[column]) else df[column]).astype(str)
+            for column in key_columns
+        })
+        row_hashes = pd.util.hash_pandas_object(key_df, index=False,
+                                                hash_key=f"{ingestion_config.random_state:016d}"[-16:]).to_numpy()
+
+        # top 53 bits of the hash -> uniform number in [0, 1)
+        return (row_hashes >> np.uint64(11)) / float(1 << 53) < ingestion_config.test_size
+
+    def _get_ingestion_settings(self):
+        """
+        Returns the settings which the ingested
+        artifacts depend on (a change of any of
+        them re-ingests the whole source).
+        """
+        ingestion_config = self.ingestion_config
+        return {
+            "source_data_path": ingestion_config.source_data_path,
+            "test_size": ingestion_config.test_size,
+            "random_state": ingestion_config.random_state,
+            "split_key_columns": list(ingestion_config.split_key_columns or []),
+            "artifact_format": ingestion_config.artifact_format,
+            "export_csv": ingestion_config.export_csv
+        }
+
+    def _load_ingestion_state(self):
+        """
+        Returns the saved ingestion state (dict), or None
+        if it is missing or no longer matches the source,
+        the settings or the dataset artifacts.
+        """
+        try:
+            with open(self.ingestion_config.ingestion_state_path, "r") as file_object:
+                ingestion_state = json.load(file_object)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        if ingestion_state.get("settings") != self._get_ingestion_settings():
+            logging.info(msg="Ingestion settings changed")
+            return None
+
+        # artifacts modified since the last run (or a run interrupted while appending)
+        artifact_sizes = {name: _get_path_size(path) for name, path in self.get_output_paths().items()}
+        if ingestion_state.get("artifact_sizes") != artifact_sizes:
+            logging.info(msg="Ingested datasets changed since the last run")
+            return None
+
+        source_data_path = self.ingestion_config.source_data_path
+        if get_dataset_format(source_data_path) == "csv":
+            source_offset = ingestion_state["source_offset"]
+            if (os.path.getsize(source_data_path) < source_offset
+                    or _get_source_fingerprint(source_data_path, source_offset) != ingestion_state["source_fingerprint"]):
+                logging.info(msg="Source dataset was rewritten, not appended to")
+                return None
+
+        return ingestion_state
+
+    def _read_source_delta(self, ingestion_state:dict):
+        """
+        Returns the rows of the source after the
+        ingested position, and the new position.
+
+        For a csv source, only the bytes after the
+        ingested offset are read and parsed (up to the last
+        complete line); other formats are memory-mapped
+        and sliced after the ingested number of rows.
+
+        Input Parameters ->
+        `ingestion_state`: (dict) saved ingestion state (None to read the whole source)
+        """
+        source_data_path = self.ingestion_config.source_data_path
+
+        if get_dataset_format(source_data_path) == "csv":
+            with open(source_data_path, "rb") as file_object:
+                header = file_object.readline()
+                start = ingestion_state["source_offset"] if ingestion_state is not None else file_object.tell()
+                file_object.seek(start)
+                data = file_object.read()
+            # a line still being written is ingested by the next run
+            data = data[:data.rfind(b"\n") + 1]
+            delta_df = pd.read_csv(io.BytesIO(header + data))
+            return delta_df, start + len(data)
+
+        df = load_dataframe(source_data_path)
+        start = ingestion_state["source_offset"] if ingestion_state is not None else 0
+        if len(df) < start:
+            raise ValueError(f"Source dataset has fewer rows ({len(df)}) than were ingested ({start})")
+        return df.iloc[start:].reset_index(drop=True), len(df)
+
+    def initiate_incremental_data_ingestion(self):
+        """
+        Appends the rows added to the source since
+        the last run to the raw, train & test datasets.
+
+        With a csv source and csv artifacts, a run costs
+        time proportional to the new rows; binary artifacts
+        are loaded & saved again by `append_dataframe`, and
+        other source formats are loaded to slice the new rows.
+
+        The whole source is (re-)ingested on the first
+        run, or when the settings, the source (other than
+        by appending) or the dataset artifacts have changed.
+        As the split only depends on each row, a full
+        re-ingestion assigns every row to the same set again.
+
+        Returns the file paths of the training set & test set.
+        """
+        logging.info(msg="Entered the incremental data ingestion method/component")
+        try:
+            ingestion_config = self.ingestion_config
+            ingestion_state = self._load_ingestion_state()
+
+            if ingestion_state is None:
+                logging.info(msg="Ingesting the whole source dataset")
+                for dataset_path in self.get_output_paths().values():
+                    if os.path.isdir(dataset_path):
+                        shutil.rmtree(dataset_path)
+                    elif os.path.exists(dataset_path):
+                        os.remove(dataset_path)
+                n_rows = {"raw": 0, "train": 0, "test": 0}
+            else:
+                n_rows = ingestion_state["n_rows"]
+
+            delta_df, source_offset = self._read_source_delta(ingestion_state=ingestion_state)
+            logging.info(msg=f"Read {len(delta_df)} new rows of the source dataset")
+
+            # binary formats can store text columns as categoricals (codes + categories)
+            if ingestion_config.artifact_format != "csv":
+                for column in delta_df.select_dtypes(include="object").columns:
+                    delta_df[column] = delta_df[column].astype("category")
+
+            is_test = self.get_test_mask(delta_df)
+            train_set, test_set = delta_df[~is_test], delta_df[is_test]
+
+            # (a first run with no rows still creates the datasets)
+            if len(delta_df) or ingestion_state is None:
+                os.makedirs(os.path.dirname(ingestion_config.raw_data_path) or ".", exist_ok=True)
+                self._append_dataset(df=delta_df, data_path=ingestion_config.raw_data_path)
+                self._append_dataset(df=train_set, data_path=ingestion_config.train_data_path)
+                self._append_dataset(df=test_set, data_path=ingestion_config.test_data_path)
+
+            n_rows = {"raw": n_rows["raw"] + len(delta_df),
+                      "train": n_rows["train"] + len(train_set),
+                      "test": n_rows["test"] + len(test_set)}
+
+            # saved last (and replaced atomically): an interrupted run leaves artifact
+            # sizes which do not match the state, so the next run starts over
+            ingestion_state = {
+                "settings": self._get_ingestion_settings(),
+                "source_offset": source_offset,
+                "source_fingerprint": (_get_source_fingerprint(ingestion_config.source_data_path, source_offset)
+                                       if get_dataset_format(ingestion_config.source_data_path) == "csv" else None),
+                "n_rows": n_rows,
+                "artifact_sizes": {name: _get_path_size(path) for name, path in self.get_output_paths().items()}
+            }
+            temp_state_path = f"{ingestion_config.ingestion_state_path}.tmp"
+            with open(temp_state_path, "w") as file_object:
+                json.dump(ingestion_state, file_object, indent=2)
+            os.replace(temp_state_path, ingestion_config.ingestion_state_path)
+
+            logging.info(msg=f"Appended {len(train_set)} training and {len(test_set)} test rows "
+                             f"(totals: {n_rows['train']} training, {n_rows['test']} test)")
+
+            return (
+                get_dataset_path(file_path=ingestion_config.train_data_path, file_format=ingestion_config.artifact_format),
+                get_dataset_path(file_path=ingestion_config.test_data_path, file_format=ingestion_config.artifact_format)
+            )
+
+        except Exception as e:
+            raise CustomException(error_message=e, error_detail=sys)
 
     def initiate_data_ingestion(self):
         logging.info(msg="Entered the data ingestion method/component")
         try:
             # load dataset into Pandas Dataframe
-            file_path = r"notebook\data\stud.csv"
-            df = pd.read_csv(file_path)
+            file_path = self.ingestion_config.source_data_path
+            df = load_dataframe(file_path)
             logging.info(msg="Read the raw dataset into Pandas dataframe")
 
+            # binary formats can store text columns as categoricals (codes + categories)
+            if self.ingestion_config.artifact_format != "csv":
+                for column in df.select_dtypes(include="object").columns:
+                    df[column] = df[column].astype("category")
+
             # get the directory path where all data is to be stored
             # will use this to create a new directory `artifact`
             data_directory_path = os.path.dirname(self.ingestion_config.raw_data_path)
@@ -62,33 +381,30 @@ class DataIngestion:
             # make new directory to store the datasets
             os.makedirs(data_directory_path, exist_ok=True)
 
-            # save the dataframe as csv file into the above created directory with `raw.csv` file name
-            df.to_csv(self.ingestion_config.raw_data_path,
-                      index=False, header=True)
-            logging.info(msg="Saved the ingested raw data as csv")
+            # save the dataframe into the above created directory with `raw` file name
+            self._save_dataset(df=df, data_path=self.ingestion_config.raw_data_path)
+            logging.info(msg=f"Saved the ingested raw data as {self.ingestion_config.artifact_format}")
 
             logging.info(msg="Train-Test split initiated")
 
             # split dataset into training (80% samples) & test set (20% samples)
-            train_set, test_set = train_test_split(df, test_size=0.2,
-                                                   random_state=42)
+            train_set, test_set = train_test_split(df, test_size=self.ingestion_config.test_size,
+                                                   random_state=self.ingestion_config.random_state)
 
-            # save training set as csv file
-            train_set.to_csv(self.ingestion_config.train_data_path,
-                             index=False, header=True)
-            # save test set as csv file
-            test_set.to_csv(self.ingestion_config.test_data_path,
-                            index=False, header=True)
+            # save training set
+            train_data_path = self._save_dataset(df=train_set, data_path=self.ingestion_config.train_data_path)
+            # save test set
+            test_data_path = self._save_dataset(df=test_set, data_path=self.ingestion_config.test_data_path)
 
-            logging.info(msg="Separate training and test set saved as csv")
+            logging.info(msg=f"Separate training and test set saved as {self.ingestion_config.artifact_format}")
             logging.info(msg="Data ingestion completed successfully")
 
 
             # return the file paths for training set & test set
             # paths will be needed for loading files during data transformation
             return (
-                self.ingestion_config.train_data_path,
-                self.ingestion_config.test_data_path
+                train_data_path,
+                test_data_path
             )
             
         except Exception as e:
@@ -98,27 +414,7 @@ class DataIngestion:
 
 
 if __name__ == "__main__":
-    # create data ingestion object
-    data_ingestion_object = DataIngestion()
-    # initiate data ingestion process
-    train_data_path, test_data_path = data_ingestion_object.initiate_data_ingestion()
-    # once this gets executed the `artifact` folder will get created
-    # and inside it `raw.csv`, `train.csv`, and `test.csv` will be saved
-
-    # create data transformation object
-    data_transformation_object = DataTransformation()
-    # initiate data transformation process
-    # to get the transformed training set array, test set array,
-    # and the data preprocessor object's local file path (not needed right now)
-    train_array, test_array, _ = data_transformation_object.initiate_data_transformation(
-        train_path=train_data_path,
-        test_path=test_data_path
-    )
-
-    # create model trainer object
-    model_trainer = ModelTrainer()
-    # initiate training and evaluation
-    model_name, model_r2_score = model_trainer.initiate_model_trainer(train_array=train_array,
-                                                          test_array=test_array)
-    # print r2 score
-    print(f"R^2 Score of trained {model_name} model: {model_r2_score:.3f}")
\ No newline at end of file
+    # run data ingestion, data transformation and model training one after another
+    # (stages whose inputs did not change are restored from the stage cache, see `--force`)
+    from src.pipeline.train_pipeline import main
+    main()
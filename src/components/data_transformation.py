@@ -11,13 +11,14 @@ import pandas as pd
 from dataclasses import dataclass
 # for data transformations
 import numpy as np
+import scipy.sparse as sp
 from sklearn.preprocessing import StandardScaler, OneHotEncoder
 from sklearn.impute import SimpleImputer
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
 
-# for saving data objects
-from src.utils import save_object
+# for saving data objects & loading datasets
+from src.utils import save_object, load_dataframe, save_arrays, load_arrays, format_features
 
 
 # DATA TRANSFORMATION CONFIG
@@ -31,6 +32,20 @@ class DataTransformationConfig:
     # path for storing the final data processor pipeline object (`.pkl` file)
     preprocessor_object_file_path:str = os.path.join("artifact", "preprocessor.pkl") ## \artifact\preprocessor.pkl
 
+    # layout of the transformed input features: "dense" (2D array) or "sparse" (CSR matrix)
+    feature_format:str = "dense"
+
+    # dtype of the transformed input features (tree models work in float32 internally,
+    # linear models are fitted on a float64 copy, see `model_search._get_model_input`)
+    feature_dtype:str = "float32"
+
+    # directory where the transformed arrays are saved as memory-mappable `.npy` files
+    transformed_data_dir_path:str = os.path.join("artifact", "transformed") ## \artifact\transformed
+
+    # save the transformed arrays and return read-only memory-mapped views of them
+    # (the search workers then share the same pages instead of each holding a copy)
+    memory_map_arrays:bool = True
+
 
 # DATA TRANSFORMATION
 class DataTransformation:
@@ -76,10 +91,11 @@ class DataTransformation:
             logging.info(msg="Categorical columns transformations completed successfully")
 
             # create Column transformation pipeline
+            # (`sparse_threshold=1` keeps the output sparse whenever the one hot part is sparse)
             preprocessor = ColumnTransformer(transformers=[
                 ("numerical_transformer", numerical_pipeline, numerical_features),
                 ("categorical_transformer", categorical_pipeline, categorical_features)
-            ])
+            ], sparse_threshold=1 if self.data_transformation_config.feature_format == "sparse" else 0.3)
 
             # return the final preprocessor object
             return preprocessor
@@ -90,12 +106,28 @@ class DataTransformation:
 
     def initiate_data_transformation(self, train_path, test_path):
         """
-
+        Fits the data preprocessor on the training set
+        and transforms the training and test sets.
+
+        Returns the training set input features & target,
+        the test set input features & target, and the
+        file path of the saved data preprocessor.
+        The input features are kept separate from the
+        target (as configured: dense or CSR, float32
+        by default), the targets are float64 arrays.
+        If `memory_map_arrays` is set they are
+        read-only memory-mapped views of the arrays
+        saved in `transformed_data_dir_path`.
+
+        Input Parameters ->
+        `train_path`: (str) file path of the training set
+        `test_path`: (str) file path of the test set
         """
         try:
             # get training and test dataset as a dataframe
-            train_df = pd.read_csv(train_path)
-            test_df = pd.read_csv(test_path)
+            # (csv, or binary format saved by data ingestion, memory-mapped where possible)
+            train_df = load_dataframe(train_path)
+            test_df = load_dataframe(test_path)
 
             logging.info(msg="Training and Test set read as dataframes successfully")
 
@@ -130,25 +162,27 @@ class DataTransformation:
 
             logging.info(msg="Initiating applying data preprocessor object to training and test input datasets")
 
-            # pass training and test set input features through data preprocessor pipeline to obtain sparse arrays
-            input_features_train_array = data_preprocessor.fit_transform(input_features_train_df)
+            # layout & dtype of the transformed input features
+            feature_format = self.data_transformation_config.feature_format
+            feature_dtype = self.data_transformation_config.feature_dtype
 
-            input_features_test_array = data_preprocessor.transform(input_features_test_df)
+            # pass training and test set input features through data preprocessor pipeline
+            input_features_train_array = format_features(data_preprocessor.fit_transform(input_features_train_df),
+                                                         feature_format=feature_format, feature_dtype=feature_dtype)
 
-            logging.info(msg="Application of data preprocessor object to training and test input datasets completed successfully")
+            input_features_test_array = format_features(data_preprocessor.transform(input_features_test_df),
+                                                        feature_format=feature_format, feature_dtype=feature_dtype)
 
-            # create final preprocessed training and test set arrays
-            train_array = np.c_[
-                input_features_train_array,
-                np.array(target_feature_train_df)
-            ]
+            logging.info(msg="Application of data preprocessor object to training and test input datasets completed successfully")
 
-            test_array = np.c_[
-                input_features_test_array,
-                np.array(target_feature_test_df)
-            ]
+            # targets are kept as separate arrays (no copy of the input features with the target appended)
+            target_feature_train_array = target_feature_train_df.to_numpy(dtype=np.float64)
+            target_feature_test_array = target_feature_test_df.to_numpy(dtype=np.float64)
 
-            logging.info(msg="Transformed Training and Test array created successfully")
+            logging.info(msg=(
+                f"Transformed Training and Test features created successfully "
+                f"({self.data_transformation_config.feature_format}, {input_features_train_array.dtype})"
+            ))
 
             # save the data preprocessor object as `.pkl` file in the defined file path
             save_object(
@@ -158,11 +192,68 @@ class DataTransformation:
 
             logging.info(msg="Saved Data preprocessor as a `.pkl` file successfully")
 
+            if self.data_transformation_config.memory_map_arrays:
+                # save the arrays and swap the in-memory copies for memory-mapped views
+                save_arrays(arrays={
+                    "X_train": input_features_train_array, "y_train": target_feature_train_array,
+                    "X_test": input_features_test_array, "y_test": target_feature_test_array
+                }, dir_path=self.data_transformation_config.transformed_data_dir_path)
+                arrays = load_arrays(dir_path=self.data_transformation_config.transformed_data_dir_path)
+                input_features_train_array, target_feature_train_array = arrays["X_train"], arrays["y_train"]
+                input_features_test_array, target_feature_test_array = arrays["X_test"], arrays["y_test"]
+
+                logging.info(msg="Transformed arrays saved and memory-mapped successfully")
+
             return (
-                train_array, test_array,
+                input_features_train_array, target_feature_train_array,
+                input_features_test_array, target_feature_test_array,
                 self.data_transformation_config.preprocessor_object_file_path
             )
             
 
         except Exception as e:
-            raise CustomException(error_message=e, error_detail=sys)
\ No newline at end of file
+            raise CustomException(error_message=e, error_detail=sys)
+
+if __name__ == "__main__":
+    # compare peak memory & fit time of the feature layouts against the float64 dense layout
+    import time
+    import tracemalloc
+    from src.components.model_trainer import ModelTrainer
+
+    try:
+        train_path = os.path.join("artifact", "train.csv")
+        test_path = os.path.join("artifact", "test.csv")
+
+        print(f"{'layout':<16}{'features MB':>12}{'peak MB':>10}{'fit s':>8}")
+        for feature_format, feature_dtype in [("dense", "float64"), ("dense", "float32"), ("sparse", "float32")]:
+            data_transformation = DataTransformation()
+            data_transformation.data_transformation_config.feature_format = feature_format
+            data_transformation.data_transformation_config.feature_dtype = feature_dtype
+            # keep the saved preprocessor untouched & the arrays in memory
+            data_transformation.data_transformation_config.preprocessor_object_file_path = os.path.join(
+                "artifact", f"preprocessor_{feature_format}_{feature_dtype}.pkl")
+            data_transformation.data_transformation_config.memory_map_arrays = False
+
+            tracemalloc.start()
+            X_train, y_train, X_test, y_test, preprocessor_path = data_transformation.initiate_data_transformation(
+                train_path=train_path, test_path=test_path)
+
+            # one fit of every model with its default parameters
+            start_time = time.perf_counter()
+            for model in ModelTrainer().get_models().values():
+                model.fit(X_train, y_train)
+                model.score(X_test, y_test)
+            fit_time = time.perf_counter() - start_time
+            _, peak_memory = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            os.remove(preprocessor_path)
+
+            features_size = sum(
+                (X.data.nbytes + X.indices.nbytes + X.indptr.nbytes) if sp.issparse(X) else X.nbytes
+                for X in (X_train, X_test)
+            )
+            print(f"{feature_format + ' ' + feature_dtype:<16}{features_size / 2**20:>12.3f}"
+                  f"{peak_memory / 2**20:>10.2f}{fit_time:>8.2f}")
+
+    except Exception as e:
+        raise CustomException(error_message=e, error_detail=sys)
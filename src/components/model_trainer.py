@@ -6,24 +6,49 @@ import sys
 from src.exception import CustomException
 from src.logger import logging
 # for defining class variables
-from dataclasses import dataclass
-# for machine learning model building
-from sklearn.linear_model import LinearRegression
-from sklearn.tree import DecisionTreeRegressor
-from sklearn.neighbors import KNeighborsRegressor
-from sklearn.ensemble import (
-    AdaBoostRegressor,
-    GradientBoostingRegressor,
-    RandomForestRegressor
-    ) 
-from xgboost import XGBRegressor
-# for machine learning model evaluation
-from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
+from dataclasses import dataclass, field
+# for importing estimator modules only when their models are used
+import importlib
 # utility functions
-from src.utils import save_object, evaluate_model
+from src.utils import save_object, load_object, evaluate_model
+# for folding a linear model into a precomputed scorer
+from src.pipeline.linear_scorer import is_linear_model, export_linear_scorer
+# for precomputing the predictions over the whole (bounded) input space
+from src.pipeline.prediction_table import export_prediction_table
+# for flattening a tree ensemble into contiguous node arrays
+from src.pipeline.tree_ensemble import is_tree_ensemble, export_tree_ensemble
 
 
 
+# MODEL REGISTRY
+# model name -> (module, class name) of every model family the trainer can try out
+# the module of a model family is only imported when one of its models is created
+MODEL_REGISTRY = {
+    "Linear Regression": ("sklearn.linear_model", "LinearRegression"),
+    "Decision Tree": ("sklearn.tree", "DecisionTreeRegressor"),
+    "KNN Regressor": ("sklearn.neighbors", "KNeighborsRegressor"),
+    "Ada Boost Regressor": ("sklearn.ensemble", "AdaBoostRegressor"),
+    "Gradient Boost Regressor": ("sklearn.ensemble", "GradientBoostingRegressor"),
+    "Random Forest Regressor": ("sklearn.ensemble", "RandomForestRegressor"),
+    "XGB Regressor": ("xgboost", "XGBRegressor")
+}
+
+
+# helper function to create a model from the registry
+def create_model(model_name:str, **parameters):
+    """
+    Imports the model family's module (on first use)
+    and returns an untrained model.
+
+    Input Parameters ->
+    `model_name`: (str) key of `MODEL_REGISTRY`
+    `parameters`: constructor parameters of the model
+    """
+    module_name, class_name = MODEL_REGISTRY[model_name]
+    model_class = getattr(importlib.import_module(module_name), class_name)
+    return model_class(**parameters)
+
+
 # MODEL TRAINER CONFIG
 @dataclass
 class ModelTrainerConfig:
@@ -35,6 +60,33 @@ class ModelTrainerConfig:
     # file path where final trained model will get saved as a `.pkl` file
     trained_model_file_path:str = os.path.join("artifact", "model.pkl")
 
+    # file path of the data preprocessor saved by `DataTransformation`
+    preprocessor_object_file_path:str = os.path.join("artifact", "preprocessor.pkl")
+
+    # file path where the folded linear scorer gets saved (only if a linear model wins)
+    linear_scorer_file_path:str = os.path.join("artifact", "linear_scorer.json")
+
+    # file path where the flattened tree ensemble gets saved (only if a tree model wins)
+    tree_ensemble_file_path:str = os.path.join("artifact", "tree_ensemble.npz")
+
+    # file path where the precomputed prediction table gets saved (if enabled)
+    prediction_table_file_path:str = os.path.join("artifact", "prediction_table.npy")
+
+    # if True, the best model is evaluated over every in-domain input and saved as a prediction table
+    export_prediction_table:bool = False
+
+    # number of processes for the model search (-1 -> all cores, None -> one model at a time)
+    n_jobs:int = -1
+
+    # hyperparameter search method: "grid" (exhaustive) or "halving" (successive halving)
+    search:str = "grid"
+
+    # extra options for the halving search, e.g. {"max_fits": 500, "time_budget": 60}
+    search_options:dict = field(default_factory=dict)
+
+    # models to try out (keys of `MODEL_REGISTRY`), only their modules get imported
+    model_names:list = field(default_factory=lambda: list(MODEL_REGISTRY))
+
 
 # MODEL TRAINER
 class ModelTrainer:
@@ -47,84 +99,110 @@ class ModelTrainer:
         self.model_trainer_config = ModelTrainerConfig()
 
     # methods
-    def initiate_model_trainer(self, train_array, test_array):
+    def get_models(self):
+        """
+        Returns a dict containing all
+        (untrained) machine learning models
+        to try out, keyed by model name.
         """
+        # dict containing all models to try out
+        models = {
+            model_name: create_model(model_name)
+            for model_name in self.model_trainer_config.model_names
+        }
 
+        return models
+
+    def get_parameters(self):
         """
-        try:
-            # separate out training and test set into corresponding input & target arrays
-            logging.info(msg="Initiating Train-Test split")
-            X_train, y_train, X_test, y_test = (
-                train_array[:, :-1], train_array[:, -1],
-                test_array[:, :-1], test_array[:, -1]
-            )
-            logging.info(msg="Train-Test split completed successfully")
+        Returns a dict containing the parameter
+        grid of each model (keyed by model name)
+        for hyperparameter tuning.
+        """
+        # parameters grid for performing grid search
+        parameters={
+            "Linear Regression":{},
+            "Decision Tree":{
+                'criterion':['squared_error', 'friedman_mse', 'absolute_error', 'poisson'],
+                # 'splitter':['best','random'],
+                # 'max_features':['sqrt','log2'],
+            },
+            "KNN Regressor":{
+                'n_neighbors':[5,7,9,11],
+                # 'weights':['uniform', 'distance'],
+                # 'algorithm':['ball_tree', 'kd_tree', 'brute']
+            },
+            "Ada Boost Regressor":{
+                'learning_rate':[.1,.01,0.5,.001],
+                # 'loss':['linear','square','exponential'],
+                'n_estimators': [8,16,32,64,128,256]
+            },
+            "Gradient Boost Regressor":{
+                # 'loss':['squared_error', 'huber', 'absolute_error', 'quantile'],
+                'learning_rate':[.1,.01,.05,.001],
+                'subsample':[0.6,0.7,0.75,0.8,0.85,0.9],
+                # 'criterion':['squared_error', 'friedman_mse'],
+                # 'max_features':['auto','sqrt','log2'],
+                'n_estimators': [8,16,32,64,128,256]
+            },
+            "Random Forest Regressor":{
+                # 'criterion':['squared_error', 'friedman_mse', 'absolute_error', 'poisson'],
+                # 'max_features':['sqrt','log2',None],
+                'n_estimators': [8,16,32,64,128,256]
+            },
+            "XGB Regressor":{
+                'learning_rate':[.1,.01,.05,.001],
+                'n_estimators': [8,16,32,64,128,256]
+            }
+        }
+
+        return parameters
+
+    def initiate_model_trainer(self, X_train, y_train, X_test, y_test):
+        """
+        Searches the hyperparameters of all models,
+        saves the best one and returns its name
+        and R^2 score on the test set.
 
+        Input Parameters ->
+        `X_train`, `X_test`: (array or CSR matrix) transformed input features
+        `y_train`, `y_test`: (array) target variable
+        """
+        try:
             # declare dict containing all models to try out
-            models = {
-                "Linear Regression":LinearRegression(),
-                "Decision Tree":DecisionTreeRegressor(),
-                "KNN Regressor":KNeighborsRegressor(),
-                "Ada Boost Regressor":AdaBoostRegressor(),
-                "Gradient Boost Regressor":GradientBoostingRegressor(),
-                "Random Forest Regressor":RandomForestRegressor(),
-                "XGB Regressor":XGBRegressor()
-            }
+            models = self.get_models()
             # declare parameters grid for performing grid search
-            parameters={
-                "Linear Regression":{},
-                "Decision Tree":{
-                    'criterion':['squared_error', 'friedman_mse', 'absolute_error', 'poisson'],
-                    # 'splitter':['best','random'],
-                    # 'max_features':['sqrt','log2'],
-                },
-                "KNN Regressor":{
-                    'n_neighbors':[5,7,9,11],
-                    # 'weights':['uniform', 'distance'],
-                    # 'algorithm':['ball_tree', 'kd_tree', 'brute']
-                },
-                "Ada Boost Regressor":{
-                    'learning_rate':[.1,.01,0.5,.001],
-                    # 'loss':['linear','square','exponential'],
-                    'n_estimators': [8,16,32,64,128,256]
-                },
-                "Gradient Boost Regressor":{
-                    # 'loss':['squared_error', 'huber', 'absolute_error', 'quantile'],
-                    'learning_rate':[.1,.01,.05,.001],
-                    'subsample':[0.6,0.7,0.75,0.8,0.85,0.9],
-                    # 'criterion':['squared_error', 'friedman_mse'],
-                    # 'max_features':['auto','sqrt','log2'],
-                    'n_estimators': [8,16,32,64,128,256]
-                },
-                "Random Forest Regressor":{
-                    # 'criterion':['squared_error', 'friedman_mse', 'absolute_error', 'poisson'],
-                    # 'max_features':['sqrt','log2',None],
-                    'n_estimators': [8,16,32,64,128,256]
-                },
-                "XGB Regressor":{
-                    'learning_rate':[.1,.01,.05,.001],
-                    'n_estimators': [8,16,32,64,128,256]
-                }
-            }
+            parameters = self.get_parameters()
 
             # evaluate model
             logging.info(msg="Model training and evaluation initiated")
 
-            model_report:dict = evaluate_model(X_train=X_train, y_train=y_train,
-                                               X_test=X_test, y_test=y_test,
-                                               models=models, params=parameters)
+            model_results:dict = evaluate_model(X_train=X_train, y_train=y_train,
+                                                X_test=X_test, y_test=y_test,
+                                                models=models, params=parameters,
+                                                n_jobs=self.model_trainer_config.n_jobs,
+                                                search=self.model_trainer_config.search,
+                                                search_options=self.model_trainer_config.search_options)
             logging.info(msg="Model training and evaluation completed successfully")
+
+            for model_result in model_results.values():
+                logging.info(msg=(
+                    f"{model_result.model_name}: test R^2 {model_result.test_score:.4f}, "
+                    f"best CV R^2 {model_result.best_cv_score:.4f}, "
+                    f"best parameters {model_result.best_params}"
+                ))
             
-            # extract model with best r2 score on test set
-            best_model_score = max(sorted(model_report.values()))
-            best_model_name = list(model_report.keys())[list(model_report.values()).index(best_model_score)]
+            # extract model with best r2 score on test set (first one on ties)
+            best_model_result = max(model_results.values(), key=lambda model_result: model_result.test_score)
+            best_model_name = best_model_result.model_name
+            best_model_score = best_model_result.test_score
 
-            # select the best model -> Final model which will be saved and used later
-            best_model = models[best_model_name]
+            # select the best model (already refit on the training set) -> Final model which will be saved and used later
+            best_model = best_model_result.best_estimator
 
             # set threshold for r2 score to accept a model
             if best_model_score < 0.6:
-                raise CustomException("No best model found!")
+                raise ValueError("No best model found!")
 
             logging.info(msg="Best model was found and selected successfully")
 
@@ -136,11 +214,53 @@ class ModelTrainer:
 
             logging.info(msg="Best model was saved as `.pkl` file successfully")
 
-            # use best model to make prediction on test set and evaluate r2 score
-            prediction_test = best_model.predict(X_test)
-            r2_best_model = r2_score(y_true=y_test, y_pred=prediction_test)
+            # fold preprocessor & linear model into a precomputed scorer for serving
+            if is_linear_model(best_model):
+                export_linear_scorer(
+                    model=best_model,
+                    data_preprocessor=load_object(file_path=self.model_trainer_config.preprocessor_object_file_path),
+                    file_path=self.model_trainer_config.linear_scorer_file_path,
+                    model_file_path=self.model_trainer_config.trained_model_file_path
+                )
+                logging.info(msg="Linear scorer exported successfully")
+            elif os.path.exists(self.model_trainer_config.linear_scorer_file_path):
+                # scorer of a previous linear model would no longer match
+                os.remove(self.model_trainer_config.linear_scorer_file_path)
+
+            # flatten a tree model into node arrays for low latency serving
+            if is_tree_ensemble(best_model):
+                export_tree_ensemble(
+                    model=best_model,
+                    file_path=self.model_trainer_config.tree_ensemble_file_path,
+                    model_file_path=self.model_trainer_config.trained_model_file_path,
+                    X_sample=X_test
+                )
+                logging.info(msg="Tree ensemble exported successfully")
+            elif os.path.exists(self.model_trainer_config.tree_ensemble_file_path):
+                # ensemble of a previous tree model would no longer match
+                os.remove(self.model_trainer_config.tree_ensemble_file_path)
+
+            # precompute the predictions over the whole input space of the web form
+            prediction_table_paths = (
+                self.model_trainer_config.prediction_table_file_path,
+                f"{os.path.splitext(self.model_trainer_config.prediction_table_file_path)[0]}.json"
+            )
+            if self.model_trainer_config.export_prediction_table:
+                export_prediction_table(
+                    model=best_model,
+                    data_preprocessor=load_object(file_path=self.model_trainer_config.preprocessor_object_file_path),
+                    file_path=self.model_trainer_config.prediction_table_file_path,
+                    model_file_path=self.model_trainer_config.trained_model_file_path
+                )
+                logging.info(msg="Prediction table exported successfully")
+            else:
+                # table of a previous model would no longer match
+                for file_path in prediction_table_paths:
+                    if os.path.exists(file_path):
+                        os.remove(file_path)
 
-            return best_model_name, r2_best_model
+            # r2 score of the best model on test set (computed during evaluation)
+            return best_model_name, best_model_score
 
         except Exception as e:
             raise CustomException(error_message=e, error_detail=sys)
\ No newline at end of file
@@ -0,0 +1,144 @@
+# DEPENDENCIES
+
+# for working with file paths, custom exception and custom logging
+import os
+import sys
+from src.exception import CustomException
+from src.logger import logging
+# for parsing command line arguments
+import argparse
+# for sending concurrent requests
+import time
+import json
+import random
+import threading
+import urllib.parse
+import urllib.request
+# for reading the sample inputs
+import pandas as pd
+
+
+# default source of the sample inputs
+SOURCE_DATA_PATH = os.path.join("notebook", "data", "stud.csv")
+
+
+# helper function to compute a latency percentile
+def _percentile(sorted_values:list, percent:float):
+    if not sorted_values:
+        return float("nan")
+    index = min(len(sorted_values) - 1, int(round(percent / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+# LOAD GENERATOR
+class LoadGenerator:
+    """
+    Closed-loop load generator for `/predict_data`:
+    `concurrency` threads each send a request, wait
+    for the response and send the next one, for
+    `duration` seconds. The form inputs are sampled
+    from `stud.csv`.
+    """
+    # variables
+    def __init__(self, url:str, concurrency:int=16, duration:float=10.0,
+                 source_data_path:str=SOURCE_DATA_PATH, random_state:int=0):
+        self.url = url
+        self.concurrency = concurrency
+        self.duration = duration
+
+        # url-encoded form bodies of the sample inputs
+        input_df = pd.read_csv(source_data_path).drop(columns=["writing_score"])
+        self.bodies = [
+            urllib.parse.urlencode({key: str(value) for key, value in record.items()}).encode("utf-8")
+            for record in input_df.to_dict(orient="records")
+        ]
+        self.random_state = random_state
+
+        self._lock = threading.Lock()
+        self.latencies = []
+        self.n_errors = 0
+
+    # methods
+    def _worker(self, worker_index:int, end_time:float):
+        random_generator = random.Random(self.random_state + worker_index)
+        latencies = []
+        n_errors = 0
+        while time.perf_counter() < end_time:
+            body = random_generator.choice(self.bodies)
+            request = urllib.request.Request(self.url, data=body, method="POST", headers={
+                "Content-Type": "application/x-www-form-urlencoded"
+            })
+            start_time = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=30) as response:
+                    response.read()
+                latencies.append(time.perf_counter() - start_time)
+            except Exception:
+                n_errors += 1
+
+        with self._lock:
+            self.latencies.extend(latencies)
+            self.n_errors += n_errors
+
+    def run(self):
+        """
+        Runs the load and returns a summary dict
+        (throughput & latency percentiles).
+        """
+        try:
+            end_time = time.perf_counter() + self.duration
+            threads = [
+                threading.Thread(target=self._worker, args=(worker_index, end_time), daemon=True)
+                for worker_index in range(self.concurrency)
+            ]
+            start_time = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed_time = time.perf_counter() - start_time
+
+            latencies = sorted(self.latencies)
+            summary = {
+                "url": self.url,
+                "concurrency": self.concurrency,
+                "duration_seconds": round(elapsed_time, 3),
+                "requests": len(latencies),
+                "errors": self.n_errors,
+                "requests_per_second": round(len(latencies) / elapsed_time, 1),
+                "latency_ms": {
+                    f"p{percent}": round(_percentile(latencies, percent) * 1000, 2)
+                    for percent in (50, 90, 99)
+                }
+            }
+            logging.info(msg=f"Load test summary: {summary}")
+            return summary
+
+        except Exception as e:
+            raise CustomException(error_message=e, error_detail=sys)
+
+
+# command line entry point
+def main(argv:list=None):
+    """
+    `python -m src.load_generator --url http://127.0.0.1:8080/predict_data --concurrency 32 --duration 10`
+
+    Input Parameters ->
+    `argv`: (list) command line arguments (default: `sys.argv[1:]`)
+    """
+    parser = argparse.ArgumentParser(description="Send concurrent /predict_data requests and report throughput & latency")
+    parser.add_argument("--url", default="http://127.0.0.1:8080/predict_data", help="prediction endpoint")
+    parser.add_argument("--concurrency", type=int, default=16, help="number of concurrent clients")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to send requests for")
+    parser.add_argument("--output", default=None, help="also save the summary to this JSON file")
+    args = parser.parse_args(argv)
+
+    summary = LoadGenerator(url=args.url, concurrency=args.concurrency, duration=args.duration).run()
+    print(json.dumps(summary, indent=2))
+    if args.output is not None:
+        with open(args.output, "w") as file_object:
+            json.dump(summary, file_object, indent=2)
+
+
+if __name__ == "__main__":
+    main()
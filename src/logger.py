@@ -1,33 +1,69 @@
 import logging
-import os 
+import logging.handlers
+import os
+import sys
+import json
+import queue
+import copy
+import atexit
 from datetime import datetime
 
+# logging settings (set as environment variables before starting the program)
+    # LOG_MODE: "async" -> log calls only put the record on an in-memory queue and
+    #                      a background thread writes it to the log file (default)
+    #           "sync"  -> log calls write to the log file themselves
+    # LOG_FORMAT: "text" (default) or "json" (one JSON object per line)
+    # LOG_DESTINATION: "file" -> log file under `logs/` (default)
+    #                  "stderr" -> standard error (LOG_ROTATION is ignored), e.g. in a container,
+    #                              where the processes of a pre-fork server share one writer
+    # LOG_ROTATION: "size" -> single `logs/ml.log` file, rotated at LOG_MAX_BYTES (default)
+    #               "time" -> single `logs/ml.log` file, rotated every LOG_ROTATION_WHEN (e.g. "midnight")
+    #               "external" -> single `logs/ml.log` file, rotated by an external tool (e.g. logrotate),
+    #                             reopened by every process once it was moved away
+    #               "none" -> new `logs/<timestamp>.log` folder & file for every program run
+    # NOTE: "size" & "time" rotate in each process separately, so with several processes writing
+    #       the same file (e.g. gunicorn workers) use "stderr" or "external" instead
+    # LOG_MAX_BYTES, LOG_BACKUP_COUNT: size of a log file & number of rotated files to keep
+LOG_MODE = os.environ.get("LOG_MODE", "async")
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text")
+LOG_DESTINATION = os.environ.get("LOG_DESTINATION", "file")
+LOG_ROTATION = os.environ.get("LOG_ROTATION", "size")
+LOG_MAX_BYTES = int(os.environ.get("LOG_MAX_BYTES", 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.environ.get("LOG_BACKUP_COUNT", 5))
+LOG_ROTATION_WHEN = os.environ.get("LOG_ROTATION_WHEN", "midnight")
+
 # common naming format to be used for log files
 # `.strftime()` -> for formatting date objects into readable strings
     # %m: Month as integer (01-12)
     # %d: Day of month (01-31)
     # %Y: Year without century (Ex. 2024 will be 24)
     # %H: Hour (00-23)
-    # %M: Minute (00-59) 
+    # %M: Minute (00-59)
     # %S: Second (00-59)
     # Example Log file name: 06_25_24_09_15_43.log
 LOG_FILE = f"{datetime.now().strftime('%m_%d_%Y_%H_%M_%S')}.log"
 
-# path where log files will get saved
-# Example: d:\mlproject\logs\06_25_24_09_15_43.log
-# NOTE: here `06_25_24_09_15_43.log` is the folder getting created
-# the actual log file will also have same name as this folder and be stored inside it
-logs_path = os.path.join(os.getcwd(),
-                         "logs",
-                         LOG_FILE)
+if LOG_ROTATION == "none":
+    # path where log files will get saved
+    # Example: d:\mlproject\logs\06_25_24_09_15_43.log
+    # NOTE: here `06_25_24_09_15_43.log` is the folder getting created
+    # the actual log file will also have same name as this folder and be stored inside it
+    logs_path = os.path.join(os.getcwd(),
+                             "logs",
+                             LOG_FILE)
+else:
+    # rotating log file -> one fixed file name, older logs are kept as `ml.log.1`, `ml.log.2`, ...
+    LOG_FILE = "ml.log"
+    logs_path = os.path.join(os.getcwd(), "logs")
 
 # create directory using above created path
 # exist_ok=True: avoid `FileExistsError` if directory already exists
 # if directory does not exist then it will get created
-os.makedirs(logs_path, exist_ok=True)
+if LOG_DESTINATION == "file":
+    os.makedirs(logs_path, exist_ok=True)
 
 # final full path of the log file
-# Example: d:\mlproject\logs\06_25_24_09_15_43.log 
+# Example: d:\mlproject\logs\06_25_24_09_15_43.log
 # and inside above folder (06_25_24_09_15_43.log) will be the actual log file of same name (06_25_24_09_15_43) and `.log` extension
 LOG_FILE_PATH = os.path.join(logs_path, LOG_FILE) ## full filepath with filename
 
@@ -40,10 +76,107 @@ LOG_FILE_PATH = os.path.join(logs_path, LOG_FILE) ## full filepath with filename
 # NOTE: `root` is the name the logging module gives to its default logger
 format = "[ %(asctime)s ] %(lineno)d %(name)s - %(levelname)s - %(message)s"
 
+
+# JSON LOG FORMATTER
+class JsonFormatter(logging.Formatter):
+    """
+    Formats every log record as a single line JSON object
+    (for log collectors), e.g.
+    {"time": "2024-06-30 17:26:20,362", "level": "INFO", "name": "root",
+     "module": "data_ingestion", "lineno": 47, "process": 1234,
+     "message": "Data ingestion completed successfully"}
+    """
+    def format(self, record):
+        log_record = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "name": record.name,
+            "module": record.module,
+            "lineno": record.lineno,
+            "process": record.process,
+            "message": record.getMessage()
+        }
+        if record.exc_info:
+            log_record["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            # traceback formatted before the record was queued (see `TracebackQueueHandler`)
+            log_record["exception"] = record.exc_text
+        return json.dumps(log_record)
+
+
+# QUEUE HANDLER
+class TracebackQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler which keeps the traceback of a record
+    apart from its message.
+
+    `QueueHandler.prepare` folds the traceback into the
+    message and clears it, so the formatter of the file
+    handler (behind the queue) could never put it in the
+    `exception` field of the JSON format. Here only the
+    message is merged with its arguments, and the traceback
+    is formatted into `exc_text` before queueing (the
+    exception object itself is not kept).
+    """
+    def prepare(self, record):
+        # copy, so that other handlers of the record are not affected
+        record = copy.copy(record)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.message = record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        return record
+
+
+# handler which writes to the log file (or to standard error)
+if LOG_DESTINATION == "stderr":
+    file_handler = logging.StreamHandler(sys.stderr)
+elif LOG_ROTATION == "size":
+    file_handler = logging.handlers.RotatingFileHandler(LOG_FILE_PATH, maxBytes=LOG_MAX_BYTES,
+                                                        backupCount=LOG_BACKUP_COUNT)
+elif LOG_ROTATION == "time":
+    file_handler = logging.handlers.TimedRotatingFileHandler(LOG_FILE_PATH, when=LOG_ROTATION_WHEN,
+                                                             backupCount=LOG_BACKUP_COUNT)
+elif LOG_ROTATION == "external":
+    file_handler = logging.handlers.WatchedFileHandler(LOG_FILE_PATH)
+else:
+    file_handler = logging.FileHandler(LOG_FILE_PATH)
+file_handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(format))
+
+def _start_log_listener():
+    """
+    Starts the background thread writing the queued
+    log records (on a new queue, so that records queued
+    by a parent process before `fork` are not written twice).
+    """
+    global log_queue, log_listener
+    log_queue = queue.SimpleQueue()
+    log_listener = logging.handlers.QueueListener(log_queue, file_handler)
+    log_listener.start()
+    queue_handler.queue = log_queue
+
+def _stop_log_listener():
+    # write the records still in the queue
+    log_listener.stop()
+
+if LOG_MODE == "async":
+    # log calls only put records on the queue, the listener thread does the (slow) file I/O
+    # (only the message is merged with its arguments before queueing, the file handler applies `format`)
+    queue_handler = TracebackQueueHandler(None)
+    handlers = [queue_handler]
+    _start_log_listener()
+    # threads do not survive `fork` -> forked workers (e.g. of a pre-fork server) start their own listener
+    os.register_at_fork(after_in_child=_start_log_listener)
+    # write the records still in the queue when the program exits
+    atexit.register(_stop_log_listener)
+else:
+    log_listener = None
+    handlers = [file_handler]
+
 logging.basicConfig(
-    filename=LOG_FILE_PATH, # full directory with file name of `.log` file to be created when logging a message
-    format=format,          # style format in which log file will be written
+    handlers=handlers,      # where log records go (queue or `.log` file, see LOG_MODE)
     level=logging.INFO      # set root logger to INFO severity level
 )
 
-# NOTE: INFO level is used for confirming that program is getting executed as expected
\ No newline at end of file
+# NOTE: INFO level is used for confirming that program is getting executed as expected.
@@ -0,0 +1,449 @@
+# DEPENDENCIES
+
+# for working with file paths and custom logging
+import os
+import sys
+from src.logger import logging
+# for sharing the metrics of the worker processes of a pre-fork server
+import json
+# for timing stages
+import time
+from contextlib import contextmanager
+# for making the metrics safe to update from concurrent requests
+import threading
+# for finding the histogram bucket of a value
+import bisect
+# for counting sampled call stacks
+from collections import Counter
+
+
+# upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                   0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+# helper function to format label values
+def _format_labels(labels:tuple):
+    """
+    Returns the labels in Prometheus text format,
+    e.g. `{stage="transform"}` (empty string if no labels).
+
+    Input Parameters ->
+    `labels`: (tuple) sorted (label name, label value) pairs
+    """
+    if not labels:
+        return ""
+    formatted_labels = ",".join(
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in labels
+    )
+    return "{" + formatted_labels + "}"
+
+
+# HISTOGRAM
+class Histogram:
+    """
+    Counts of observed values per bucket,
+    plus their sum and total count.
+    """
+    # variables
+    def __init__(self, buckets:tuple=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        # last count is for values above the largest bucket (`+Inf`)
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    # methods
+    def observe(self, value:float):
+        # a bucket counts the values less than or equal to its upper bound
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+# METRICS REGISTRY
+class MetricsRegistry:
+    """
+    Process-wide registry of counters and latency
+    histograms, rendered in the Prometheus text
+    exposition format by `render` (for `/metrics`).
+
+    Other components (e.g. the artifact cache) can
+    expose their own counters through `register_collector`.
+
+    In a pre-fork server every worker has its own registry,
+    so with `multiprocess_dir` set each worker saves a
+    snapshot of its metrics (`<pid>.json`) there every
+    `flush_interval` seconds, and `render` returns the
+    sum over all workers (as the `prometheus_client`
+    multiprocess mode): counters & histograms are summed,
+    gauges get a `pid` label. The snapshots of exited
+    workers keep counting (see `mark_process_dead`), so
+    the summed counters never go down.
+    """
+    # variables
+    def __init__(self, prefix:str="ml", multiprocess_dir:str=None, flush_interval:float=1.0):
+        self.prefix = prefix
+        # directory shared by the worker processes (None -> metrics of this process only)
+        self.multiprocess_dir = multiprocess_dir
+        self.flush_interval = flush_interval
+        # process whose flush thread is running (threads do not survive a fork)
+        self._flush_pid = None
+        self._lock = threading.Lock()
+        # metric name -> (type, help text)
+        self._descriptions = {}
+        # (metric name, labels) -> Histogram / counter value
+        self._histograms = {}
+        self._counters = {}
+        # functions returning extra (name, type, help, labels dict, value) samples
+        self._collectors = []
+
+    # methods
+    def _describe(self, name:str, metric_type:str, help_text:str):
+        name = f"{self.prefix}_{name}"
+        if name not in self._descriptions:
+            self._descriptions[name] = (metric_type, help_text)
+        return name
+
+    def _start_flushing(self):
+        """
+        Starts saving the snapshots of this process
+        in the background (once per process).
+        """
+        pid = os.getpid()
+        if self.multiprocess_dir is None or self._flush_pid == pid:
+            return
+        with self._lock:
+            if self._flush_pid == pid:
+                return
+            self._flush_pid = pid
+
+        def flush_periodically():
+            while True:
+                time.sleep(self.flush_interval)
+                try:
+                    self.flush()
+                except Exception as e:
+                    logging.info(msg=f"Saving the metrics snapshot failed: {e}")
+
+        threading.Thread(target=flush_periodically, name="metrics-flush", daemon=True).start()
+
+    def observe(self, name:str, value:float, help_text:str="", buckets:tuple=DEFAULT_BUCKETS, **labels):
+        """
+        Records a value (e.g. a duration in seconds) in a histogram.
+
+        Input Parameters ->
+        `name`: (str) metric name (without prefix)
+        `value`: (float) observed value
+        `help_text`: (str) description of the metric
+        `buckets`: (tuple) bucket upper bounds (used when the histogram is created)
+        `labels`: label name -> label value
+        """
+        self._start_flushing()
+        with self._lock:
+            key = (self._describe(name, "histogram", help_text), tuple(sorted(labels.items())))
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets=buckets)
+            histogram.observe(value)
+
+    def increment(self, name:str, value:float=1, help_text:str="", **labels):
+        """
+        Increments a counter.
+
+        Input Parameters ->
+        `name`: (str) metric name (without prefix, should end with `_total`)
+        `value`: (float) amount to add
+        `help_text`: (str) description of the metric
+        `labels`: label name -> label value
+        """
+        self._start_flushing()
+        with self._lock:
+            key = (self._describe(name, "counter", help_text), tuple(sorted(labels.items())))
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    @contextmanager
+    def time_stage(self, stage:str):
+        """
+        Context manager which records the time spent
+        inside it in the `stage_duration_seconds` histogram.
+
+        Input Parameters ->
+        `stage`: (str) name of the stage, e.g. "transform"
+        """
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("stage_duration_seconds", time.perf_counter() - start_time,
+                         help_text="Time spent in each stage of the prediction path",
+                         stage=stage)
+
+    def register_collector(self, collector):
+        """
+        Registers a function which is called on every
+        `render` and returns an iterable of
+        (name, type, help text, labels dict, value) samples.
+
+        Input Parameters ->
+        `collector`: function without arguments
+        """
+        self._collectors.append(collector)
+
+    def _get_snapshot(self, pid_label:bool=False):
+        """
+        Returns the metrics of this process as a dict of
+        "descriptions" (name -> (type, help text)),
+        "counters" & "gauges" ((name, labels) -> value)
+        and "histograms" ((name, labels) -> (buckets,
+        counts, sum, count)), collector samples included.
+
+        Input Parameters ->
+        `pid_label`: (bool) if True, gauges get a `pid` label (to tell the processes apart)
+        """
+        # take a consistent snapshot, then run the collectors outside the lock
+        with self._lock:
+            descriptions = dict(self._descriptions)
+            counters = dict(self._counters)
+            histograms = {
+                key: (histogram.buckets, list(histogram.counts), histogram.sum, histogram.count)
+                for key, histogram in self._histograms.items()
+            }
+        gauges = {}
+
+        for collector in self._collectors:
+            try:
+                for name, metric_type, help_text, labels, value in collector():
+                    name = f"{self.prefix}_{name}"
+                    descriptions.setdefault(name, (metric_type, help_text))
+                    if metric_type == "gauge":
+                        if pid_label:
+                            labels = {"pid": os.getpid(), **labels}
+                        gauges[(name, tuple(sorted(labels.items())))] = value
+                    else:
+                        counters[(name, tuple(sorted(labels.items())))] = value
+            except Exception as e:
+                # a broken collector must not take down `/metrics`
+                logging.info(msg=f"Metrics collector {collector} failed: {e}")
+
+        return {"descriptions": descriptions, "counters": counters, "gauges": gauges, "histograms": histograms}
+
+    def flush(self):
+        """
+        Saves the snapshot of this process in
+        `multiprocess_dir` (replacing the previous one).
+        """
+        snapshot = self._get_snapshot(pid_label=True)
+        os.makedirs(self.multiprocess_dir, exist_ok=True)
+        file_path = os.path.join(self.multiprocess_dir, f"{os.getpid()}.json")
+        with open(f"{file_path}.tmp", "w") as file_object:
+            json.dump({
+                "descriptions": snapshot["descriptions"],
+                **{
+                    kind: [[name, labels, value] for (name, labels), value in snapshot[kind].items()]
+                    for kind in ("counters", "gauges", "histograms")
+                }
+            }, file_object)
+        os.replace(f"{file_path}.tmp", file_path)
+
+    def mark_process_dead(self, pid:int):
+        """
+        Drops the gauges of an exited worker from its
+        snapshot (its counters & histograms keep counting
+        in the sum). Called by the server's parent process.
+
+        Input Parameters ->
+        `pid`: (int) process id of the exited worker
+        """
+        file_path = os.path.join(self.multiprocess_dir, f"{pid}.json")
+        try:
+            with open(file_path, "r") as file_object:
+                snapshot = json.load(file_object)
+        except FileNotFoundError:
+            return
+        snapshot["gauges"] = []
+        with open(f"{file_path}.tmp", "w") as file_object:
+            json.dump(snapshot, file_object)
+        os.replace(f"{file_path}.tmp", file_path)
+
+    def _get_multiprocess_snapshot(self):
+        """
+        Returns the sum of the snapshots of all
+        processes (same structure as `_get_snapshot`).
+        """
+        self.flush()
+
+        merged = {"descriptions": {}, "counters": {}, "gauges": {}, "histograms": {}}
+        for file_name in sorted(os.listdir(self.multiprocess_dir)):
+            if not file_name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.multiprocess_dir, file_name), "r") as file_object:
+                    snapshot = json.load(file_object)
+            except (OSError, ValueError):
+                # removed while listing the directory
+                continue
+
+            for name, (metric_type, help_text) in snapshot["descriptions"].items():
+                merged["descriptions"].setdefault(name, (metric_type, help_text))
+            for name, labels, value in snapshot["counters"]:
+                key = (name, tuple(tuple(label) for label in labels))
+                merged["counters"][key] = merged["counters"].get(key, 0) + value
+            for name, labels, value in snapshot["gauges"]:
+                merged["gauges"][(name, tuple(tuple(label) for label in labels))] = value
+            for name, labels, (buckets, counts, histogram_sum, histogram_count) in snapshot["histograms"]:
+                key = (name, tuple(tuple(label) for label in labels))
+                if key in merged["histograms"]:
+                    _, merged_counts, merged_sum, merged_count = merged["histograms"][key]
+                    counts = [merged_bucket_count + count for merged_bucket_count, count in zip(merged_counts, counts)]
+                    histogram_sum += merged_sum
+                    histogram_count += merged_count
+                merged["histograms"][key] = (tuple(buckets), counts, histogram_sum, histogram_count)
+
+        return merged
+
+    def render(self):
+        """
+        Returns all metrics (of all worker processes if
+        `multiprocess_dir` is set) in the Prometheus
+        text exposition format (version 0.0.4).
+        """
+        if self.multiprocess_dir is not None:
+            snapshot = self._get_multiprocess_snapshot()
+        else:
+            snapshot = self._get_snapshot()
+        descriptions = snapshot["descriptions"]
+
+        samples = {}
+        for kind in ("counters", "gauges"):
+            for (name, labels), value in snapshot[kind].items():
+                samples.setdefault(name, []).append(f"{name}{_format_labels(labels)} {value}")
+
+        for (name, labels), (buckets, counts, histogram_sum, histogram_count) in snapshot["histograms"].items():
+            lines = samples.setdefault(name, [])
+            cumulative_count = 0
+            for upper_bound, count in zip(list(buckets) + ["+Inf"], counts):
+                cumulative_count += count
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', upper_bound),))} {cumulative_count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {histogram_sum}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram_count}")
+
+        output_lines = []
+        for name, lines in samples.items():
+            metric_type, help_text = descriptions[name]
+            output_lines.append(f"# HELP {name} {help_text}")
+            output_lines.append(f"# TYPE {name} {metric_type}")
+            output_lines.extend(lines)
+
+        return "\n".join(output_lines) + "\n"
+
+
+# SAMPLING PROFILER
+class SamplingProfiler:
+    """
+    Low overhead statistical profiler.
+
+    While running, a background thread takes a snapshot
+    of the call stack of every other thread at a fixed
+    interval and counts how often each stack is seen.
+    The report is in the "collapsed stack" format
+    (`frame;frame;frame count`) read by flame graph tools.
+    """
+    # variables
+    def __init__(self, interval:float=0.005):
+        self.interval = interval    # seconds between samples
+        self.stack_counts = Counter()
+        self.n_samples = 0
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    # methods
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """
+        Starts sampling (clears the previous samples).
+        """
+        if self.is_running():
+            return
+        self.stack_counts = Counter()
+        self.n_samples = 0
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        logging.info(msg=f"Sampling profiler started (interval {self.interval * 1000:.1f} ms)")
+
+    def stop(self):
+        """
+        Stops sampling (the samples are kept for `get_report`).
+        """
+        if not self.is_running():
+            return
+        self._stop_event.set()
+        self._thread.join()
+        logging.info(msg=f"Sampling profiler stopped after {self.n_samples} samples")
+
+    def _run(self):
+        own_thread_id = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_filename}:{code.co_name}:{frame.f_lineno}")
+                    frame = frame.f_back
+                # root frame first
+                self.stack_counts[";".join(reversed(stack))] += 1
+            self.n_samples += 1
+
+    def get_report(self, limit:int=None):
+        """
+        Returns the sampled stacks (most frequent first)
+        in the collapsed stack format.
+
+        Input Parameters ->
+        `limit`: (int) maximum number of stacks to return (default: all)
+        """
+        return "\n".join(
+            f"{stack} {count}"
+            for stack, count in self.stack_counts.most_common(limit)
+        ) + "\n"
+
+
+# process-wide metrics registry & profiler used by the web app and prediction pipeline
+# (PROMETHEUS_MULTIPROC_DIR -> `/metrics` of any worker of a pre-fork server returns the sum over all workers)
+metrics = MetricsRegistry(multiprocess_dir=os.environ.get("PROMETHEUS_MULTIPROC_DIR") or None)
+profiler = SamplingProfiler()
+
+
+# helper function to measure the memory of the current process
+def get_process_memory():
+    """
+    Returns the memory of the current process in bytes:
+    resident (`rss`), proportional (`pss`, shared pages
+    split between the processes sharing them), and the
+    `shared` & `private` parts of the resident memory.
+
+    Reads `/proc/self/smaps_rollup` (Linux), elsewhere
+    only the peak resident memory is available.
+    """
+    try:
+        with open("/proc/self/smaps_rollup", "r") as file_object:
+            fields = {}
+            for line in file_object:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1]) * 1024
+        return {
+            "rss": fields.get("Rss", 0),
+            "pss": fields.get("Pss", 0),
+            "shared": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+            "private": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+        }
+    except OSError:
+        import resource
+        return {"max_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024}
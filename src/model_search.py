@@ -0,0 +1,701 @@
+# DEPENDENCIES
+
+# for working with custom exception and custom logging
+import os
+import sys
+from src.exception import CustomException
+from src.logger import logging
+# for measuring fit times
+import time
+# for computing the number of halving rounds
+import math
+# for defining the search result class
+from dataclasses import dataclass
+# for working with arrays
+import numpy as np
+# for creating untrained copies of models and parameter combinations
+from sklearn.base import clone
+from sklearn.model_selection import ParameterGrid, check_cv
+# for machine learning model evaluation
+from sklearn.metrics import r2_score
+# for running fits in parallel processes
+from joblib import Parallel, delayed, effective_n_jobs
+# for limiting BLAS/OpenMP threads inside each process
+from threadpoolctl import threadpool_limits
+
+
+# MODEL SEARCH RESULT
+@dataclass
+class ModelSearchResult:
+    """
+    Outcome of the hyperparameter search
+    for a single model.
+    """
+    # name of the model (key in the `models` dict)
+    model_name: str
+    # best parameter set refit on the full training set (ready to be saved)
+    best_estimator: object
+    # best parameter set found by the search
+    best_params: dict
+    # mean CV R^2 of the best parameter set
+    best_cv_score: float
+    # R^2 of `best_estimator` on the test set
+    test_score: float
+    # time taken to refit the best parameter set (seconds)
+    refit_time: float
+    # table of all cross validated parameter sets (like `GridSearchCV.cv_results_`):
+    # params, mean/std/split test scores, mean fit time (+ n_resources & iter for halving)
+    cv_results: dict
+
+    # methods
+    def get_cv_results_dataframe(self):
+        """
+        Returns `cv_results` as a dataframe.
+        """
+        import pandas as pd
+        return pd.DataFrame(data=self.cv_results)
+
+
+# helper function to stop models from starting their own threads
+def _limit_model_threads(model):
+    """
+    Sets `n_jobs=1` on models which parallelize
+    on their own (e.g. Random Forest, KNN, XGBoost),
+    so that worker processes do not oversubscribe the CPU.
+
+    Returns True if the model has an `n_jobs` parameter.
+
+    Input Parameters ->
+    `model`: machine learning model instance
+    """
+    if "n_jobs" not in model.get_params(deep=False):
+        return False
+    model.set_params(n_jobs=1)
+    return True
+
+
+# helper function to get the input features in the dtype a model is fitted on
+def _get_model_input(model, X):
+    """
+    Returns the input features as float64 for linear
+    models, whose solvers otherwise return float32
+    coefficients (huge cancelling coefficients of collinear
+    one hot features then round visibly); the other families
+    keep the (smaller) float32 features.
+
+    Input Parameters ->
+    `model`: machine learning model instance
+    `X`: (array or CSR matrix) input features
+    """
+    if type(model).__module__.startswith("sklearn.linear_model") and X.dtype != np.float64:
+        return X.astype(np.float64)
+    return X
+
+
+# task 1: fit & score a single (model, parameter set, fold)
+def _fit_and_score(model, parameters:dict, X, y, train_indices, validation_indices):
+    """
+    Fits an untrained copy of the model with the given
+    parameters on one CV training fold and scores it
+    (R^2) on the corresponding validation fold.
+
+    Returns (R^2 score, fit & score time in seconds).
+    """
+    start_time = time.perf_counter()
+
+    with threadpool_limits(limits=1):
+        model = clone(model).set_params(**parameters)
+        _limit_model_threads(model)
+        try:
+            model.fit(_get_model_input(model, X[train_indices]), y[train_indices])
+            score = model.score(_get_model_input(model, X[validation_indices]), y[validation_indices])
+        except Exception:
+            # same as `GridSearchCV(error_score=np.nan)`
+            score = np.nan
+
+    return score, time.perf_counter() - start_time
+
+
+# models whose predictions for every smaller `n_estimators` can be read off one fitted ensemble
+STAGED_MODELS = (
+    "AdaBoostRegressor",
+    "GradientBoostingRegressor",
+    "RandomForestRegressor",
+    "ExtraTreesRegressor",
+    "XGBRegressor"
+)
+
+
+# helper function to get the predictions of the first `n` estimators of an ensemble
+def _get_staged_predictions(model, X, n_estimators_list:list):
+    """
+    Returns a dict mapping each `n_estimators` value
+    to the predictions of the fitted ensemble
+    truncated to its first `n_estimators` members,
+    which equal the predictions of an ensemble fit
+    with that `n_estimators` (same random state).
+
+    Input Parameters ->
+    `model`: fitted ensemble (one of `STAGED_MODELS`)
+    `X`: (array) input features
+    `n_estimators_list`: (list) ensemble sizes to predict with
+    """
+    model_class_name = type(model).__name__
+    predictions = {}
+
+    if model_class_name in ("AdaBoostRegressor", "GradientBoostingRegressor"):
+        # boosting: prediction after each boosting stage
+        wanted_sizes = set(n_estimators_list)
+        last_prediction = None
+        for n_estimators, prediction in enumerate(model.staged_predict(X), start=1):
+            last_prediction = prediction
+            if n_estimators in wanted_sizes:
+                predictions[n_estimators] = prediction
+        # boosting stopped early -> larger ensembles stop at the same stage
+        for n_estimators in n_estimators_list:
+            predictions.setdefault(n_estimators, last_prediction)
+
+    elif model_class_name in ("RandomForestRegressor", "ExtraTreesRegressor"):
+        # forest: running average of the individual trees' predictions
+        cumulative_predictions = np.cumsum([tree.predict(X) for tree in model.estimators_], axis=0)
+        for n_estimators in n_estimators_list:
+            predictions[n_estimators] = cumulative_predictions[n_estimators - 1] / n_estimators
+
+    elif model_class_name == "XGBRegressor":
+        # xgboost: prediction with the first `n` boosted trees
+        for n_estimators in n_estimators_list:
+            predictions[n_estimators] = model.predict(X, iteration_range=(0, n_estimators))
+
+    else:
+        raise ValueError(f"{model_class_name} does not support staged predictions")
+
+    return predictions
+
+
+# task 1b: fit an ensemble once & score it at several sizes
+def _fit_and_score_staged(model, parameters:dict, n_estimators_list:list,
+                          X, y, train_indices, validation_indices):
+    """
+    Fits an untrained copy of the ensemble with the
+    largest `n_estimators` on one CV training fold and
+    scores (R^2) every smaller size on the validation
+    fold from the same fitted ensemble.
+
+    Returns (list of R^2 scores (one per size), fit & score time in seconds).
+    """
+    start_time = time.perf_counter()
+
+    with threadpool_limits(limits=1):
+        model = clone(model).set_params(**parameters, n_estimators=max(n_estimators_list))
+        _limit_model_threads(model)
+        try:
+            model.fit(X[train_indices], y[train_indices])
+            y_validation = y[validation_indices]
+            predictions = _get_staged_predictions(model, X[validation_indices], n_estimators_list)
+            scores = [
+                r2_score(y_true=y_validation, y_pred=predictions[n_estimators])
+                for n_estimators in n_estimators_list
+            ]
+        except Exception:
+            # same as `GridSearchCV(error_score=np.nan)`
+            scores = [np.nan] * len(n_estimators_list)
+
+    return scores, time.perf_counter() - start_time
+
+
+# task 2: refit the best parameter set of a model on the full training set
+def _refit(model, parameters:dict, X, y):
+    """
+    Fits an untrained copy of the model with the
+    given parameters on the full training set.
+
+    Returns (trained model, fit time in seconds).
+    """
+    start_time = time.perf_counter()
+
+    with threadpool_limits(limits=1):
+        model = clone(model).set_params(**parameters)
+        original_parameters = model.get_params(deep=False)
+        X = _get_model_input(model, X)
+        if _limit_model_threads(model):
+            model.fit(X, y)
+            # the saved model should use its original parallelism again
+            model.set_params(n_jobs=original_parameters["n_jobs"])
+        else:
+            model.fit(X, y)
+
+    return model, time.perf_counter() - start_time
+
+
+# helper function to group candidates which only differ in `n_estimators`
+def _group_candidates(models:dict, candidates:list, n_train_samples:list, warm_start:bool):
+    """
+    Groups the candidates into fit jobs. Candidates of an
+    ensemble (see `STAGED_MODELS`) which only differ in
+    `n_estimators` share one job, fit once at the largest size.
+
+    Returns a list of (model name, parameters without `n_estimators`
+    (or all parameters), list of `n_estimators` (or None),
+    list of candidate indices, number of training samples) tuples.
+
+    Input Parameters ->
+    models: (dict) model name -> model instance (untrained)
+    candidates: (list) of (model name, parameter set) tuples
+    n_train_samples: (list) number of training samples per candidate (or None)
+    warm_start: (bool) if False, every candidate is a separate job
+    """
+    jobs = []
+    staged_jobs = {}
+    for i, (model_name, parameters) in enumerate(candidates):
+        n_samples = None if n_train_samples is None else n_train_samples[i]
+
+        is_staged = (
+            warm_start
+            and "n_estimators" in parameters
+            and type(models[model_name]).__name__ in STAGED_MODELS
+        )
+        if not is_staged:
+            jobs.append((model_name, parameters, None, [i], n_samples))
+            continue
+
+        other_parameters = {key: value for key, value in parameters.items() if key != "n_estimators"}
+        job_key = (model_name, repr(sorted(other_parameters.items())), n_samples)
+        if job_key not in staged_jobs:
+            staged_jobs[job_key] = (model_name, other_parameters, [], [], n_samples)
+            jobs.append(staged_jobs[job_key])
+        staged_jobs[job_key][2].append(parameters["n_estimators"])
+        staged_jobs[job_key][3].append(i)
+
+    return jobs
+
+
+# helper function to cross validate many (model, parameter set) candidates at once
+def _cross_validate_candidates(X_train, y_train, models:dict, candidates:list,
+                               folds:list, n_jobs, n_train_samples:list=None,
+                               warm_start:bool=True):
+    """
+    Cross validates every (model name, parameter set)
+    candidate, with every (fit job, fold) combination
+    being a separate task in the process pool.
+
+    Returns (array of R^2 scores, array of fit times in seconds),
+    both with shape (candidates, folds). The time of a shared
+    ensemble fit is split evenly among its candidates.
+
+    Input Parameters ->
+    X_train, y_train: (array) Training set
+    models: (dict) model name -> model instance (untrained)
+    candidates: (list) of (model name, parameter set) tuples
+    folds: (list) of (train indices, validation indices) tuples
+    n_jobs: (int) number of worker processes
+    n_train_samples: (list) if given, number of training samples
+                     (first rows of each training fold) used per candidate
+    warm_start: (bool) if True, ensembles are fit once per combination of
+                their other parameters and scored at every `n_estimators`
+    """
+    jobs = _group_candidates(models, candidates, n_train_samples, warm_start)
+
+    cv_results = Parallel(n_jobs=n_jobs)(
+        delayed(_fit_and_score if n_estimators_list is None else _fit_and_score_staged)(
+            models[model_name], parameters,
+            *([] if n_estimators_list is None else [n_estimators_list]),
+            X_train, y_train,
+            train_indices if n_samples is None else train_indices[:n_samples],
+            validation_indices
+        )
+        for model_name, parameters, n_estimators_list, _, n_samples in jobs
+        for train_indices, validation_indices in folds
+    )
+
+    # scatter the scores & fit times of each job back to its candidates
+    cv_scores = np.full((len(candidates), len(folds)), np.nan)
+    fit_times = np.zeros((len(candidates), len(folds)))
+    task_index = 0
+    for _, _, _, candidate_indices, _ in jobs:
+        for fold_index in range(len(folds)):
+            scores, elapsed = cv_results[task_index]
+            cv_scores[candidate_indices, fold_index] = scores
+            fit_times[candidate_indices, fold_index] = elapsed / len(candidate_indices)
+            task_index += 1
+
+    if len(jobs) < len(candidates):
+        logging.info(msg=f"Warm start: {len(candidates)} parameter sets cross validated with {len(jobs)} fits per fold")
+
+    return cv_scores, fit_times
+
+
+# helper function to pick the best candidate
+def _get_best_index(mean_scores):
+    """
+    Returns the index of the highest mean CV score.
+    (`nanargmax` keeps the first of equally good
+    parameter sets, like `GridSearchCV`)
+
+    Input Parameters ->
+    mean_scores: (array) mean CV score of each candidate
+    """
+    if np.all(np.isnan(mean_scores)):
+        return 0
+    return int(np.nanargmax(mean_scores))
+
+
+# helper function to build the table of cross validated parameter sets
+def _build_cv_results(parameter_sets:list, cv_scores, fit_times, **extra_columns):
+    """
+    Returns a `cv_results` dict (like `GridSearchCV.cv_results_`)
+    for the cross validated parameter sets of one model.
+
+    Input Parameters ->
+    parameter_sets: (list) cross validated parameter sets
+    cv_scores: (array) R^2 scores with shape (parameter sets, folds)
+    fit_times: (array) fit times with shape (parameter sets, folds)
+    extra_columns: additional columns (lists of the same length)
+    """
+    cv_results = {
+        "params": list(parameter_sets),
+        "mean_test_score": cv_scores.mean(axis=1),
+        "std_test_score": cv_scores.std(axis=1),
+        "mean_fit_time": fit_times.mean(axis=1)
+    }
+    for fold_index in range(cv_scores.shape[1]):
+        cv_results[f"split{fold_index}_test_score"] = cv_scores[:, fold_index]
+    cv_results.update(extra_columns)
+
+    return cv_results
+
+
+# helper function to refit the best parameter sets & evaluate them on the test set
+def _refit_and_evaluate(X_train, y_train, X_test, y_test,
+                        models:dict, best_parameters:dict,
+                        best_cv_scores:dict, cv_results:dict, n_jobs):
+    """
+    Refits the best parameter set of every model
+    on the full training set (in parallel) and
+    scores it on the test set.
+
+    Returns a dict mapping model name -> `ModelSearchResult`.
+    """
+    refit_results = Parallel(n_jobs=n_jobs)(
+        delayed(_refit)(models[model_name], best_parameters[model_name], X_train, y_train)
+        for model_name in models
+    )
+
+    results = {}
+    for model_name, (trained_model, refit_time) in zip(models, refit_results):
+        results[model_name] = ModelSearchResult(
+            model_name=model_name,
+            best_estimator=trained_model,
+            best_params=best_parameters[model_name],
+            best_cv_score=float(best_cv_scores[model_name]),
+            test_score=r2_score(y_true=y_test, y_pred=trained_model.predict(_get_model_input(trained_model, X_test))),
+            refit_time=refit_time,
+            cv_results=cv_results[model_name]
+        )
+
+    return results
+
+
+# helper function to get the CV folds
+def _get_folds(X_train, y_train, cv):
+    """
+    Returns the same CV folds as `GridSearchCV`
+    (KFold without shuffling for regression).
+    """
+    cv_splitter = check_cv(cv, y_train, classifier=False)
+    return list(cv_splitter.split(X_train, y_train))
+
+
+# helper function to get all (model, parameter set) combinations
+def _get_candidates(models:dict, params:dict, model_names:list=None):
+    """
+    Returns a list of (model name, parameter set)
+    tuples for every parameter set in the grids.
+    """
+    return [
+        (model_name, parameters)
+        for model_name in (models if model_names is None else model_names)
+        for parameters in ParameterGrid(params[model_name])
+    ]
+
+
+# parallel grid search
+def parallel_grid_search(X_train, y_train,
+                         X_test, y_test,
+                         models:dict, params:dict,
+                         cv=3, n_jobs=-1, warm_start:bool=True):
+    """
+    Grid search over all models at once: every
+    (model, parameter set, CV fold) combination is
+    a separate task spread over a pool of processes.
+
+    Gives the same result as running `GridSearchCV`
+    for each model one after another: the parameter set
+    with the highest mean CV R^2 (first one on ties) is
+    refit on the full training set and scored on the test set.
+
+    Returns a dict mapping model name -> `ModelSearchResult`.
+
+    Input Parameters ->
+    X_train, y_train: (array) Training set
+    X_test, y_test: (array) Test set
+    models: (dict) model name -> model instance (untrained)
+    params: (dict) model name -> parameter grid
+    cv: number of CV folds (or CV splitter)
+    n_jobs: (int) number of worker processes (-1 -> all cores)
+    warm_start: (bool) if True, ensembles are fit once per combination of
+                their other parameters and scored at every `n_estimators`
+    """
+    try:
+        start_time = time.perf_counter()
+        n_workers = effective_n_jobs(n_jobs)
+
+        folds = _get_folds(X_train, y_train, cv)
+        candidates = _get_candidates(models, params)
+
+        logging.info(msg=f"Parallel grid search of {len(candidates)} parameter sets x {len(folds)} folds on {n_workers} workers initiated")
+
+        # step 1: cross validate every parameter set of every model
+        cv_scores, fit_times = _cross_validate_candidates(X_train, y_train, models,
+                                                          candidates, folds, n_jobs,
+                                                          warm_start=warm_start)
+
+        # pick the parameter set with the best mean CV score for each model
+        mean_cv_scores = cv_scores.mean(axis=1)
+        best_parameters = {}
+        best_cv_scores = {}
+        cv_results = {}
+        for model_name in models:
+            candidate_indices = [
+                i
+                for i, (candidate_model_name, _) in enumerate(candidates)
+                if candidate_model_name == model_name
+            ]
+            best_index = candidate_indices[_get_best_index(mean_cv_scores[candidate_indices])]
+            best_parameters[model_name] = candidates[best_index][1]
+            best_cv_scores[model_name] = mean_cv_scores[best_index]
+            cv_results[model_name] = _build_cv_results(
+                parameter_sets=[candidates[i][1] for i in candidate_indices],
+                cv_scores=cv_scores[candidate_indices],
+                fit_times=fit_times[candidate_indices]
+            )
+
+        # step 2: refit the best parameter set of every model on the full training set
+        results = _refit_and_evaluate(X_train, y_train, X_test, y_test,
+                                      models, best_parameters, best_cv_scores,
+                                      cv_results, n_jobs)
+        task_time = fit_times.sum() + sum(result.refit_time for result in results.values())
+
+        wall_clock_time = time.perf_counter() - start_time
+        logging.info(msg=(
+            f"Parallel grid search completed in {wall_clock_time:.1f}s wall-clock "
+            f"for {task_time:.1f}s of fitting on {n_workers} workers "
+            f"(speedup {task_time / wall_clock_time:.1f}x)"
+        ))
+
+        return results
+
+    except Exception as e:
+        raise CustomException(error_message=e, error_detail=sys)
+
+
+# successive halving search
+def successive_halving_search(X_train, y_train,
+                              X_test, y_test,
+                              models:dict, params:dict,
+                              cv=3, n_jobs=-1,
+                              factor:int=3, min_resources:int=None,
+                              max_fits:int=None, time_budget:float=None,
+                              compare_to_grid:bool=False,
+                              random_state:int=0, warm_start:bool=True):
+    """
+    Budget-aware alternative to the exhaustive grid search.
+
+    All parameter sets of a model are first cross validated
+    on a small subsample of the training folds. Only the best
+    `1 / factor` of them survive into the next round, which
+    uses `factor` times more samples, until the last round
+    uses the full training folds (same idea as
+    `HalvingGridSearchCV`). Rounds of all models run together
+    in the process pool.
+
+    The search stops early once `max_fits` fits have been made
+    or `time_budget` seconds have passed; each model then
+    keeps its best parameter set from the largest subsample
+    evaluated so far.
+
+    Returns a dict mapping model name -> `ModelSearchResult`
+    (`cv_results` lists every round, with its number of
+    training samples in `n_resources` and round in `iter`).
+
+    Input Parameters ->
+    X_train, y_train: (array) Training set
+    X_test, y_test: (array) Test set
+    models: (dict) model name -> model instance (untrained)
+    params: (dict) model name -> parameter grid
+    cv: number of CV folds (or CV splitter)
+    n_jobs: (int) number of worker processes (-1 -> all cores)
+    factor: (int) fraction of parameter sets dropped (and growth of samples) per round
+    min_resources: (int) number of training samples in the first round
+                   (default: chosen so that the last round uses all samples)
+    max_fits: (float) budget on the CV fits, counted as full-size fits
+              (a fit on a third of the training fold counts as 1/3)
+    time_budget: (float) budget on the search time in seconds
+    compare_to_grid: (bool) also run the full grid to log how close the
+                     halving search gets to it (for validating the settings)
+    random_state: (int) seed for subsampling the training folds
+    warm_start: (bool) if True, ensembles are fit once per combination of
+                their other parameters and scored at every `n_estimators`
+    """
+    try:
+        start_time = time.perf_counter()
+        n_workers = effective_n_jobs(n_jobs)
+
+        # shuffle each training fold once, every round trains on its first `n` rows
+        random_generator = np.random.RandomState(random_state)
+        folds = [
+            (random_generator.permutation(train_indices), validation_indices)
+            for train_indices, validation_indices in _get_folds(X_train, y_train, cv)
+        ]
+        n_fold_samples = min(len(train_indices) for train_indices, _ in folds)
+
+        # surviving parameter sets & number of halving rounds of each model
+        survivors = {}
+        n_rounds = {}
+        for model_name in models:
+            survivors[model_name] = list(ParameterGrid(params[model_name]))
+            n_rounds[model_name] = 1 + int(math.floor(math.log(len(survivors[model_name]), factor) + 1e-9))
+
+        # best (parameter set, mean CV score) of each model on the largest subsample so far
+        best_so_far = {}
+        # cross validated (parameter sets, scores, fit times, n_resources, iter) of each model
+        history = {model_name: ([], [], [], [], []) for model_name in models}
+
+        # number of CV fits and their cost in full-size fits (fit on a subsample -> fraction)
+        n_fits = 0
+        fit_cost = 0.0
+        n_grid_fits = sum(len(candidates) for candidates in survivors.values()) * len(folds)
+        round_index = 0
+        budget_exhausted = False
+
+        while any(round_index < n_rounds[model_name] for model_name in models):
+            # models still being searched in this round
+            active_model_names = [
+                model_name
+                for model_name in models
+                if round_index < n_rounds[model_name]
+            ]
+
+            # candidates & training sample sizes of this round
+            candidates = []
+            n_train_samples = []
+            for model_name in active_model_names:
+                rounds_left = n_rounds[model_name] - 1 - round_index
+                if min_resources is None:
+                    # last round of every model uses the full training folds
+                    n_samples = n_fold_samples // (factor ** rounds_left)
+                else:
+                    n_samples = min_resources * (factor ** round_index)
+                n_samples = min(max(n_samples, 2 * len(folds)), n_fold_samples)
+
+                for parameters in survivors[model_name]:
+                    candidates.append((model_name, parameters))
+                    n_train_samples.append(n_samples)
+
+            # stop before starting a round which would exceed the fit budget
+            round_cost = sum(n_train_samples) * len(folds) / n_fold_samples
+            if max_fits is not None and fit_cost + round_cost > max_fits and best_so_far:
+                budget_exhausted = True
+                break
+
+            cv_scores, fit_times = _cross_validate_candidates(X_train, y_train, models, candidates,
+                                                              folds, n_jobs, n_train_samples,
+                                                              warm_start=warm_start)
+            n_fits += len(candidates) * len(folds)
+            fit_cost += round_cost
+            mean_cv_scores = cv_scores.mean(axis=1)
+
+            # keep the best `1 / factor` parameter sets of every model
+            for model_name in active_model_names:
+                candidate_indices = [
+                    i
+                    for i, (candidate_model_name, _) in enumerate(candidates)
+                    if candidate_model_name == model_name
+                ]
+                model_mean_scores = mean_cv_scores[candidate_indices]
+                best_index = _get_best_index(model_mean_scores)
+                best_so_far[model_name] = (survivors[model_name][best_index], model_mean_scores[best_index])
+
+                for i in candidate_indices:
+                    history[model_name][0].append(candidates[i][1])
+                    history[model_name][1].append(cv_scores[i])
+                    history[model_name][2].append(fit_times[i])
+                    history[model_name][3].append(n_train_samples[i])
+                    history[model_name][4].append(round_index)
+
+                # stable sort on (-score) keeps the original order on ties, NaN scores last
+                ranking = np.argsort(np.where(np.isnan(model_mean_scores), np.inf, -model_mean_scores), kind="stable")
+                n_survivors = max(1, int(math.ceil(len(ranking) / factor)))
+                survivors[model_name] = [survivors[model_name][i] for i in ranking[:n_survivors]]
+
+            round_index += 1
+
+            # stop once the time budget is used up
+            if time_budget is not None and time.perf_counter() - start_time > time_budget:
+                budget_exhausted = any(round_index < n_rounds[model_name] for model_name in models)
+                break
+
+        if budget_exhausted:
+            logging.info(msg=f"Successive halving stopped early after {round_index} rounds: budget exhausted")
+
+        # refit the best parameter set of every model on the full training set
+        best_parameters = {model_name: best_so_far[model_name][0] for model_name in models}
+        best_cv_scores = {model_name: best_so_far[model_name][1] for model_name in models}
+        cv_results = {
+            model_name: _build_cv_results(
+                parameter_sets=parameter_sets,
+                cv_scores=np.array(scores),
+                fit_times=np.array(times),
+                n_resources=n_resources,
+                iter=iterations
+            )
+            for model_name, (parameter_sets, scores, times, n_resources, iterations) in history.items()
+        }
+        results = _refit_and_evaluate(X_train, y_train, X_test, y_test,
+                                      models, best_parameters, best_cv_scores,
+                                      cv_results, n_jobs)
+
+        wall_clock_time = time.perf_counter() - start_time
+        logging.info(msg=(
+            f"Successive halving search completed in {wall_clock_time:.1f}s on {n_workers} workers "
+            f"with {n_fits} CV fits costing {fit_cost:.1f} full-size fits instead of {n_grid_fits} "
+            f"({n_grid_fits - fit_cost:.1f} full-size fits saved, {1 - fit_cost / n_grid_fits:.0%})"
+        ))
+
+        # validate against the exhaustive grid (best mean CV R^2 on the full training folds)
+        if compare_to_grid:
+            grid_folds = _get_folds(X_train, y_train, cv)
+            candidates = _get_candidates(models, params)
+            cv_scores, _ = _cross_validate_candidates(X_train, y_train, models,
+                                                      candidates, grid_folds, n_jobs,
+                                                      warm_start=warm_start)
+            mean_cv_scores = cv_scores.mean(axis=1)
+            halving_scores, _ = _cross_validate_candidates(
+                X_train, y_train, models,
+                [(model_name, best_parameters[model_name]) for model_name in models],
+                grid_folds, n_jobs
+            )
+            for model_name, halving_score in zip(models, halving_scores.mean(axis=1)):
+                grid_score = np.nanmax([
+                    score
+                    for (candidate_model_name, _), score in zip(candidates, mean_cv_scores)
+                    if candidate_model_name == model_name
+                ])
+                logging.info(msg=(
+                    f"{model_name}: best CV R^2 of successive halving {halving_score:.4f} "
+                    f"vs full grid {grid_score:.4f} (gap {grid_score - halving_score:.4f})"
+                ))
+
+        return results
+
+    except Exception as e:
+        raise CustomException(error_message=e, error_detail=sys)
@@ -0,0 +1,466 @@
+# DEPENDENCIES
+
+# for working with file paths, custom exception and custom logging
+import os
+import sys
+from src.exception import CustomException
+from src.logger import logging
+# for hashing artifact file contents
+import hashlib
+# for making the cache safe to use from concurrent requests & loading new versions in the background
+import threading
+# for defining class variables
+from dataclasses import dataclass, field
+# for loading data objects
+from src.utils import load_object
+# for finding the artifact version currently published
+from src.pipeline.artifact_registry import ArtifactRegistry, ArtifactRegistryConfig
+
+
+# ARTIFACT CACHE CONFIG
+@dataclass
+class ArtifactCacheConfig:
+    """
+    Contains the artifact file paths
+    served by the artifact cache and
+    how changes to them are detected.
+    """
+    # path for trained model
+    model_path: str = os.path.join("artifact", "model.pkl")
+    # path for data preprocessor object
+    preprocessor_path: str = os.path.join("artifact", "preprocessor.pkl")
+    # versioned artifacts: once a version is published, the `CURRENT` version
+    # is served instead of the files above
+    registry_config: ArtifactRegistryConfig = field(default_factory=ArtifactRegistryConfig)
+    # if True, a change is detected by hashing the file contents
+    # instead of only comparing modification time & size (slower but stricter)
+    use_content_hash: bool = False
+    # how many times to retry loading when an artifact changes while being loaded
+    max_load_attempts: int = 3
+    # if True, a new version is loaded & warmed up in a background thread while
+    # requests are still served by the previous one (False -> requests wait for the load)
+    background_reload: bool = True
+
+
+# ARTIFACT VERSION
+class ArtifactVersion:
+    """
+    One version of the artifacts served together:
+    the (model, preprocessor) pair and the objects
+    derived from it (compiled preprocessor, linear
+    scorer, prediction table, ...).
+
+    The pair and the derived objects are loaded on
+    first use (or all at once by `warm_up`), so a
+    request which only needs the linear scorer does
+    not load the model.
+    """
+    # variables
+    def __init__(self, signature, version:str, model_path:str, preprocessor_path:str,
+                 derived_builders:dict, load_artifacts):
+        # signature of the files (or pointer) this version was resolved from
+        self.signature = signature
+        # name of the published version (None -> unversioned files under `artifact/`)
+        self.version = version
+        self.model_path = model_path
+        self.preprocessor_path = preprocessor_path
+        # folder holding the other artifact files of this version
+        self.artifact_dir = os.path.dirname(model_path)
+
+        self._derived_builders = derived_builders
+        self._load_artifacts = load_artifacts
+        self._artifacts = None
+        self._derived_objects = {}
+        self._lock = threading.RLock()
+
+    # methods
+    def get_path(self, file_name:str):
+        """
+        Returns the path of an artifact file of this version.
+
+        Input Parameters ->
+        `file_name`: (str) name of the file, e.g. "linear_scorer.json"
+        """
+        return os.path.join(self.artifact_dir, file_name)
+
+    def get_artifacts(self):
+        """
+        Returns the (model, preprocessor) pair of this version.
+        """
+        artifacts = self._artifacts
+        if artifacts is None:
+            with self._lock:
+                if self._artifacts is None:
+                    self._artifacts = self._load_artifacts(self)
+                artifacts = self._artifacts
+        return artifacts
+
+    def get_derived(self, name:str):
+        """
+        Returns the object registered under `name`
+        (see `ArtifactCache.register_derived`), built
+        once for this version.
+
+        Input Parameters ->
+        `name`: (str) name of the derived object
+        """
+        derived_objects = self._derived_objects
+        if name not in derived_objects:
+            with self._lock:
+                if name not in derived_objects:
+                    derived_objects[name] = self._derived_builders[name](self)
+                    logging.info(msg=f"Built `{name}` for artifact version `{self.version}`")
+        return derived_objects[name]
+
+    def warm_up(self, warm_up_functions:list):
+        """
+        Loads the pair, builds every derived object
+        and runs the warm-up functions (e.g. one prediction).
+
+        Input Parameters ->
+        `warm_up_functions`: (list) functions taking this `ArtifactVersion`
+        """
+        self.get_artifacts()
+        for name in list(self._derived_builders):
+            self.get_derived(name)
+        for warm_up_function in warm_up_functions:
+            warm_up_function(self)
+
+
+# ARTIFACT CACHE
+class ArtifactCache:
+    """
+    Process-wide cache for the trained model
+    and data preprocessor objects.
+
+    Both objects are loaded from disk once and
+    reused for every prediction. They are loaded
+    again (as a pair) only when one of the artifact
+    files on disk has changed, or when another
+    version is published in the artifact registry.
+
+    A request should call `get_version` once and take
+    everything it needs from the returned version, so
+    that it never mixes objects of two versions. While
+    a new version is loaded & warmed up in the background,
+    requests keep being served by the previous one and
+    switch over with a single assignment.
+    """
+    # variables
+    def __init__(self, config:ArtifactCacheConfig=None):
+        self.cache_config = config if config is not None else ArtifactCacheConfig()
+        self.artifact_registry = ArtifactRegistry(config=self.cache_config.registry_config)
+
+        # `ArtifactVersion` currently being served (always read & replaced as a whole)
+        self._entry = None
+        # serializes loading so that concurrent requests load the files only once
+        self._lock = threading.Lock()
+        # guards starting the background reload thread
+        self._reload_lock = threading.Lock()
+        self._reload_thread = None
+        # signature whose version failed to load (not retried until the signature changes)
+        self._failed_signature = None
+
+        # name -> function building a derived object from an `ArtifactVersion`
+        self._derived_builders = {}
+        # functions run on a new version before it is served
+        self._warm_up_functions = []
+
+        # counters for monitoring the cache (updated from request threads and
+        # the background reload thread -> only changed while holding `_stats_lock`)
+        self._stats_lock = threading.Lock()
+        self.hits = 0       # requests served from memory
+        self.misses = 0     # first load of the artifacts
+        self.reloads = 0    # artifacts loaded again because files changed on disk or a new version was published
+        self.failed_reloads = 0     # new versions which could not be loaded (previous one kept)
+
+    # methods
+    def _count(self, counter:str):
+        """
+        Increments one of the cache counters.
+
+        Input Parameters ->
+        `counter`: (str) name of the counter (`hits`, `misses`, `reloads` or `failed_reloads`)
+        """
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def register_derived(self, name:str, builder):
+        """
+        Registers an object derived from each artifact
+        version, such as a compiled preprocessor. It is
+        built once per version (before the version is
+        served when warming up) and dropped together with it.
+
+        Input Parameters ->
+        `name`: (str) name under which the derived object is cached
+        `builder`: function taking an `ArtifactVersion` and returning the derived object
+        """
+        self._derived_builders[name] = builder
+
+    def register_warm_up(self, warm_up_function):
+        """
+        Registers a function which is run on a new
+        version (after building its derived objects)
+        before it is served, e.g. to make one prediction.
+
+        Input Parameters ->
+        `warm_up_function`: function taking an `ArtifactVersion`
+        """
+        self._warm_up_functions.append(warm_up_function)
+
+    def _get_file_signature(self, file_path:str):
+        """
+        Returns a value which changes whenever
+        the contents of the input file change.
+
+        Input Parameters ->
+        `file_path`: (str) path of the artifact file
+        """
+        if self.cache_config.use_content_hash:
+            # hash the file contents in 1 MB blocks
+            file_hash = hashlib.sha256()
+            with open(file_path, "rb") as file_object:
+                for block in iter(lambda: file_object.read(1 << 20), b""):
+                    file_hash.update(block)
+            return file_hash.hexdigest()
+
+        # modification time (in nanoseconds) & size of the file
+        file_stats = os.stat(file_path)
+        return (file_stats.st_mtime_ns, file_stats.st_size)
+
+    def _get_signature(self):
+        """
+        Returns the signature of the `CURRENT` pointer
+        (a published version never changes), or the
+        combined signature of the model and preprocessor
+        files if no version was published.
+        """
+        try:
+            # the pointer is replaced (new inode) whenever another version is activated
+            pointer_stats = os.stat(self.cache_config.registry_config.current_pointer_path)
+            return ("version", pointer_stats.st_ino, pointer_stats.st_mtime_ns, pointer_stats.st_size)
+        except FileNotFoundError:
+            pass
+
+        return (
+            self._get_file_signature(self.cache_config.model_path),
+            self._get_file_signature(self.cache_config.preprocessor_path)
+        )
+
+    def _resolve(self, signature):
+        """
+        Returns the `ArtifactVersion` (not loaded yet)
+        for the input signature.
+
+        Input Parameters ->
+        `signature`: signature of the artifact files observed before resolving
+        """
+        version = self.artifact_registry.get_current_version() if signature[0] == "version" else None
+
+        if version is None:
+            model_path = self.cache_config.model_path
+            preprocessor_path = self.cache_config.preprocessor_path
+        else:
+            version_path = self.artifact_registry.get_version_path(version)
+            model_path = os.path.join(version_path, "model.pkl")
+            preprocessor_path = os.path.join(version_path, "preprocessor.pkl")
+
+        return ArtifactVersion(signature=signature, version=version,
+                               model_path=model_path, preprocessor_path=preprocessor_path,
+                               derived_builders=self._derived_builders,
+                               load_artifacts=self._load)
+
+    def _load(self, artifact_version:ArtifactVersion):
+        """
+        Loads the model and preprocessor of a version.
+
+        Unversioned files are retried if they change
+        while being loaded, so that a model is never
+        paired with a preprocessor from another training run.
+
+        Input Parameters ->
+        `artifact_version`: (ArtifactVersion) version to load
+        """
+        signature = artifact_version.signature
+
+        for _ in range(self.cache_config.max_load_attempts):
+            model = load_object(file_path=artifact_version.model_path)
+            data_preprocessor = load_object(file_path=artifact_version.preprocessor_path)
+
+            # a published version is never modified -> consistent pair
+            # unversioned files did not change while loading -> consistent pair
+            signature_after_load = self._get_signature() if artifact_version.version is None else signature
+            if signature_after_load == signature:
+                break
+
+            signature = signature_after_load
+        else:
+            raise RuntimeError("Artifact files kept changing while being loaded")
+
+        with self._stats_lock:
+            # the first version loaded is a miss, every later one a reload
+            is_reload = self.misses > 0
+            if is_reload:
+                self.reloads += 1
+            else:
+                self.misses += 1
+
+        if is_reload:
+            logging.info(msg=f"Artifacts changed, model and preprocessor of version `{artifact_version.version}` loaded")
+        else:
+            logging.info(msg=f"Model and preprocessor of version `{artifact_version.version}` loaded into artifact cache")
+
+        return model, data_preprocessor
+
+    def refresh(self, warm_up:bool=True):
+        """
+        Switches to the current artifacts (if they have
+        changed) and returns the `ArtifactVersion` served.
+
+        Input Parameters ->
+        `warm_up`: (bool) if True, the new version is loaded & warmed up before it is served
+        """
+        with self._lock:
+            signature = self._get_signature()
+
+            entry = self._entry
+            if entry is not None and entry.signature == signature:
+                return entry
+
+            new_entry = self._resolve(signature=signature)
+            if entry is not None and new_entry.version is not None and new_entry.version == entry.version:
+                # pointer rewritten with the same version -> keep the loaded objects
+                entry.signature = signature
+                return entry
+
+            if warm_up:
+                new_entry.warm_up(warm_up_functions=self._warm_up_functions)
+
+            # swap in the new version with a single assignment
+            self._entry = new_entry
+            self._failed_signature = None
+            logging.info(msg=f"Serving artifact version `{new_entry.version}`")
+
+            return new_entry
+
+    def warm_up(self):
+        """
+        Switches to the current artifacts (if they have
+        changed), makes sure the served version is fully
+        loaded & warmed up and returns it.
+        """
+        try:
+            artifact_version = self.refresh(warm_up=True)
+            # a version loaded on demand may not be fully loaded yet
+            artifact_version.warm_up(warm_up_functions=self._warm_up_functions)
+            return artifact_version
+
+        except Exception as e:
+            raise CustomException(error_message=e, error_detail=sys)
+
+    def _reload_in_background(self):
+        """
+        Loads & warms up the current artifacts, then
+        swaps them in (the previous version keeps serving
+        requests meanwhile, and if the load fails).
+        """
+        signature = self._get_signature()
+        try:
+            self.refresh(warm_up=True)
+        except Exception as e:
+            self._count("failed_reloads")
+            self._failed_signature = signature
+            logging.info(msg=f"Loading the new artifacts failed, previous version kept: {e}")
+
+    def _start_background_reload(self, signature):
+        with self._reload_lock:
+            if signature == self._failed_signature:
+                return
+            if self._reload_thread is not None and self._reload_thread.is_alive():
+                return
+            self._reload_thread = threading.Thread(target=self._reload_in_background,
+                                                   name="artifact-reload", daemon=True)
+            self._reload_thread.start()
+
+    def get_version(self):
+        """
+        Returns the `ArtifactVersion` to serve the
+        current request with. The first call loads the
+        artifacts; when they change afterwards, the new
+        version is loaded in the background (or right
+        away if `background_reload` is disabled).
+        """
+        try:
+            signature = self._get_signature()
+
+            # fast path: cached version is still up to date
+            entry = self._entry
+            if entry is not None and entry.signature == signature:
+                self._count("hits")
+                return entry
+
+            if entry is not None and self.cache_config.background_reload:
+                # keep serving the previous version until the new one is warmed up
+                self._start_background_reload(signature=signature)
+                self._count("hits")
+                return entry
+
+            # first request: load on demand (a request which only needs
+            # the linear scorer or prediction table does not load the model)
+            return self.refresh(warm_up=entry is not None)
+
+        except Exception as e:
+            raise CustomException(error_message=e, error_detail=sys)
+
+    def get_artifacts(self):
+        """
+        Returns the (model, preprocessor) pair,
+        loading it from disk only if it is not
+        cached yet or the files have changed.
+        """
+        try:
+            return self.get_version().get_artifacts()
+
+        except Exception as e:
+            raise CustomException(error_message=e, error_detail=sys)
+
+    def get_derived(self, name:str):
+        """
+        Returns the (model, preprocessor, derived object)
+        of the current version.
+
+        Input Parameters ->
+        `name`: (str) name under which the derived object was registered
+        """
+        try:
+            artifact_version = self.get_version()
+            model, data_preprocessor = artifact_version.get_artifacts()
+            return model, data_preprocessor, artifact_version.get_derived(name)
+
+        except Exception as e:
+            raise CustomException(error_message=e, error_detail=sys)
+
+    def get_served_version(self):
+        """
+        Returns the name of the version being served
+        (None if unversioned files or nothing loaded yet).
+        """
+        entry = self._entry
+        return None if entry is None else entry.version
+
+    def get_stats(self):
+        """
+        Returns the cache counters as a dict.
+        """
+        with self._stats_lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "reloads": self.reloads,
+                "failed_reloads": self.failed_reloads
+            }
+
+
+# process-wide artifact cache shared by all prediction pipelines
+artifact_cache = ArtifactCache()
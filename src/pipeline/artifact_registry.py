@@ -0,0 +1,251 @@
+# DEPENDENCIES
+
+# for working with file paths, custom exception and custom logging
+import os
+import sys
+from src.exception import CustomException
+from src.logger import logging
+# for parsing command line arguments
+import argparse
+# for copying artifact files into a version & removing old versions
+import shutil
+# for naming versions & saving their manifests
+import time
+import json
+import hashlib
+# for defining class variables
+from dataclasses import dataclass
+
+
+# ARTIFACT REGISTRY CONFIG
+@dataclass
+class ArtifactRegistryConfig:
+    """
+    Contains the folder holding the artifact
+    versions and the path of the pointer file
+    naming the version currently served.
+    """
+    # folder with one (immutable) sub-folder per published version
+    versions_dir_path:str = os.path.join("artifact", "versions")
+    # file containing the name of the current version (replaced atomically)
+    current_pointer_path:str = os.path.join("artifact", "CURRENT")
+    # number of versions kept (besides the current one) when a new version is published
+    keep_versions:int = 5
+
+
+# helper function to write a file and flush it to disk
+def _write_file(file_path:str, contents:str):
+    with open(file_path, "w") as file_object:
+        file_object.write(contents)
+        file_object.flush()
+        os.fsync(file_object.fileno())
+
+
+# ARTIFACT REGISTRY
+class ArtifactRegistry:
+    """
+    Versioned store for the artifacts served together
+    (model, preprocessor, linear scorer, prediction table).
+
+    Every training run publishes its artifacts as a new
+    version folder, which is never modified afterwards.
+    The version being served is named by a single pointer
+    file (`CURRENT`) which is replaced atomically, so a
+    reader sees either the old or the new version, never a
+    model paired with the preprocessor of another run.
+    """
+    # variables
+    def __init__(self, config:ArtifactRegistryConfig=None):
+        self.registry_config = config if config is not None else ArtifactRegistryConfig()
+
+    # methods
+    def get_version_path(self, version:str):
+        """
+        Returns the folder path of a version.
+
+        Input Parameters ->
+        `version`: (str) name of the version
+        """
+        return os.path.join(self.registry_config.versions_dir_path, version)
+
+    def get_current_version(self):
+        """
+        Returns the name of the current version,
+        or None if no version was published yet.
+        """
+        try:
+            with open(self.registry_config.current_pointer_path, "r") as file_object:
+                return file_object.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def get_manifest(self, version:str):
+        """
+        Returns the manifest (dict) of a version:
+        its files, their hashes and metadata.
+
+        Input Parameters ->
+        `version`: (str) name of the version
+        """
+        with open(os.path.join(self.get_version_path(version), "manifest.json"), "r") as file_object:
+            return json.load(file_object)
+
+    def list_versions(self):
+        """
+        Returns the names of all published versions (oldest first).
+        """
+        if not os.path.isdir(self.registry_config.versions_dir_path):
+            return []
+        return sorted(
+            version
+            for version in os.listdir(self.registry_config.versions_dir_path)
+            if not version.startswith(".")
+            and os.path.exists(os.path.join(self.get_version_path(version), "manifest.json"))
+        )
+
+    def activate(self, version:str):
+        """
+        Makes the input version the current one
+        (also used to roll back to an older version).
+
+        Input Parameters ->
+        `version`: (str) name of a published version
+        """
+        try:
+            if version not in self.list_versions():
+                raise ValueError(f"Unknown artifact version `{version}`")
+
+            # write the new pointer next to the old one, then swap it in with a single rename
+            pointer_path = self.registry_config.current_pointer_path
+            temp_pointer_path = f"{pointer_path}.tmp"
+            _write_file(file_path=temp_pointer_path, contents=f"{version}\n")
+            os.replace(temp_pointer_path, pointer_path)
+
+            logging.info(msg=f"Artifact version `{version}` activated")
+
+        except Exception as e:
+            raise CustomException(error_message=e, error_detail=sys)
+
+    def publish(self, files:dict, metadata:dict=None, activate:bool=True):
+        """
+        Copies the input artifact files into a new
+        version folder and (by default) makes it the
+        current version.
+
+        If a version with exactly the same files exists
+        already, it is reused instead of copied again.
+
+        Returns the name of the version.
+
+        Input Parameters ->
+        `files`: (dict) file name within the version -> path of the file to copy
+                 (files which do not exist are skipped)
+        `metadata`: (dict) extra information saved in the manifest (e.g. model name & score)
+        `activate`: (bool) if True, the version becomes the current one
+        """
+        try:
+            # hash of every file -> identifies the contents of the version
+            file_hashes = {}
+            for file_name, file_path in sorted(files.items()):
+                if not os.path.exists(file_path):
+                    continue
+                file_hash = hashlib.sha256()
+                with open(file_path, "rb") as file_object:
+                    for block in iter(lambda: file_object.read(1 << 20), b""):
+                        file_hash.update(block)
+                file_hashes[file_name] = file_hash.hexdigest()
+            content_hash = hashlib.sha256(json.dumps(file_hashes, sort_keys=True).encode("utf-8")).hexdigest()
+
+            # same artifacts as an existing version (e.g. a fully cached training run)
+            for version in reversed(self.list_versions()):
+                if self.get_manifest(version).get("content_hash") == content_hash:
+                    logging.info(msg=f"Artifacts unchanged, reusing version `{version}`")
+                    if activate:
+                        self.activate(version)
+                    return version
+
+            # copy into a hidden folder, which is renamed once complete
+            version = f"{time.strftime('%Y%m%d-%H%M%S')}-{content_hash[:8]}"
+            version_path = self.get_version_path(version)
+            temp_version_path = self.get_version_path(f".tmp-{version}")
+            shutil.rmtree(temp_version_path, ignore_errors=True)
+            os.makedirs(temp_version_path)
+
+            for file_name in file_hashes:
+                temp_file_path = os.path.join(temp_version_path, file_name)
+                shutil.copyfile(files[file_name], temp_file_path)
+                with open(temp_file_path, "rb") as file_object:
+                    os.fsync(file_object.fileno())
+
+            manifest = {
+                "version": version,
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "content_hash": content_hash,
+                "files": file_hashes,
+                "metadata": metadata or {}
+            }
+            _write_file(file_path=os.path.join(temp_version_path, "manifest.json"),
+                        contents=json.dumps(manifest, indent=2))
+            os.rename(temp_version_path, version_path)
+
+            logging.info(msg=f"Artifacts published as version `{version}`")
+
+            if activate:
+                self.activate(version)
+            self.prune()
+
+            return version
+
+        except Exception as e:
+            raise CustomException(error_message=e, error_detail=sys)
+
+    def prune(self):
+        """
+        Removes the oldest versions, keeping the current
+        one and the `keep_versions` most recent others.
+
+        Processes still serving a removed version are not
+        affected (their artifacts are loaded or memory-mapped).
+        """
+        try:
+            current_version = self.get_current_version()
+            other_versions = [version for version in self.list_versions() if version != current_version]
+            keep_versions = self.registry_config.keep_versions
+            for version in other_versions[:max(len(other_versions) - keep_versions, 0)]:
+                shutil.rmtree(self.get_version_path(version), ignore_errors=True)
+                logging.info(msg=f"Artifact version `{version}` removed")
+
+        except Exception as e:
+            raise CustomException(error_message=e, error_detail=sys)
+
+
+# command line entry point
+def main(argv:list=None):
+    """
+    `python -m src.pipeline.artifact_registry list`
+    `python -m src.pipeline.artifact_registry activate <version>`
+
+    Input Parameters ->
+    `argv`: (list) command line arguments (default: `sys.argv[1:]`)
+    """
+    parser = argparse.ArgumentParser(description="List the artifact versions or switch the served version")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("list", help="list the published versions (* marks the current one)")
+    activate_parser = subparsers.add_parser("activate", help="serve another version (e.g. roll back)")
+    activate_parser.add_argument("version", help="name of the version")
+    args = parser.parse_args(argv)
+
+    artifact_registry = ArtifactRegistry()
+    if args.command == "list":
+        current_version = artifact_registry.get_current_version()
+        for version in artifact_registry.list_versions():
+            metadata = artifact_registry.get_manifest(version)["metadata"]
+            marker = "*" if version == current_version else " "
+            print(f"{marker} {version} {json.dumps(metadata)}")
+    else:
+        artifact_registry.activate(version=args.version)
+        print(f"Current version: {args.version}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+# DEPENDENCIES
+
+# for working with file paths, custom exception and custom logging
+import os
+import sys
+from src.exception import CustomException
+from src.logger import logging
+# for parsing command line arguments
+import argparse
+# for timing the run
+import time
+# for scoring chunks in parallel (with a bounded number of chunks in flight)
+import multiprocessing
+from collections import deque
+# for defining class variables
+from dataclasses import dataclass
+# for working with dataframes
+import numpy as np
+import pandas as pd
+
+# for pinning the artifact version served when the run starts
+from src.pipeline.artifact_cache import artifact_cache
+# for validating the input schema (same as the batch prediction API)
+from src.pipeline.predict_pipeline import CustomBatchData
+# utility functions
+from src.utils import load_object, iter_dataframe_chunks, get_dataset_format
+
+
+# BATCH PREDICT CONFIG
+@dataclass
+class BatchPredictConfig:
+    """
+    Contains the inputs of offline scoring:
+    chunk size, number of processes and
+    which columns are written out.
+    """
+    # rows read, transformed & predicted at a time
+    chunk_size:int = 100_000
+
+    # processes scoring chunks (1 -> score in this process)
+    n_jobs:int = 1
+
+    # chunks read ahead per process (bounds the memory used by a parallel run)
+    chunks_in_flight_per_job:int = 2
+
+    # name of the prediction column (same as the CSV output of `/api/predict_batch`)
+    prediction_column:str = "predicted_avg_score"
+
+    # if True only the predictions are written, otherwise the input rows with the predictions
+    predictions_only:bool = False
+
+    # rows which cannot be scored (a score which is not a number or an unknown category):
+    # "mark" -> NaN prediction & the reason in `error_column`, "skip" -> not written,
+    # "fail" -> the run stops (and no output is written)
+    on_error:str = "mark"
+
+    # name of the column with the reason a row could not be scored (empty for scored rows)
+    error_column:str = "prediction_error"
+
+
+# model & preprocessor used by the scoring function (set once per process)
+_artifacts = None
+
+
+# helper function to set the artifacts used by `_score_chunk` in a process
+def _init_worker(model_path:str, preprocessor_path:str):
+    global _artifacts
+    _artifacts = (load_object(file_path=model_path), load_object(file_path=preprocessor_path))
+
+
+# helper function to score a chunk (runs in the worker processes)
+def _score_chunk(chunk_df:pd.DataFrame):
+    """
+    Returns the predictions for a chunk of rows
+    in a single vectorized transform & predict,
+    and the reason every row could not be scored
+    (see `CustomBatchData.get_row_errors`, NaN prediction).
+    """
+    model, data_preprocessor = _artifacts
+    batch_data = CustomBatchData(data_df=chunk_df)
+    features_df = batch_data.get_data_as_dataframe(coerce_numbers=True)
+    errors = batch_data.get_row_errors(features_df=features_df, data_preprocessor=data_preprocessor)
+
+    predictions = np.full(len(features_df), np.nan)
+    is_valid = pd.isna(errors)
+    if is_valid.any():
+        predictions[is_valid] = model.predict(data_preprocessor.transform(features_df[is_valid]))
+    return predictions, errors
+
+
+# CHUNK WRITER
+class ChunkWriter:
+    """
+    Streams scored chunks into a csv or parquet file.
+
+    Rows are written to a temporary file which replaces
+    the output file once all chunks are written, so a
+    failed run never leaves a truncated output behind.
+    """
+    # variables
+    def __init__(self, file_path:str):
+        self.file_path = file_path
+        self.file_format = get_dataset_format(file_path)
+        if self.file_format not in ("csv", "parquet"):
+            raise ValueError(f"Output must be a csv or parquet file, got {file_path}")
+        self.temp_file_path = f"{file_path}.tmp"
+        self._file_object = None
+        self._parquet_writer = None
+
+    # methods
+    def write(self, df:pd.DataFrame):
+        if self.file_format == "csv":
+            if self._file_object is None:
+                os.makedirs(os.path.dirname(self.file_path) or ".", exist_ok=True)
+                self._file_object = open(self.temp_file_path, "w", newline="")
+                df.to_csv(self._file_object, index=False, header=True)
+            else:
+                df.to_csv(self._file_object, index=False, header=False)
+            return
+
+        import pyarrow as pa
+        from pyarrow import parquet
+        # numbers as floats, so that a chunk with missing values has the schema of the first chunk
+        df = df.astype({column: "float64" for column in df.select_dtypes(include="number").columns})
+        if self._parquet_writer is None:
+            os.makedirs(os.path.dirname(self.file_path) or ".", exist_ok=True)
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            self._parquet_writer = parquet.ParquetWriter(self.temp_file_path, table.schema)
+        else:
+            table = pa.Table.from_pandas(df, schema=self._parquet_writer.schema, preserve_index=False)
+        self._parquet_writer.write_table(table)
+
+    def close(self):
+        """
+        Completes the output file.
+        """
+        if self._file_object is not None:
+            self._file_object.close()
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+        if os.path.exists(self.temp_file_path):
+            os.replace(self.temp_file_path, self.file_path)
+
+    def abort(self):
+        """
+        Removes the partially written file.
+        """
+        if self._file_object is not None:
+            self._file_object.close()
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+        if os.path.exists(self.temp_file_path):
+            os.remove(self.temp_file_path)
+
+
+# BATCH PREDICT PIPELINE
+class BatchPredictPipeline:
+    """
+    Offline scoring of input files of any size
+    (`CustomData` schema, csv/parquet/feather/npy),
+    as a pipeline of generators:
+
+        read chunk -> transform & predict -> write chunk
+
+    Only a few chunks are held in memory at a time,
+    so the memory used does not grow with the input.
+    The artifact version served when the run starts is
+    used for every chunk, even if a new version is
+    published during the run.
+    """
+    # variables
+    def __init__(self, config:BatchPredictConfig=None):
+        self.batch_config = config if config is not None else BatchPredictConfig()
+
+    # methods
+    def _score_chunks(self, chunks, artifact_version):
+        """
+        Yields (chunk, (predictions, errors)) for every input chunk,
+        in input order, scored in this process or in a pool
+        of `n_jobs` processes.
+        """
+        n_jobs = self.batch_config.n_jobs
+        if n_jobs <= 1:
+            # the artifacts already loaded by the cache are used directly
+            global _artifacts
+            _artifacts = artifact_version.get_artifacts()
+            for chunk_df in chunks:
+                yield chunk_df, _score_chunk(chunk_df)
+            return
+
+        with multiprocessing.Pool(processes=n_jobs, initializer=_init_worker,
+                                  initargs=(artifact_version.model_path, artifact_version.preprocessor_path)) as pool:
+            # `Pool.imap` would read the whole input ahead, so only keep a few chunks in flight
+            max_in_flight = n_jobs * self.batch_config.chunks_in_flight_per_job
+            in_flight = deque()
+            for chunk_df in chunks:
+                in_flight.append((chunk_df, pool.apply_async(_score_chunk, (chunk_df,))))
+                if len(in_flight) >= max_in_flight:
+                    chunk_df, result = in_flight.popleft()
+                    yield chunk_df, result.get()
+            while in_flight:
+                chunk_df, result = in_flight.popleft()
+                yield chunk_df, result.get()
+
+    def run(self, input_path:str, output_path:str):
+        """
+        Scores every row of the input file and streams
+        the results to the output file (csv or parquet).
+
+        Rows which cannot be scored are handled as set
+        by `on_error`, a schema error (missing columns)
+        stops the run.
+
+        Returns a dict with the number of rows, the number
+        of rows which could not be scored, the time taken,
+        the rows per second and the version.
+
+        Input Parameters ->
+        `input_path`: (str) file with the `CustomData` columns (extra columns are kept)
+        `output_path`: (str) csv or parquet file for the results
+        """
+        try:
+            batch_config = self.batch_config
+            start_time = time.perf_counter()
+
+            # pinned for the whole run (version folders are immutable)
+            artifact_version = artifact_cache.get_version()
+            logging.info(msg=f"Batch scoring {input_path} with artifact version `{artifact_version.version}` "
+                             f"({batch_config.n_jobs} process(es), {batch_config.chunk_size} rows per chunk)")
+
+            chunks = iter_dataframe_chunks(file_path=input_path, chunk_size=batch_config.chunk_size)
+            if batch_config.on_error not in ("mark", "skip", "fail"):
+                raise ValueError(f"Unknown on_error value: {batch_config.on_error}")
+
+            chunk_writer = ChunkWriter(file_path=output_path)
+            n_rows = 0
+            n_errors = 0
+            try:
+                for chunk_index, (chunk_df, (predictions, errors)) in enumerate(self._score_chunks(chunks, artifact_version)):
+                    is_error = ~pd.isna(errors)
+                    if is_error.any():
+                        first_error = int(np.flatnonzero(is_error)[0])
+                        if batch_config.on_error == "fail":
+                            raise ValueError(f"Row {n_rows + first_error + 1} cannot be scored: {errors[first_error]}")
+                        logging.info(msg=f"{int(is_error.sum())} rows of chunk {chunk_index + 1} cannot be scored "
+                                         f"({batch_config.on_error}), e.g. row {n_rows + first_error + 1}: "
+                                         f"{errors[first_error]}")
+
+                    if batch_config.predictions_only:
+                        output_df = pd.DataFrame(data={batch_config.prediction_column: predictions})
+                    else:
+                        # scores which are not numbers are written as missing (the reason is in `error_column`),
+                        # so that the score columns have the same type in every chunk
+                        output_df = chunk_df.assign(**{
+                            column: pd.to_numeric(chunk_df[column], errors="coerce")
+                            for column in CustomBatchData.numerical_features
+                        }, **{batch_config.prediction_column: predictions})
+                    if batch_config.on_error == "skip":
+                        output_df = output_df[~is_error]
+                    else:
+                        # string dtype, so that every chunk has the same schema (even without errors)
+                        output_df[batch_config.error_column] = pd.array(errors, dtype="string")
+                    chunk_writer.write(output_df)
+
+                    n_rows += len(chunk_df)
+                    n_errors += int(is_error.sum())
+                    logging.info(msg=f"Scored chunk {chunk_index + 1} ({n_rows} rows, "
+                                     f"{n_rows / (time.perf_counter() - start_time):.0f} rows/s)")
+            except BaseException:
+                chunk_writer.abort()
+                raise
+            chunk_writer.close()
+
+            seconds = time.perf_counter() - start_time
+            batch_summary = {
+                "n_rows": n_rows,
+                "n_errors": n_errors,
+                "seconds": seconds,
+                "rows_per_second": n_rows / seconds if seconds > 0 else float("inf"),
+                "version": artifact_version.version
+            }
+            logging.info(msg=f"Batch scoring completed: {batch_summary}")
+
+            return batch_summary
+
+        except Exception as e:
+            raise CustomException(error_message=e, error_detail=sys)
+
+
+# command line entry point
+def main(argv:list=None):
+    """
+    `python -m src.pipeline.batch_predict_pipeline --input students.csv --output scores.csv --jobs 4`
+
+    Input Parameters ->
+    `argv`: (list) command line arguments (default: `sys.argv[1:]`)
+    """
+    parser = argparse.ArgumentParser(description="Score a large file of student records, one chunk at a time")
+    parser.add_argument("--input", required=True, help="input file (csv, parquet, feather or npy)")
+    parser.add_argument("--output", required=True, help="output file (csv or parquet)")
+    parser.add_argument("--chunk-size", type=int, default=None, help="rows read & predicted at a time")
+    parser.add_argument("--jobs", type=int, default=None, help="processes scoring chunks in parallel")
+    parser.add_argument("--predictions-only", action="store_true",
+                        help="write only the predictions instead of the input rows with the predictions")
+    parser.add_argument("--on-error", choices=["mark", "skip", "fail"], default=None,
+                        help="rows which cannot be scored: NaN & reason column (mark, default), "
+                             "left out (skip) or stop the run (fail)")
+    args = parser.parse_args(argv)
+
+    batch_config = BatchPredictConfig()
+    if args.chunk_size is not None:
+        batch_config.chunk_size = args.chunk_size
+    if args.jobs is not None:
+        batch_config.n_jobs = args.jobs
+    batch_config.predictions_only = args.predictions_only
+    if args.on_error is not None:
+        batch_config.on_error = args.on_error
+
+    batch_summary = BatchPredictPipeline(config=batch_config).run(input_path=args.input, output_path=args.output)
+
+    print(f"Scored {batch_summary['n_rows']} rows in {batch_summary['seconds']:.2f} s "
+          f"({batch_summary['rows_per_second']:.0f} rows/s) with artifact version {batch_summary['version']}")
+    if batch_summary["n_errors"]:
+        print(f"{batch_summary['n_errors']} rows could not be scored "
+              f"({'left out' if batch_config.on_error == 'skip' else 'see the ' + batch_config.error_column + ' column'})")
+
+
+if __name__ == "__main__":
+    main()
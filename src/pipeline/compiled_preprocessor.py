@@ -0,0 +1,269 @@
+# DEPENDENCIES
+
+# for working with custom exception and custom logging
+import os
+import sys
+from src.exception import CustomException
+from src.logger import logging
+# for working with arrays
+import numpy as np
+
+
+# helper function to check for missing input values
+def _is_missing(value):
+    """
+    Returns True if the input value is
+    treated as missing by `SimpleImputer`
+    (None or NaN).
+
+    Input Parameters ->
+    `value`: a single raw input value
+    """
+    return value is None or (isinstance(value, float) and value != value)
+
+
+# NUMERICAL BLOCK
+class _NumericalBlock:
+    """
+    Compiled form of the numerical pipeline:
+    median imputation followed by standard scaling.
+    """
+    # variables
+    def __init__(self, columns:list, fill_values, mean, scale):
+        self.columns = columns
+        self.fill_values = fill_values  # imputer statistics (or None if no imputer)
+        self.mean = mean                # scaler mean (or None if not centering)
+        self.scale = scale              # scaler scale (or None if not scaling)
+        self.n_features = len(columns)
+
+    # methods
+    def transform_into(self, record:dict, output, offset:int):
+        """
+        Writes the transformed numerical features
+        of the input record into the output row.
+
+        Input Parameters ->
+        `record`: (dict) raw input values keyed by column name
+        `output`: (array) output feature vector
+        `offset`: (int) position of this block in the output feature vector
+        """
+        values = np.empty(self.n_features, dtype=np.float64)
+        for i, column in enumerate(self.columns):
+            value = record.get(column)
+            if _is_missing(value):
+                if self.fill_values is None:
+                    raise ValueError(f"Missing value for `{column}`")
+                values[i] = self.fill_values[i]
+            else:
+                values[i] = float(value)
+
+        # same operations (and order) as `StandardScaler.transform` on a dense array
+        if self.mean is not None:
+            values -= self.mean
+        if self.scale is not None:
+            values /= self.scale
+
+        output[offset:offset + self.n_features] = values
+
+
+# ONE HOT BLOCK
+class _OneHotBlock:
+    """
+    Compiled form of the categorical pipeline:
+    most frequent imputation, one hot encoding
+    and scaling without centering.
+    """
+    # variables
+    def __init__(self, columns:list, fill_values, lookups:list, n_features:int, ignore_unknown:bool):
+        self.columns = columns
+        self.fill_values = fill_values  # imputer statistics (or None if no imputer)
+        # for each column: category -> (position in block, value of the one hot feature)
+        self.lookups = lookups
+        self.n_features = n_features
+        self.ignore_unknown = ignore_unknown
+
+    # methods
+    def transform_into(self, record:dict, output, offset:int):
+        """
+        Writes the transformed categorical features
+        of the input record into the output row.
+
+        Input Parameters ->
+        `record`: (dict) raw input values keyed by column name
+        `output`: (array) output feature vector (zero-filled)
+        `offset`: (int) position of this block in the output feature vector
+        """
+        for i, column in enumerate(self.columns):
+            value = record.get(column)
+            if _is_missing(value):
+                if self.fill_values is None:
+                    raise ValueError(f"Missing value for `{column}`")
+                value = self.fill_values[i]
+
+            position_and_value = self.lookups[i].get(value)
+            if position_and_value is None:
+                if self.ignore_unknown:
+                    continue
+                raise ValueError(f"Found unknown category {value!r} in column `{column}`")
+
+            position, feature_value = position_and_value
+            output[offset + position] = feature_value
+
+
+# COMPILED PREPROCESSOR
+class CompiledPreprocessor:
+    """
+    Pandas-free version of a fitted data preprocessor
+    (`ColumnTransformer` from `DataTransformation`).
+
+    The fitted imputer statistics, scaler means/scales
+    and one hot encoder categories are read out of the
+    preprocessor once, and a single raw input record (dict)
+    is then mapped straight to a NumPy feature vector
+    which is identical to `preprocessor.transform`.
+    """
+    # variables
+    def __init__(self, blocks:list):
+        self.blocks = blocks
+        self.n_features = sum(block.n_features for block in blocks)
+
+    # methods
+    @classmethod
+    def from_column_transformer(cls, preprocessor):
+        """
+        Compiles a fitted `ColumnTransformer`.
+
+        Raises `ValueError` if the preprocessor contains
+        a step which cannot be compiled (the regular
+        sklearn path must be used in that case).
+
+        Input Parameters ->
+        `preprocessor`: fitted `ColumnTransformer` object
+        """
+        blocks = []
+        for name, transformer, columns in preprocessor.transformers_:
+            if transformer == "drop" or len(columns) == 0:
+                continue
+            if transformer == "passthrough":
+                raise ValueError(f"Cannot compile passthrough transformer `{name}`")
+
+            # a single transformer is treated as a pipeline with one step
+            steps = [step for _, step in getattr(transformer, "steps", [(name, transformer)])]
+            blocks.append(cls._compile_steps(columns=list(columns), steps=steps))
+
+        return cls(blocks=blocks)
+
+    @staticmethod
+    def _compile_steps(columns:list, steps:list):
+        """
+        Compiles the steps of one pipeline of
+        the column transformer into a block.
+
+        Input Parameters ->
+        `columns`: (list) column names handled by the pipeline
+        `steps`: (list) fitted transformers of the pipeline
+        """
+        step_names = [type(step).__name__ for step in steps]
+
+        # optional leading imputer
+        fill_values = None
+        if step_names and step_names[0] == "SimpleImputer":
+            imputer = steps[0]
+            if imputer.add_indicator:
+                raise ValueError("Cannot compile SimpleImputer with `add_indicator=True`")
+            fill_values = list(imputer.statistics_)
+            steps, step_names = steps[1:], step_names[1:]
+
+        # numerical pipeline -> [StandardScaler]
+        if step_names in ([], ["StandardScaler"]):
+            mean, scale = None, None
+            if step_names:
+                scaler = steps[0]
+                mean = scaler.mean_ if scaler.with_mean else None
+                scale = scaler.scale_ if scaler.with_std else None
+            if fill_values is not None:
+                fill_values = np.asarray(fill_values, dtype=np.float64)
+            return _NumericalBlock(columns=columns, fill_values=fill_values,
+                                   mean=mean, scale=scale)
+
+        # categorical pipeline -> OneHotEncoder, [StandardScaler(with_mean=False)]
+        if step_names in (["OneHotEncoder"], ["OneHotEncoder", "StandardScaler"]):
+            encoder = steps[0]
+            if encoder.drop is not None:
+                raise ValueError("Cannot compile OneHotEncoder with `drop`")
+            if getattr(encoder, "_infrequent_enabled", False):
+                raise ValueError("Cannot compile OneHotEncoder with infrequent categories")
+
+            n_features = sum(len(categories) for categories in encoder.categories_)
+
+            # value of each one hot feature once it is "hot"
+            # (sparse scaling multiplies the stored ones by `1 / scale_`)
+            feature_values = np.ones(n_features, dtype=np.float64)
+            if len(steps) == 2:
+                scaler = steps[1]
+                if scaler.with_mean:
+                    raise ValueError("Cannot compile centering of one hot encoded features")
+                if scaler.with_std:
+                    feature_values = feature_values * (1 / scaler.scale_)
+
+            lookups = []
+            position = 0
+            for categories in encoder.categories_:
+                lookup = {}
+                for category in categories:
+                    lookup[category] = (position, float(feature_values[position]))
+                    position += 1
+                lookups.append(lookup)
+
+            return _OneHotBlock(columns=columns, fill_values=fill_values,
+                                lookups=lookups, n_features=n_features,
+                                ignore_unknown=encoder.handle_unknown != "error")
+
+        raise ValueError(f"Cannot compile pipeline with steps {step_names}")
+
+    def transform_record(self, record:dict):
+        """
+        Returns the feature vector (2D array with
+        a single row) for a single raw input record.
+
+        Input Parameters ->
+        `record`: (dict) raw input values keyed by column name
+        """
+        output = np.zeros((1, self.n_features), dtype=np.float64)
+
+        offset = 0
+        for block in self.blocks:
+            block.transform_into(record=record, output=output[0], offset=offset)
+            offset += block.n_features
+
+        return output
+
+
+if __name__ == "__main__":
+    # parity check of the compiled preprocessor against the saved sklearn preprocessor
+    import pandas as pd
+    from src.utils import load_object
+
+    try:
+        data_preprocessor = load_object(file_path=os.path.join("artifact", "preprocessor.pkl"))
+        compiled_preprocessor = CompiledPreprocessor.from_column_transformer(data_preprocessor)
+
+        test_df = pd.read_csv(os.path.join("artifact", "test.csv"))
+        expected_features = data_preprocessor.transform(test_df)
+        if hasattr(expected_features, "toarray"):
+            expected_features = expected_features.toarray()
+
+        compiled_features = np.vstack([
+            compiled_preprocessor.transform_record(record=record)
+            for record in test_df.to_dict(orient="records")
+        ])
+
+        if not np.array_equal(compiled_features, expected_features):
+            mismatched_rows = np.flatnonzero((compiled_features != expected_features).any(axis=1))
+            raise ValueError(f"Compiled features differ from `preprocessor.transform` in rows {mismatched_rows.tolist()}")
+
+        print(f"Compiled preprocessor matches `preprocessor.transform` bit-for-bit on {len(test_df)} rows")
+        logging.info(msg="Compiled preprocessor parity check passed")
+
+    except Exception as e:
+        raise CustomException(error_message=e, error_detail=sys)
@@ -0,0 +1,299 @@
+# DEPENDENCIES
+
+# for working with file paths, custom exception and custom logging
+import os
+import sys
+from src.exception import CustomException
+from src.logger import logging
+# for hashing the model file the scorer was exported from
+import hashlib
+# for saving/loading the scorer (no sklearn needed at serve time)
+import json
+# for folding the model without rounding errors
+from fractions import Fraction
+
+
+# helper function to hash a file
+def get_file_hash(file_path:str):
+    """
+    Returns the sha256 hash of a file's contents.
+
+    Input Parameters ->
+    `file_path`: (str) path of the file to hash
+    """
+    file_hash = hashlib.sha256()
+    with open(file_path, "rb") as file_object:
+        for block in iter(lambda: file_object.read(1 << 20), b""):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+
+# helper function to check if a model can be folded into a linear scorer
+def is_linear_model(model):
+    """
+    Returns True if the input model predicts
+    `X @ coef_ + intercept_` (e.g. `LinearRegression`).
+
+    Input Parameters ->
+    `model`: trained machine learning model
+    """
+    coef = getattr(model, "coef_", None)
+    return (
+        coef is not None
+        and getattr(coef, "ndim", 0) == 1
+        and hasattr(model, "intercept_")
+        and type(model).__module__.startswith("sklearn.linear_model")
+    )
+
+
+# LINEAR SCORER
+class LinearScorer:
+    """
+    Data preprocessor and linear model folded
+    into a single precomputed scoring function.
+
+    Scaling, one hot encoding and the dot product
+    reduce to one contribution per category (looked up
+    from a table) plus one weight per numerical feature:
+
+        prediction = intercept
+                     + sum(table[column][category])
+                     + sum(weight[column] * value)
+    """
+    # variables
+    def __init__(self, scorer_dict:dict):
+        self.intercept = scorer_dict["intercept"]
+        # numerical feature -> (weight, value used when input is missing)
+        self.numerical = [
+            (column, spec["weight"], spec["fill_value"])
+            for column, spec in scorer_dict["numerical"].items()
+        ]
+        # categorical feature -> (category -> contribution, category used when input is missing,
+        # contribution of an unknown category or None if unknown categories raise)
+        self.categorical = [
+            (column, spec["contributions"], spec["fill_value"],
+             spec["unknown_contribution"] if spec.get("ignore_unknown") else None)
+            for column, spec in scorer_dict["categorical"].items()
+        ]
+        # hash of the model file this scorer was exported from
+        self.model_hash = scorer_dict.get("model_hash")
+
+    # methods
+    @classmethod
+    def load(cls, file_path:str):
+        """
+        Loads a scorer exported by `export_linear_scorer`.
+
+        Input Parameters ->
+        `file_path`: (str) path of the scorer `.json` file
+        """
+        try:
+            with open(file_path, "r") as file_object:
+                return cls(scorer_dict=json.load(file_object))
+
+        except Exception as e:
+            raise CustomException(error_message=e, error_detail=sys)
+
+    def score_record(self, record:dict):
+        """
+        Returns the prediction (float) for a single raw input record.
+
+        Input Parameters ->
+        `record`: (dict) raw input values keyed by input feature name
+        """
+        prediction = self.intercept
+
+        # table lookups for the categorical features
+        for column, contributions, fill_value, unknown_contribution in self.categorical:
+            category = record.get(column)
+            if category is None or category != category:
+                category = fill_value
+            contribution = contributions.get(category)
+            if contribution is None:
+                # an encoder ignoring unknown categories encodes them as all zeros
+                if unknown_contribution is None:
+                    raise ValueError(f"Found unknown category {category!r} in column `{column}`")
+                contribution = unknown_contribution
+            prediction += contribution
+
+        # multiply-add for the numerical features
+        for column, weight, fill_value in self.numerical:
+            value = record.get(column)
+            if value is None or value != value:
+                value = fill_value
+            prediction += weight * float(value)
+
+        return prediction
+
+
+# LINEAR SCORER CACHE
+class LinearScorerCache:
+    """
+    Process-wide cache for the exported linear scorer.
+
+    The scorer is used only if it was exported from
+    the model file currently on disk, so a scorer left
+    behind by an older training run is never served.
+    """
+    # variables
+    def __init__(self, scorer_path:str, model_path:str):
+        self.scorer_path = scorer_path
+        self.model_path = model_path
+        # (signature of scorer & model files, scorer or None)
+        self._entry = None
+
+    # methods
+    def _get_signature(self):
+        """
+        Returns the modification time & size of the
+        scorer and model files (None if the scorer does not exist).
+        """
+        try:
+            scorer_stats = os.stat(self.scorer_path)
+            model_stats = os.stat(self.model_path)
+        except FileNotFoundError:
+            return None
+        return (scorer_stats.st_mtime_ns, scorer_stats.st_size,
+                model_stats.st_mtime_ns, model_stats.st_size)
+
+    def get_scorer(self):
+        """
+        Returns the current `LinearScorer`, or None if
+        there is no scorer matching the saved model.
+        """
+        signature = self._get_signature()
+        if signature is None:
+            return None
+
+        entry = self._entry
+        if entry is not None and entry[0] == signature:
+            return entry[1]
+
+        linear_scorer = LinearScorer.load(file_path=self.scorer_path)
+        if linear_scorer.model_hash != get_file_hash(self.model_path):
+            logging.info(msg="Linear scorer does not match the saved model, ignoring it")
+            linear_scorer = None
+        else:
+            logging.info(msg="Linear scorer loaded")
+
+        self._entry = (signature, linear_scorer)
+        return linear_scorer
+
+
+# export step
+def export_linear_scorer(model, data_preprocessor, file_path:str, model_file_path:str=None):
+    """
+    Folds the fitted data preprocessor and linear
+    model into a `LinearScorer` and saves it
+    as a `.json` file.
+
+    Input Parameters ->
+    `model`: trained linear model (see `is_linear_model`)
+    `data_preprocessor`: fitted `ColumnTransformer` object
+    `file_path`: (str) path where the scorer `.json` file is to be saved
+    `model_file_path`: (str) path of the saved model, its hash is stored
+                       so that a stale scorer can be detected
+    """
+    try:
+        # the compiled preprocessor exposes the fitted statistics in a plain form
+        from src.pipeline.compiled_preprocessor import CompiledPreprocessor
+
+        if not is_linear_model(model):
+            raise ValueError(f"{type(model).__name__} cannot be folded into a linear scorer")
+
+        compiled_preprocessor = CompiledPreprocessor.from_column_transformer(data_preprocessor)
+
+        # fold in exact (rational) arithmetic: with collinear one hot features a fitted
+        # `LinearRegression` can have huge coefficients which cancel each other out
+        coefficients = [Fraction(float(coef)) for coef in model.coef_]
+        # `SGDRegressor` keeps its intercept as a one element array
+        intercept = Fraction(float(model.intercept_[0] if hasattr(model.intercept_, "__len__") else model.intercept_))
+
+        numerical = {}
+        categorical = {}
+        offset = 0
+        for block in compiled_preprocessor.blocks:
+            block_coefficients = coefficients[offset:offset + block.n_features]
+
+            if hasattr(block, "lookups"):
+                # one hot feature -> contribution = coefficient * feature value
+                for i, column in enumerate(block.columns):
+                    contributions = {
+                        str(category): block_coefficients[position] * Fraction(feature_value)
+                        for category, (position, feature_value) in block.lookups[i].items()
+                    }
+                    # move the first category's contribution into the intercept
+                    # so that the stored contributions stay small
+                    reference_contribution = next(iter(contributions.values()))
+                    intercept += reference_contribution
+                    categorical[column] = {
+                        "contributions": {
+                            category: float(contribution - reference_contribution)
+                            for category, contribution in contributions.items()
+                        },
+                        "fill_value": None if block.fill_values is None else str(block.fill_values[i]),
+                        # an unknown category contributes 0 (all zero encoding) if the encoder ignores it
+                        "ignore_unknown": bool(block.ignore_unknown),
+                        "unknown_contribution": float(-reference_contribution)
+                    }
+            else:
+                # coef * (x - mean) / scale = (coef / scale) * x - coef * mean / scale
+                for i, column in enumerate(block.columns):
+                    weight = block_coefficients[i]
+                    if block.scale is not None:
+                        weight = weight / Fraction(float(block.scale[i]))
+                    if block.mean is not None:
+                        intercept -= weight * Fraction(float(block.mean[i]))
+                    numerical[column] = {
+                        "weight": float(weight),
+                        "fill_value": None if block.fill_values is None else float(block.fill_values[i])
+                    }
+
+            offset += block.n_features
+
+        intercept = float(intercept)
+
+        scorer_dict = {
+            "intercept": intercept,
+            "numerical": numerical,
+            "categorical": categorical,
+            "model_hash": None if model_file_path is None else get_file_hash(model_file_path)
+        }
+
+        # save the scorer through a temporary file so that readers never see a partial file
+        os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+        temp_file_path = f"{file_path}.tmp"
+        with open(temp_file_path, "w") as file_object:
+            json.dump(scorer_dict, file_object, indent=2)
+        os.replace(temp_file_path, file_path)
+
+        logging.info(msg=f"Linear scorer exported to {file_path}")
+
+        return LinearScorer(scorer_dict=scorer_dict)
+
+    except Exception as e:
+        raise CustomException(error_message=e, error_detail=sys)
+
+
+if __name__ == "__main__":
+    # export the linear scorer from the saved artifacts and compare it against sklearn
+    import numpy as np
+    import pandas as pd
+    from src.utils import load_object
+
+    model_file_path = os.path.join("artifact", "model.pkl")
+    model = load_object(file_path=model_file_path)
+    data_preprocessor = load_object(file_path=os.path.join("artifact", "preprocessor.pkl"))
+
+    linear_scorer = export_linear_scorer(model=model, data_preprocessor=data_preprocessor,
+                                         file_path=os.path.join("artifact", "linear_scorer.json"),
+                                         model_file_path=model_file_path)
+
+    test_df = pd.read_csv(os.path.join("artifact", "test.csv"))
+    expected_predictions = model.predict(data_preprocessor.transform(test_df))
+    scorer_predictions = np.array([
+        linear_scorer.score_record(record=record)
+        for record in test_df.to_dict(orient="records")
+    ])
+    print(f"Max absolute difference to sklearn on {len(test_df)} rows: "
+          f"{np.max(np.abs(scorer_predictions - expected_predictions)):.3e}")
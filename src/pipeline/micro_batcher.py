@@ -0,0 +1,147 @@
+# DEPENDENCIES
+
+# for working with custom exception and custom logging
+import os
+import sys
+from src.exception import CustomException
+from src.logger import logging
+# for collecting requests from concurrent callers
+import time
+import queue
+import threading
+from concurrent.futures import Future
+# for recording batch sizes & queueing delay
+from src.metrics import metrics
+
+
+# upper bounds of the batch size histogram buckets
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+
+# MICRO BATCHER
+class MicroBatcher:
+    """
+    Coalesces single record predictions from
+    concurrent requests into batches.
+
+    The first record waiting in the queue opens a
+    batch window: records arriving within `max_wait`
+    seconds (up to `max_batch_size` records) are
+    predicted with one call of `predict_function`,
+    and every caller gets back its own prediction.
+    A lone request waits at most `max_wait` longer
+    than it would without batching.
+    """
+    # variables
+    def __init__(self, predict_function, max_batch_size:int=64, max_wait:float=0.002):
+        # function mapping a list of records to a list of predictions
+        self.predict_function = predict_function
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread = None
+        # process which started the worker thread (threads do not survive `fork`)
+        self._pid = None
+
+    # methods
+    def _ensure_started(self):
+        """
+        Starts the worker thread on first use
+        (and again in a forked worker process).
+        """
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            if self._pid != os.getpid():
+                # records queued in the parent process are not ours to serve
+                self._queue = queue.SimpleQueue()
+            self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+            logging.info(msg=f"Micro-batcher started (max batch size {self.max_batch_size}, "
+                             f"max wait {self.max_wait * 1000:.1f} ms)")
+
+    def submit(self, record:dict):
+        """
+        Queues a record and returns a `Future`
+        which receives its prediction.
+
+        Input Parameters ->
+        `record`: (dict) raw input values keyed by input feature name
+        """
+        self._ensure_started()
+        future = Future()
+        self._queue.put((record, future, time.perf_counter()))
+        return future
+
+    def predict(self, record:dict, timeout:float=None):
+        """
+        Returns the prediction (float) for a single
+        record, predicted together with the records
+        of other concurrent callers.
+
+        Input Parameters ->
+        `record`: (dict) raw input values keyed by input feature name
+        `timeout`: (float) seconds to wait for the prediction (default: no limit)
+        """
+        return self.submit(record=record).result(timeout=timeout)
+
+    def _collect_batch(self):
+        """
+        Blocks until a record arrives, then collects
+        records until the batch is full or the window closes.
+        """
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining_time = deadline - time.perf_counter()
+            if remaining_time <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining_time))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _predict_batch(self, batch:list):
+        """
+        Predicts a batch and hands every caller its prediction.
+        """
+        start_time = time.perf_counter()
+        for _, _, submit_time in batch:
+            metrics.observe("micro_batch_queue_seconds", start_time - submit_time,
+                            help_text="Time a record waited for its batch")
+        metrics.observe("micro_batch_size", len(batch), help_text="Number of records per micro-batch",
+                        buckets=BATCH_SIZE_BUCKETS)
+
+        records = [record for record, _, _ in batch]
+        try:
+            predictions = self.predict_function(records)
+        except Exception:
+            # a bad record must not fail the other callers -> predict one by one
+            for record, future, _ in batch:
+                try:
+                    future.set_result(self.predict_function([record])[0])
+                except Exception as e:
+                    future.set_exception(e)
+            return
+
+        for (_, future, _), prediction in zip(batch, predictions):
+            future.set_result(prediction)
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            try:
+                self._predict_batch(batch)
+            except Exception as e:
+                # keep serving, but never leave a caller waiting
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(CustomException(error_message=e, error_detail=sys))
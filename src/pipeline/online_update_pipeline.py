@@ -0,0 +1,465 @@
+# DEPENDENCIES
+
+# for working with file paths, custom exception and custom logging
+import os
+import sys
+from src.exception import CustomException
+from src.logger import logging
+# for parsing command line arguments
+import argparse
+# for timing the update
+import time
+# for saving the artifacts of an unpublished update outside of `artifact`
+import tempfile
+# for defining class variables
+from dataclasses import dataclass, field
+# for moving coefficients without rounding errors
+from fractions import Fraction
+# for working with dataframes and arrays
+import numpy as np
+import pandas as pd
+# for continuing training on the new rows
+from sklearn.linear_model import SGDRegressor
+
+# the feature layout of the in-memory pipeline
+from src.components.data_transformation import DataTransformation
+# for the paths of the files exported next to the model
+from src.components.model_trainer import ModelTrainerConfig
+# the fitted statistics of the preprocessor in a plain form
+from src.pipeline.compiled_preprocessor import CompiledPreprocessor
+# for folding the updated model into a precomputed scorer
+from src.pipeline.linear_scorer import export_linear_scorer, is_linear_model
+# for reading the current version & publishing the updated one
+from src.pipeline.artifact_registry import ArtifactRegistry
+# utility functions
+from src.utils import save_object, load_object, load_dataframe, format_features
+
+
+# ONLINE UPDATE CONFIG
+@dataclass
+class OnlineUpdateConfig:
+    """
+    Contains the inputs of an online update:
+    how long SGD trains on the new rows and
+    the score the updated model must reach.
+    """
+    # passes of `SGDRegressor.partial_fit` over the new rows
+    n_epochs:int = 5
+
+    # parameters of the `SGDRegressor` which continues a model without `partial_fit`
+    sgd_parameters:dict = field(default_factory=lambda: {"alpha": 1e-4, "eta0": 0.01})
+
+    # seed for holding out & shuffling the new rows
+    random_state:int = 42
+
+    # fraction of the new rows held out from the update to score the current & updated model on
+    holdout_size:float = 0.2
+
+    # minimum R^2 score of the updated model on the held-out rows for it to be saved
+    min_r2_score:float = 0.6
+
+    # largest drop of the R^2 score on the held-out rows (updated vs current model) for the
+    # update to be saved: an SGD continuation of an exact least squares fit rarely matches
+    # it on rows without drift, and a few held-out rows make the comparison noisy
+    max_r2_drop:float = 0.01
+
+    # artifact paths (same as the in-memory pipeline, so the web app serves either)
+    preprocessor_object_file_path:str = os.path.join("artifact", "preprocessor.pkl")
+    trained_model_file_path:str = os.path.join("artifact", "model.pkl")
+
+    # directory for the artifacts of an update which is not published, so that the served
+    # artifacts are left untouched (a new temporary directory if None)
+    scratch_dir_path:str = None
+
+
+# helper function to get the scaling of every output feature of the preprocessor
+def _get_scaling(data_preprocessor):
+    """
+    Returns the (mean, scale) arrays applied by the
+    scalers of the preprocessor to its output features
+    (mean 0 where not centering, scale 1 where not scaling).
+
+    Input Parameters ->
+    `data_preprocessor`: fitted `ColumnTransformer` object
+    """
+    means = []
+    scales = []
+    for name, pipeline, _ in data_preprocessor.transformers_:
+        if name == "remainder":
+            continue
+        scaler = pipeline.steps[-1][1]
+        n_features = len(scaler.scale_) if scaler.scale_ is not None else len(scaler.mean_)
+        means.append(scaler.mean_ if scaler.with_mean else np.zeros(n_features))
+        scales.append(scaler.scale_ if scaler.scale_ is not None else np.ones(n_features))
+    return np.concatenate(means), np.concatenate(scales)
+
+
+# helper function to express a linear model relative to a reference category
+def _get_reference_coefficients(model, data_preprocessor):
+    """
+    Returns the coefficients & intercept of a linear
+    model with, for every categorical feature, the
+    contribution of its first category moved into the
+    intercept (first category coefficient = 0).
+
+    Exactly one category of every feature is active, so
+    the predictions are unchanged, but the huge cancelling
+    coefficients a `LinearRegression` can have with collinear
+    one hot features become small enough for SGD to continue.
+
+    Input Parameters ->
+    `model`: trained linear model (see `is_linear_model`)
+    `data_preprocessor`: fitted `ColumnTransformer` object
+    """
+    compiled_preprocessor = CompiledPreprocessor.from_column_transformer(data_preprocessor)
+
+    # exact (rational) arithmetic, as in `export_linear_scorer`
+    coefficients = [Fraction(float(coef)) for coef in model.coef_]
+    intercept = Fraction(float(np.ravel(model.intercept_)[0]))
+
+    offset = 0
+    for block in compiled_preprocessor.blocks:
+        if hasattr(block, "lookups"):
+            for lookup in block.lookups:
+                positions = [(offset + position, Fraction(feature_value))
+                             for position, feature_value in lookup.values()]
+                reference_position, reference_value = positions[0]
+                reference_contribution = coefficients[reference_position] * reference_value
+                intercept += reference_contribution
+                for position, feature_value in positions:
+                    coefficients[position] -= reference_contribution / feature_value
+        offset += block.n_features
+
+    return np.array([float(coef) for coef in coefficients]), float(intercept)
+
+
+# helper function to compute the R^2 score
+def _get_r2_score(y_true, y_pred):
+    return float(1 - np.sum((y_true - y_pred) ** 2) / np.sum((y_true - np.mean(y_true)) ** 2))
+
+
+# ONLINE UPDATE PIPELINE
+class OnlineUpdatePipeline:
+    """
+    Updates the served model with newly labelled rows
+    in seconds, without the data ingestion, grid search
+    and full retrain of the training pipeline:
+
+    1. the scalers of the preprocessor continue their
+       statistics on the new rows (`partial_fit`), the
+       imputer medians & one hot categories stay as they are
+    2. the coefficients of the linear model are rescaled
+       to the new scaling (predictions are unchanged)
+    3. an `SGDRegressor` continues training from these
+       coefficients on the new rows (`partial_fit`)
+    4. if the updated model scores about as well as the
+       current one (within `max_r2_drop`) or better on new
+       rows held out from steps 1-3, the artifacts are saved
+       & published as a new version
+
+    Only linear models can be updated; after a tree model
+    was trained (or when new categories appear), a full
+    retrain with `TrainPipeline` is the fallback.
+    """
+    # variables
+    def __init__(self, config:OnlineUpdateConfig=None, publish:bool=True):
+        self.online_config = config if config is not None else OnlineUpdateConfig()
+        self.data_transformation = DataTransformation()
+        # `publish=False` leaves the served artifact version unchanged
+        self.publish = publish
+        self.artifact_registry = ArtifactRegistry()
+
+    # methods
+    def load_artifacts(self):
+        """
+        Returns the model & preprocessor of the
+        current artifact version (or the unversioned
+        artifacts if no version was published yet)
+        and the name of the version.
+        """
+        version = self.artifact_registry.get_current_version()
+        if version is not None:
+            version_path = self.artifact_registry.get_version_path(version)
+            model_file_path = os.path.join(version_path, "model.pkl")
+            preprocessor_file_path = os.path.join(version_path, "preprocessor.pkl")
+        else:
+            model_file_path = self.online_config.trained_model_file_path
+            preprocessor_file_path = self.online_config.preprocessor_object_file_path
+
+        return load_object(file_path=model_file_path), load_object(file_path=preprocessor_file_path), version
+
+    def prepare_rows(self, df:pd.DataFrame, data_preprocessor):
+        """
+        Returns the input features dataframe & target
+        array of the new rows, without the rows which
+        have no target or a category the preprocessor
+        has not seen (those need a full retrain).
+
+        Input Parameters ->
+        `df`: (pd.DataFrame) new rows (`stud.csv` schema)
+        `data_preprocessor`: fitted `ColumnTransformer` object
+        """
+        # same target as `DataTransformation`: average of the three scores
+        target = ((df["math_score"] + df["writing_score"] + df["reading_score"]) / 3).to_numpy(dtype=np.float64)
+        is_valid = ~np.isnan(target)
+
+        for name, pipeline, columns in data_preprocessor.transformers_:
+            if "one_hot_encoder" not in getattr(pipeline, "named_steps", {}):
+                continue
+            for column, categories in zip(columns, pipeline.named_steps["one_hot_encoder"].categories_):
+                is_valid &= (df[column].isna() | df[column].isin(categories)).to_numpy()
+
+        if not is_valid.all():
+            logging.info(msg=f"Skipped {int((~is_valid).sum())} new rows without a target or with unseen categories")
+
+        return df[is_valid].drop(columns=["writing_score"]).reset_index(drop=True), target[is_valid]
+
+    def split_rows(self, input_df:pd.DataFrame, y):
+        """
+        Returns a random mask of the new rows held out
+        from the update (`holdout_size` of them, at least
+        two so that an R^2 score can be computed).
+
+        Input Parameters ->
+        `input_df`: (pd.DataFrame) input features of the new rows
+        `y`: (array) target of the new rows
+        """
+        n_holdout = max(2, int(round(self.online_config.holdout_size * len(y))))
+        if n_holdout >= len(y):
+            raise ValueError(f"Too few new rows ({len(y)}) to hold out {n_holdout} for scoring the update")
+
+        random_generator = np.random.default_rng(self.online_config.random_state)
+        is_holdout = np.zeros(len(y), dtype=bool)
+        is_holdout[random_generator.choice(len(y), size=n_holdout, replace=False)] = True
+
+        return is_holdout
+
+    def update_scalers(self, data_preprocessor, input_df:pd.DataFrame):
+        """
+        Continues the statistics of the scalers
+        of the preprocessor on the new rows.
+
+        Input Parameters ->
+        `data_preprocessor`: fitted `ColumnTransformer` object
+        `input_df`: (pd.DataFrame) input features of the new rows
+        """
+        for name, pipeline, columns in data_preprocessor.transformers_:
+            if name == "remainder":
+                continue
+            # all steps before the scaler (imputer, one hot encoder)
+            pipeline.steps[-1][1].partial_fit(pipeline[:-1].transform(input_df[columns]))
+
+        return data_preprocessor
+
+    def update_model(self, model, coefficients, intercept:float, n_samples_seen:int, X, y):
+        """
+        Returns an `SGDRegressor` which continues from
+        the input coefficients (in the new scaling) and
+        is trained on the new rows for `n_epochs` passes.
+
+        Input Parameters ->
+        `model`: current linear model (an `SGDRegressor` keeps its learning rate schedule)
+        `coefficients`: (array) coefficients in the new scaling
+        `intercept`: (float) intercept in the new scaling
+        `n_samples_seen`: (int) rows the current model was trained on
+        `X`, `y`: transformed input features (float64) & target of the new rows
+        """
+        online_config = self.online_config
+        if not isinstance(model, SGDRegressor):
+            # continue the learning rate schedule as if SGD had trained the current model
+            model = SGDRegressor(random_state=online_config.random_state, **online_config.sgd_parameters)
+            model.t_ = float(n_samples_seen + 1)
+            model.n_features_in_ = len(coefficients)
+
+        # `partial_fit` continues from the fitted attributes
+        model.coef_ = np.ascontiguousarray(coefficients, dtype=np.float64)
+        model.intercept_ = np.array([intercept], dtype=np.float64)
+
+        random_generator = np.random.default_rng(online_config.random_state)
+        for _ in range(online_config.n_epochs):
+            order = random_generator.permutation(len(y))
+            model.partial_fit(X[order], y[order])
+
+        return model
+
+    def save_artifacts(self, model, data_preprocessor, metadata:dict):
+        """
+        Saves the preprocessor & model and exports the
+        linear scorer. If publishing, they replace the
+        served artifacts (removing exports of a previous
+        model) and are published as a new artifact version,
+        otherwise they are saved in the scratch directory.
+
+        Returns the directory of the saved artifacts and
+        the name of the version (None if not published).
+        """
+        online_config = self.online_config
+        trainer_config = ModelTrainerConfig()
+
+        if self.publish:
+            files = {
+                "model.pkl": online_config.trained_model_file_path,
+                "preprocessor.pkl": online_config.preprocessor_object_file_path,
+                "linear_scorer.json": trainer_config.linear_scorer_file_path
+            }
+        else:
+            scratch_dir_path = online_config.scratch_dir_path or tempfile.mkdtemp(prefix="online_update_")
+            files = {file_name: os.path.join(scratch_dir_path, file_name)
+                     for file_name in ("model.pkl", "preprocessor.pkl", "linear_scorer.json")}
+
+        save_object(file_path=files["preprocessor.pkl"], obj=data_preprocessor)
+        save_object(file_path=files["model.pkl"], obj=model)
+
+        export_linear_scorer(model=model, data_preprocessor=data_preprocessor,
+                             file_path=files["linear_scorer.json"], model_file_path=files["model.pkl"])
+
+        artifacts_dir_path = os.path.dirname(files["model.pkl"])
+        if not self.publish:
+            logging.info(msg=f"Updated artifacts saved in {artifacts_dir_path} (not published)")
+            return artifacts_dir_path, None
+
+        # tree ensemble & prediction table of a previous model would no longer match
+        prediction_table_metadata_path = f"{os.path.splitext(trainer_config.prediction_table_file_path)[0]}.json"
+        for file_path in (trainer_config.tree_ensemble_file_path, trainer_config.prediction_table_file_path,
+                          prediction_table_metadata_path):
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+        return artifacts_dir_path, self.artifact_registry.publish(files=files, metadata=metadata)
+
+    def run(self, df:pd.DataFrame):
+        """
+        Updates the current model & preprocessor with
+        the new rows and saves (and publishes) them.
+
+        Returns a dict with the number of rows used, the
+        number of held-out rows, the R^2 score on the
+        held-out rows before & after the update, the
+        published version and the directory of the saved
+        artifacts (the scratch directory if not published).
+
+        The update is refused (ValueError) if its R^2 score
+        on the held-out rows is below `min_r2_score` or more
+        than `max_r2_drop` below the score of the current model.
+
+        Input Parameters ->
+        `df`: (pd.DataFrame) newly labelled rows (`stud.csv` schema)
+        """
+        try:
+            start_time = time.perf_counter()
+            model, data_preprocessor, base_version = self.load_artifacts()
+
+            if not is_linear_model(model):
+                raise ValueError(f"{type(model).__name__} cannot be updated online, run a full retrain instead")
+
+            input_df, y = self.prepare_rows(df=df, data_preprocessor=data_preprocessor)
+            if not len(y):
+                raise ValueError("No usable new rows")
+
+            # rows neither model is trained on, to compare them fairly
+            is_holdout = self.split_rows(input_df=input_df, y=y)
+            holdout_df, y_holdout = input_df[is_holdout], y[is_holdout]
+            input_df, y = input_df[~is_holdout], y[~is_holdout]
+
+            r2_score_before = _get_r2_score(y_holdout, model.predict(data_preprocessor.transform(holdout_df)))
+
+            coefficients, intercept = _get_reference_coefficients(model=model, data_preprocessor=data_preprocessor)
+            old_mean, old_scale = _get_scaling(data_preprocessor)
+            n_samples_seen = int(np.max(data_preprocessor.transformers_[0][1].steps[-1][1].n_samples_seen_))
+
+            data_preprocessor = self.update_scalers(data_preprocessor=data_preprocessor, input_df=input_df)
+
+            # coef * (x - mean) / scale = coef' * (x - mean') / scale' + (intercept' - intercept)
+            new_mean, new_scale = _get_scaling(data_preprocessor)
+            intercept += float(np.sum(coefficients * (new_mean - old_mean) / old_scale))
+            coefficients = coefficients * new_scale / old_scale
+
+            # layout of the in-memory pipeline, float64 as the linear models of `model_search`
+            feature_format = self.data_transformation.data_transformation_config.feature_format
+            X = format_features(data_preprocessor.transform(input_df),
+                                feature_format=feature_format, feature_dtype="float64")
+            model = self.update_model(model=model, coefficients=coefficients, intercept=intercept,
+                                      n_samples_seen=n_samples_seen, X=X, y=y)
+
+            X_holdout = format_features(data_preprocessor.transform(holdout_df),
+                                        feature_format=feature_format, feature_dtype="float64")
+            r2_score_after = _get_r2_score(y_holdout, model.predict(X_holdout))
+            if r2_score_after < self.online_config.min_r2_score:
+                raise ValueError(f"Updated model R^2 {r2_score_after:.4f} on the held-out rows "
+                                 f"is below {self.online_config.min_r2_score}")
+            if r2_score_after < r2_score_before - self.online_config.max_r2_drop:
+                raise ValueError(f"Updated model R^2 {r2_score_after:.4f} on the held-out rows is more than "
+                                 f"{self.online_config.max_r2_drop} below the current model's {r2_score_before:.4f}")
+
+            metadata = {
+                "model_name": "SGD Regressor (online update)",
+                "r2_score": r2_score_after,
+                "base_version": base_version,
+                "n_rows": len(y),
+                "n_holdout_rows": len(y_holdout)
+            }
+            artifacts_dir_path, version = self.save_artifacts(model=model, data_preprocessor=data_preprocessor,
+                                                              metadata=metadata)
+
+            update_summary = {
+                "n_rows": len(y),
+                "n_holdout_rows": len(y_holdout),
+                "r2_score_before": r2_score_before,
+                "r2_score_after": r2_score_after,
+                "version": version,
+                "artifacts_dir_path": artifacts_dir_path,
+                "seconds": time.perf_counter() - start_time
+            }
+            logging.info(msg=f"Online update completed: {update_summary}")
+
+            return update_summary
+
+        except Exception as e:
+            raise CustomException(error_message=e, error_detail=sys)
+
+
+# command line entry point
+def main(argv:list=None):
+    """
+    `python -m src.pipeline.online_update_pipeline --data new_rows.csv`
+
+    Input Parameters ->
+    `argv`: (list) command line arguments (default: `sys.argv[1:]`)
+    """
+    parser = argparse.ArgumentParser(description="Update the served model with newly labelled rows")
+    parser.add_argument("--data", required=True, help="new rows (csv, parquet, feather or npy)")
+    parser.add_argument("--epochs", type=int, default=None, help="passes of SGD over the new rows")
+    parser.add_argument("--holdout-size", type=float, default=None,
+                        help="fraction of the new rows held out to score the update on")
+    parser.add_argument("--max-r2-drop", type=float, default=None,
+                        help="largest drop of the held-out R^2 score for the update to be saved")
+    parser.add_argument("--no-publish", action="store_true",
+                        help="do not publish the updated artifacts as the current version")
+    parser.add_argument("--scratch-dir", default=None,
+                        help="directory for the artifacts of a --no-publish update (default: a new temporary directory)")
+    args = parser.parse_args(argv)
+
+    online_config = OnlineUpdateConfig()
+    if args.epochs is not None:
+        online_config.n_epochs = args.epochs
+    if args.holdout_size is not None:
+        online_config.holdout_size = args.holdout_size
+    if args.max_r2_drop is not None:
+        online_config.max_r2_drop = args.max_r2_drop
+    if args.scratch_dir is not None:
+        online_config.scratch_dir_path = args.scratch_dir
+
+    online_update_pipeline = OnlineUpdatePipeline(config=online_config, publish=not args.no_publish)
+    update_summary = online_update_pipeline.run(df=load_dataframe(args.data))
+
+    print(f"Updated on {update_summary['n_rows']} new rows in {update_summary['seconds']:.2f} s")
+    print(f"R^2 Score on the {update_summary['n_holdout_rows']} held-out new rows: {update_summary['r2_score_before']:.3f} before, "
+          f"{update_summary['r2_score_after']:.3f} after the update")
+    if update_summary["version"] is not None:
+        print(f"Serving artifact version: {update_summary['version']}")
+    else:
+        print(f"Artifacts saved (not published) in: {update_summary['artifacts_dir_path']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,9 +5,20 @@ import os
 import sys
 from src.exception import CustomException
 from src.logger import logging
-# for loading data objects
-from src.utils import load_object
+# for loading data objects (cached across requests)
+from src.pipeline.artifact_cache import artifact_cache
+# for transforming single records without pandas
+from src.pipeline.compiled_preprocessor import CompiledPreprocessor
+# for scoring single records with a folded linear model (if exported)
+from src.pipeline.linear_scorer import LinearScorerCache
+# for predicting small batches with a flattened tree ensemble (if exported)
+from src.pipeline.tree_ensemble import TreeEnsembleCache
+# for answering in-domain records from the precomputed predictions (if exported)
+from src.pipeline.prediction_table import PredictionTableCache
+# for recording the time spent in each prediction stage
+from src.metrics import metrics
 # for working with dataframes
+import numpy as np
 import pandas as pd
 
 
@@ -23,24 +34,253 @@ class PredictPipeline:
     # methods
     def predict(self, features):
         try:
-            # path for trained model
-            model_path = os.path.join("artifact", "model.pkl")
-            # path for data preprocessor object
-            data_preprocessor_path = os.path.join("artifact", "preprocessor.pkl")
-            # load trained model and data preprocessor object
-            model = load_object(file_path=model_path)
-            data_preprocessor = load_object(file_path=data_preprocessor_path)
+            # get trained model and data preprocessor object
+            # (loaded from disk only once, or again when the artifacts change)
+            with metrics.time_stage("load_artifacts"):
+                artifact_version = artifact_cache.get_version()
+                model, data_preprocessor = artifact_version.get_artifacts()
 
             # transform user input data (in form of dataframe) from front-end
-            data_scaled = data_preprocessor.transform(features)
+            with metrics.time_stage("transform"):
+                data_scaled = data_preprocessor.transform(features)
             # make prediction
-            prediction = model.predict(data_scaled)
+            with metrics.time_stage("model_predict"):
+                prediction = self._predict_features(artifact_version=artifact_version, model=model,
+                                                    data_scaled=data_scaled)
 
             return prediction
 
         except Exception as e:
             raise CustomException(error_message=e, error_detail=sys)
 
+    def check_batch(self, batch_data, features_df:pd.DataFrame):
+        """
+        Returns the reason every record of the batch
+        cannot be scored by the served preprocessor
+        (None for records which can, see
+        `CustomBatchData.get_row_errors`).
+
+        Input Parameters ->
+        `batch_data`: (CustomBatchData) the batch
+        `features_df`: (pd.DataFrame) output of `batch_data.get_data_as_dataframe(coerce_numbers=True)`
+        """
+        try:
+            _, data_preprocessor = artifact_cache.get_artifacts()
+            return batch_data.get_row_errors(features_df=features_df, data_preprocessor=data_preprocessor)
+
+        except Exception as e:
+            raise CustomException(error_message=e, error_detail=sys)
+
+    def warm_up(self):
+        """
+        Loads the current artifacts (and the objects
+        derived from them) into the process-wide cache
+        and runs one prediction, so that the first
+        request does not pay for it.
+
+        In a pre-fork server this runs in the parent process
+        and the forked workers share the loaded objects.
+        """
+        try:
+            artifact_version = artifact_cache.warm_up()
+
+            logging.info(msg=f"Prediction pipeline warmed up (artifact version `{artifact_version.version}`)")
+
+        except Exception as e:
+            raise CustomException(error_message=e, error_detail=sys)
+
+    @staticmethod
+    def _compile_preprocessor(model, data_preprocessor):
+        """
+        Builds the compiled (pandas-free) preprocessor
+        for the cached data preprocessor, or returns None
+        if the preprocessor cannot be compiled.
+        """
+        try:
+            return CompiledPreprocessor.from_column_transformer(data_preprocessor)
+        except ValueError as e:
+            logging.info(msg=f"Data preprocessor cannot be compiled, using sklearn path: {e}")
+            return None
+
+    @staticmethod
+    def _predict_features(artifact_version, model, data_scaled):
+        """
+        Predicts transformed input features with the
+        flattened tree ensemble if one was exported for
+        the model and the batch is small enough for it
+        to be faster, otherwise with the model itself.
+        """
+        tree_ensemble = artifact_version.get_derived("tree_ensemble").get_ensemble()
+        if tree_ensemble is not None and data_scaled.shape[0] <= tree_ensemble.max_rows:
+            return tree_ensemble.predict(data_scaled)
+        return model.predict(data_scaled)
+
+    def predict_record(self, record:dict):
+        """
+        Fast path for predicting a single record
+        without building a dataframe.
+
+        Returns the model prediction (array with one item).
+
+        Input Parameters ->
+        `record`: (dict) raw input values keyed by input feature name
+                  (see `CustomData.get_data_as_dict`)
+        """
+        try:
+            # everything below comes from the same artifact version
+            artifact_version = artifact_cache.get_version()
+
+            # precomputed prediction of the saved model -> one index calculation (any model family)
+            with metrics.time_stage("load_prediction_table"):
+                prediction_table = artifact_version.get_derived("prediction_table").get_table()
+            if prediction_table is not None:
+                with metrics.time_stage("table_lookup"):
+                    prediction = prediction_table.lookup(record=record)
+                if prediction is not None:
+                    return [prediction]
+
+            # folded linear model -> a few table lookups, no sklearn objects needed
+            with metrics.time_stage("load_linear_scorer"):
+                linear_scorer = artifact_version.get_derived("linear_scorer").get_scorer()
+            if linear_scorer is not None:
+                with metrics.time_stage("linear_score"):
+                    return [linear_scorer.score_record(record=record)]
+
+            with metrics.time_stage("load_artifacts"):
+                model, data_preprocessor = artifact_version.get_artifacts()
+                compiled_preprocessor = artifact_version.get_derived("compiled_preprocessor")
+
+            # preprocessor could not be compiled -> regular dataframe path
+            if compiled_preprocessor is None:
+                with metrics.time_stage("transform"):
+                    features = pd.DataFrame(data={key: [value] for key, value in record.items()})
+                    data_scaled = data_preprocessor.transform(features)
+            else:
+                # transform user input data straight into a feature vector
+                with metrics.time_stage("transform"):
+                    data_scaled = compiled_preprocessor.transform_record(record=record)
+
+            # make prediction
+            with metrics.time_stage("model_predict"):
+                prediction = self._predict_features(artifact_version=artifact_version, model=model,
+                                                    data_scaled=data_scaled)
+
+            return prediction
+
+        except Exception as e:
+            raise CustomException(error_message=e, error_detail=sys)
+
+
+    def predict_records(self, records:list):
+        """
+        Predicts many raw records at once (used by
+        the micro-batcher to serve concurrent requests).
+
+        Records answered by the prediction table or the
+        linear scorer are scored one by one, all other
+        records go through a single `transform`/`predict` call.
+
+        Returns a list of predictions (floats), one per record.
+
+        Input Parameters ->
+        `records`: (list) dicts of raw input values keyed by input feature name
+        """
+        try:
+            # everything below comes from the same artifact version
+            artifact_version = artifact_cache.get_version()
+            predictions = [None] * len(records)
+
+            prediction_table = artifact_version.get_derived("prediction_table").get_table()
+            if prediction_table is not None:
+                with metrics.time_stage("table_lookup"):
+                    for i, record in enumerate(records):
+                        predictions[i] = prediction_table.lookup(record=record)
+
+            remaining_indices = [i for i, prediction in enumerate(predictions) if prediction is None]
+            if not remaining_indices:
+                return predictions
+
+            linear_scorer = artifact_version.get_derived("linear_scorer").get_scorer()
+            if linear_scorer is not None:
+                with metrics.time_stage("linear_score"):
+                    for i in remaining_indices:
+                        predictions[i] = linear_scorer.score_record(record=records[i])
+                return predictions
+
+            # one vectorized transform & predict for the rest of the batch
+            features = CustomBatchData.from_records(
+                records=[records[i] for i in remaining_indices]
+            ).get_data_as_dataframe()
+            model, data_preprocessor = artifact_version.get_artifacts()
+            with metrics.time_stage("transform"):
+                data_scaled = data_preprocessor.transform(features)
+            with metrics.time_stage("model_predict"):
+                for i, prediction in zip(remaining_indices, self._predict_features(
+                        artifact_version=artifact_version, model=model, data_scaled=data_scaled)):
+                    predictions[i] = float(prediction)
+
+            return predictions
+
+        except Exception as e:
+            raise CustomException(error_message=e, error_detail=sys)
+
+
+# objects built once per artifact version (before it is served, see `ArtifactCache`)
+# compiled (pandas-free) preprocessor, or None if it cannot be compiled
+artifact_cache.register_derived(
+    "compiled_preprocessor",
+    lambda artifact_version: PredictPipeline._compile_preprocessor(*artifact_version.get_artifacts())
+)
+
+# linear scorer exported next to the model by `ModelTrainer` (if any)
+artifact_cache.register_derived(
+    "linear_scorer",
+    lambda artifact_version: LinearScorerCache(
+        scorer_path=artifact_version.get_path("linear_scorer.json"),
+        model_path=artifact_version.model_path
+    )
+)
+
+# flattened tree ensemble exported next to the model by `ModelTrainer` (if any)
+artifact_cache.register_derived(
+    "tree_ensemble",
+    lambda artifact_version: TreeEnsembleCache(
+        ensemble_path=artifact_version.get_path("tree_ensemble.npz"),
+        model_path=artifact_version.model_path
+    )
+)
+
+# prediction table exported next to the model by `ModelTrainer` (if enabled)
+artifact_cache.register_derived(
+    "prediction_table",
+    lambda artifact_version: PredictionTableCache(
+        table_path=artifact_version.get_path("prediction_table.npy"),
+        model_path=artifact_version.model_path
+    )
+)
+
+
+def _warm_up_prediction(artifact_version):
+    """
+    Loads the linear scorer, tree ensemble & prediction
+    table of a new version and runs one prediction with
+    all inputs imputed (imports what `predict` imports lazily).
+    """
+    artifact_version.get_derived("linear_scorer").get_scorer()
+    artifact_version.get_derived("prediction_table").get_table()
+
+    model, _ = artifact_version.get_artifacts()
+    compiled_preprocessor = artifact_version.get_derived("compiled_preprocessor")
+    if compiled_preprocessor is not None:
+        try:
+            PredictPipeline._predict_features(artifact_version=artifact_version, model=model,
+                                              data_scaled=compiled_preprocessor.transform_record(record={}))
+        except ValueError:
+            # no imputer -> an empty record cannot be transformed
+            pass
+
+artifact_cache.register_warm_up(_warm_up_prediction)
+
 
 # CUSTOM DATA
 class CustomData:
@@ -67,6 +307,22 @@ class CustomData:
         self.reading_score = reading_score
 
     # methods
+    def get_data_as_dict(self):
+        """
+        Returns the input data as a dict
+        (input feature name -> value) for
+        the single record fast path.
+        """
+        return {
+            "gender":self.gender,
+            "race_ethnicity":self.race_ethnicity,
+            "parental_level_of_education":self.parental_level_of_education,
+            "lunch":self.lunch,
+            "test_preparation_course":self.test_preparation_course,
+            "math_score":self.math_score,
+            "reading_score":self.reading_score
+        }
+
     def get_data_as_dataframe(self):
         try:
             # dict for creating dataframe
@@ -89,4 +345,126 @@ class CustomData:
         except Exception as e:
             raise CustomException(error_message=e, error_detail=sys)
         
-        
\ No newline at end of file
+        
+
+# CUSTOM BATCH DATA
+class CustomBatchData:
+    """
+    Maps a batch of student records
+    (JSON records or a CSV file with the
+    `stud.csv` column schema) to the
+    back-end prediction pipeline.
+    """
+    # input features expected by the data preprocessor
+    categorical_features = [
+        "gender", "race_ethnicity",
+        "parental_level_of_education",
+        "lunch", "test_preparation_course"
+    ]
+    numerical_features = [
+        "math_score", "reading_score"
+    ]
+
+    # variables
+    def __init__(self, data_df:pd.DataFrame):
+        self.data_df = data_df
+
+    # methods
+    @classmethod
+    def from_records(cls, records:list):
+        """
+        Creates the batch from a list of
+        JSON records (one dict per student).
+
+        Input Parameters ->
+        `records`: (list) list of dicts with the input features as keys
+        """
+        try:
+            if not isinstance(records, list):
+                raise ValueError("Expected a list of JSON records")
+
+            return cls(data_df=pd.DataFrame.from_records(records))
+
+        except Exception as e:
+            raise CustomException(error_message=e, error_detail=sys)
+
+    @classmethod
+    def from_csv(cls, file_object):
+        """
+        Creates the batch from a CSV file
+        with the `stud.csv` column schema.
+
+        Input Parameters ->
+        `file_object`: file path or file-like object of the CSV file
+        """
+        try:
+            return cls(data_df=pd.read_csv(file_object))
+
+        except Exception as e:
+            raise CustomException(error_message=e, error_detail=sys)
+
+    def get_data_as_dataframe(self, coerce_numbers:bool=False):
+        """
+        Returns the batch as a dataframe
+        containing only the input features
+        (extra columns like `writing_score` are dropped).
+
+        Input Parameters ->
+        `coerce_numbers`: (bool) if True, scores which are not numbers
+                          become NaN instead of raising a ValueError
+        """
+        try:
+            # check that all input features are present
+            input_features = self.categorical_features + self.numerical_features
+            missing_features = [
+                feature
+                for feature in input_features
+                if feature not in self.data_df.columns
+            ]
+            if missing_features:
+                raise ValueError(f"Missing input features: {missing_features}")
+
+            batch_df = self.data_df[input_features].copy()
+
+            # scores sent as strings (JSON) are converted to numbers
+            for feature in self.numerical_features:
+                batch_df[feature] = pd.to_numeric(batch_df[feature], errors="coerce" if coerce_numbers else "raise")
+
+            logging.info(msg=f"Successfully mapped a batch of {len(batch_df)} records into a dataframe")
+
+            return batch_df
+
+        except Exception as e:
+            raise CustomException(error_message=e, error_detail=sys)
+
+    def get_row_errors(self, features_df:pd.DataFrame, data_preprocessor):
+        """
+        Returns an array with the reason every record
+        cannot be scored (None for records which can):
+        a score which is not a number, or a category the
+        preprocessor has not seen (unless its encoder
+        ignores unknown categories).
+
+        Input Parameters ->
+        `features_df`: (pd.DataFrame) output of `get_data_as_dataframe(coerce_numbers=True)`
+        `data_preprocessor`: fitted `ColumnTransformer` object
+        """
+        messages = [[] for _ in range(len(features_df))]
+
+        for column in self.numerical_features:
+            is_not_number = (features_df[column].isna() & self.data_df[column].notna()).to_numpy()
+            for i in np.flatnonzero(is_not_number):
+                messages[i].append(f"{column} `{self.data_df[column].iloc[i]}` is not a number")
+
+        for _, pipeline, columns in data_preprocessor.transformers_:
+            one_hot_encoder = getattr(pipeline, "named_steps", {}).get("one_hot_encoder")
+            if one_hot_encoder is None or one_hot_encoder.handle_unknown != "error":
+                continue
+            for column, categories in zip(columns, one_hot_encoder.categories_):
+                is_unknown = ~(features_df[column].isna() | features_df[column].isin(categories)).to_numpy()
+                for i in np.flatnonzero(is_unknown):
+                    messages[i].append(f"unknown {column} `{features_df[column].iloc[i]}`")
+
+        return np.array(["; ".join(row_messages) if row_messages else None for row_messages in messages],
+                        dtype=object)
+
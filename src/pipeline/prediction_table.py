@@ -0,0 +1,290 @@
+# DEPENDENCIES
+
+# for working with file paths, custom exception and custom logging
+import os
+import sys
+from src.exception import CustomException
+from src.logger import logging
+# for saving/loading the table axes
+import json
+# for enumerating every combination of categories
+import itertools
+# for working with arrays
+import numpy as np
+# for hashing the model file the table was exported from
+from src.pipeline.linear_scorer import get_file_hash
+
+
+# range (inclusive) of the integer inputs covered by the table
+DEFAULT_NUMERICAL_RANGES = {
+    "math_score": (0, 100),
+    "reading_score": (0, 100)
+}
+
+
+# helper function to get the paths of the table files
+def _get_table_paths(file_path:str):
+    """
+    Returns the paths of the table array (`.npy`)
+    and of its axes description (`.json`).
+
+    Input Parameters ->
+    `file_path`: (str) path of the table, e.g. `artifact/prediction_table.npy`
+    """
+    return file_path, f"{os.path.splitext(file_path)[0]}.json"
+
+
+# PREDICTION TABLE
+class PredictionTable:
+    """
+    Predictions of the saved model for every point
+    of the (bounded) input space of the web form:
+    one axis per categorical feature (its categories)
+    and one per integer feature (e.g. scores 0-100).
+
+    The table is memory-mapped, so a prediction is a
+    single index calculation and all processes share
+    the same pages. Input outside the table (unknown
+    category, missing or non-integer value, value out of
+    range) returns None and must go to the model.
+    """
+    # variables
+    def __init__(self, table, axes:dict):
+        self.table = table
+        # categorical feature -> (category -> index)
+        self.categorical = [
+            (column, {category: index for index, category in enumerate(categories)})
+            for column, categories in axes["categorical"].items()
+        ]
+        # integer feature -> (lowest value, highest value)
+        self.numerical = [
+            (column, low, high)
+            for column, (low, high) in axes["numerical"].items()
+        ]
+        # hash of the model file this table was exported from
+        self.model_hash = axes.get("model_hash")
+
+    # methods
+    @classmethod
+    def load(cls, file_path:str):
+        """
+        Loads (memory-maps) a table exported by `export_prediction_table`.
+
+        Input Parameters ->
+        `file_path`: (str) path of the table `.npy` file
+        """
+        try:
+            table_path, axes_path = _get_table_paths(file_path)
+            with open(axes_path, "r") as file_object:
+                axes = json.load(file_object)
+            return cls(table=np.load(table_path, mmap_mode="r"), axes=axes)
+
+        except Exception as e:
+            raise CustomException(error_message=e, error_detail=sys)
+
+    def lookup(self, record:dict):
+        """
+        Returns the prediction (float) for a single raw
+        input record, or None if the record is outside the table.
+
+        Input Parameters ->
+        `record`: (dict) raw input values keyed by input feature name
+        """
+        index = []
+
+        for column, category_indices in self.categorical:
+            category_index = category_indices.get(record.get(column))
+            if category_index is None:
+                return None
+            index.append(category_index)
+
+        for column, low, high in self.numerical:
+            value = record.get(column)
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                return None
+            if not value.is_integer() or not low <= value <= high:
+                return None
+            index.append(int(value) - low)
+
+        return float(self.table[tuple(index)])
+
+
+# PREDICTION TABLE CACHE
+class PredictionTableCache:
+    """
+    Process-wide cache for the exported prediction table.
+
+    The table is used only if it was exported from
+    the model file currently on disk, so a table left
+    behind by an older training run is never served.
+    """
+    # variables
+    def __init__(self, table_path:str, model_path:str):
+        self.table_path = table_path
+        self.model_path = model_path
+        # (signature of table & model files, table or None)
+        self._entry = None
+
+    # methods
+    def _get_signature(self):
+        """
+        Returns the modification time & size of the
+        table and model files (None if the table does not exist).
+        """
+        try:
+            signature = ()
+            for file_path in (*_get_table_paths(self.table_path), self.model_path):
+                file_stats = os.stat(file_path)
+                signature += (file_stats.st_mtime_ns, file_stats.st_size)
+        except FileNotFoundError:
+            return None
+        return signature
+
+    def get_table(self):
+        """
+        Returns the current `PredictionTable`, or None if
+        there is no table matching the saved model.
+        """
+        signature = self._get_signature()
+        if signature is None:
+            return None
+
+        entry = self._entry
+        if entry is not None and entry[0] == signature:
+            return entry[1]
+
+        prediction_table = PredictionTable.load(file_path=self.table_path)
+        if prediction_table.model_hash != get_file_hash(self.model_path):
+            logging.info(msg="Prediction table does not match the saved model, ignoring it")
+            prediction_table = None
+        else:
+            logging.info(msg="Prediction table loaded")
+
+        self._entry = (signature, prediction_table)
+        return prediction_table
+
+
+# export step
+def export_prediction_table(model, data_preprocessor, file_path:str, model_file_path:str=None,
+                            numerical_ranges:dict=None, dtype:str="float64"):
+    """
+    Evaluates the model over every point of the
+    input space and saves the predictions as a
+    memory-mappable `.npy` file (plus a `.json`
+    file describing the axes).
+
+    Works for any model family: the predictions come
+    from `model.predict(data_preprocessor.transform(...))`.
+
+    Input Parameters ->
+    `model`: trained machine learning model
+    `data_preprocessor`: fitted `ColumnTransformer` object
+    `file_path`: (str) path where the table `.npy` file is to be saved
+    `model_file_path`: (str) path of the saved model, its hash is stored
+                       so that a stale table can be detected
+    `numerical_ranges`: (dict) integer feature -> (lowest, highest) value
+                        (default: `DEFAULT_NUMERICAL_RANGES`)
+    `dtype`: (str) dtype of the stored predictions (float64 stores the model's
+             predictions exactly, float32 halves the size but rounds them)
+    """
+    try:
+        import pandas as pd
+        # the compiled preprocessor exposes the fitted categories in a plain form
+        from src.pipeline.compiled_preprocessor import CompiledPreprocessor
+
+        numerical_ranges = numerical_ranges if numerical_ranges is not None else DEFAULT_NUMERICAL_RANGES
+        compiled_preprocessor = CompiledPreprocessor.from_column_transformer(data_preprocessor)
+
+        # table axes: categories seen during training & the integer ranges
+        categorical_axes = {}
+        numerical_axes = {}
+        for block in compiled_preprocessor.blocks:
+            if hasattr(block, "lookups"):
+                for column, lookup in zip(block.columns, block.lookups):
+                    categorical_axes[column] = [str(category) for category in lookup]
+            else:
+                for column in block.columns:
+                    if column not in numerical_ranges:
+                        raise ValueError(f"No range given for numerical feature `{column}`")
+                    numerical_axes[column] = [int(bound) for bound in numerical_ranges[column]]
+
+        categorical_shape = tuple(len(categories) for categories in categorical_axes.values())
+        numerical_values = [np.arange(low, high + 1) for low, high in numerical_axes.values()]
+        numerical_shape = tuple(len(values) for values in numerical_values)
+
+        # every combination of the integer features (same for each combination of categories)
+        numerical_grid = {
+            column: values.ravel()
+            for column, values in zip(numerical_axes, np.meshgrid(*numerical_values, indexing="ij"))
+        }
+
+        # write straight into a memory-mapped file, one block of predictions per combination of categories
+        table_path, axes_path = _get_table_paths(file_path)
+        os.makedirs(os.path.dirname(table_path) or ".", exist_ok=True)
+        temp_table_path = f"{table_path}.tmp.npy"
+        table = np.lib.format.open_memmap(temp_table_path, mode="w+", dtype=np.dtype(dtype),
+                                          shape=categorical_shape + numerical_shape)
+
+        for categorical_index in itertools.product(*(range(size) for size in categorical_shape)):
+            features = pd.DataFrame(data={
+                **{
+                    column: np.repeat(categories[i], len(next(iter(numerical_grid.values()))))
+                    for (column, categories), i in zip(categorical_axes.items(), categorical_index)
+                },
+                **numerical_grid
+            })
+            predictions = model.predict(data_preprocessor.transform(features))
+            table[categorical_index] = np.asarray(predictions).reshape(numerical_shape)
+
+        table.flush()
+        del table
+
+        axes = {
+            "categorical": categorical_axes,
+            "numerical": numerical_axes,
+            "dtype": dtype,
+            "model_hash": None if model_file_path is None else get_file_hash(model_file_path)
+        }
+
+        # replace the table before its axes: the model hash in the axes file is checked on load
+        temp_axes_path = f"{axes_path}.tmp"
+        with open(temp_axes_path, "w") as file_object:
+            json.dump(axes, file_object, indent=2)
+        os.replace(temp_table_path, table_path)
+        os.replace(temp_axes_path, axes_path)
+
+        logging.info(msg=f"Prediction table of {int(np.prod(categorical_shape + numerical_shape))} points exported to {table_path}")
+
+        return PredictionTable.load(file_path=table_path)
+
+    except Exception as e:
+        raise CustomException(error_message=e, error_detail=sys)
+
+
+if __name__ == "__main__":
+    # export the prediction table from the saved artifacts and compare it against the model
+    import time
+    import pandas as pd
+    from src.utils import load_object
+
+    model_file_path = os.path.join("artifact", "model.pkl")
+    model = load_object(file_path=model_file_path)
+    data_preprocessor = load_object(file_path=os.path.join("artifact", "preprocessor.pkl"))
+
+    start_time = time.perf_counter()
+    prediction_table = export_prediction_table(model=model, data_preprocessor=data_preprocessor,
+                                               file_path=os.path.join("artifact", "prediction_table.npy"),
+                                               model_file_path=model_file_path)
+    print(f"Exported {prediction_table.table.size} predictions "
+          f"({prediction_table.table.nbytes / 2**20:.1f} MB) in {time.perf_counter() - start_time:.1f}s")
+
+    test_df = pd.read_csv(os.path.join("artifact", "test.csv"))
+    expected_predictions = model.predict(data_preprocessor.transform(test_df))
+    table_predictions = np.array([
+        prediction_table.lookup(record=record)
+        for record in test_df.to_dict(orient="records")
+    ])
+    print(f"Max absolute difference to the model on {len(test_df)} rows: "
+          f"{np.max(np.abs(table_predictions - expected_predictions)):.3e}")
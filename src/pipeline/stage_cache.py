@@ -0,0 +1,246 @@
+# DEPENDENCIES
+
+# for working with file paths, custom exception and custom logging
+import os
+import sys
+from src.exception import CustomException
+from src.logger import logging
+# for hashing stage inputs
+import hashlib
+# for copying & removing cached files
+import shutil
+# for saving stage metadata
+import json
+# for defining class variables
+from dataclasses import dataclass
+# for saving arrays & sparse matrices
+import numpy as np
+import scipy.sparse as sp
+
+
+# STAGE CACHE CONFIG
+@dataclass
+class StageCacheConfig:
+    """
+    Contains the directory where the outputs
+    of the training pipeline stages are cached.
+    """
+    # directory holding one sub-directory per (stage, input hash)
+    cache_dir: str = os.path.join("artifact", "cache") # "\artifact\cache"
+
+
+# STAGE CACHE
+class StageCache:
+    """
+    Content-addressed cache for the outputs of the
+    training pipeline stages (data ingestion, data
+    transformation, model trainer).
+
+    Each stage hashes its inputs into a key and its
+    outputs are stored under `<cache_dir>/<stage>/<key>/`.
+    A rerun with the same inputs restores the outputs
+    instead of running the stage again.
+    """
+    # variables
+    def __init__(self, config:StageCacheConfig=None, force:bool=False):
+        self.cache_config = config if config is not None else StageCacheConfig()
+        # if True, cached outputs are ignored (and overwritten)
+        self.force = force
+        # (stage, key, "hit"/"miss") of every looked up stage, for the summary
+        self.summary = []
+
+    # methods
+    @staticmethod
+    def get_key(*parts):
+        """
+        Returns the hash (hex string) of the input parts.
+
+        A part is fed to the hash as it is produced, so
+        an iterable of blocks (e.g. `iter_file_blocks`)
+        is hashed without holding its contents in memory.
+
+        Input Parameters ->
+        `parts`: (str, bytes or iterable of bytes-like blocks) stage inputs,
+                 e.g. file contents or config reprs
+        """
+        key_hash = hashlib.sha256()
+        for part in parts:
+            if isinstance(part, str):
+                part = part.encode("utf-8")
+            if isinstance(part, (bytes, bytearray, memoryview)):
+                part = (part,)
+            # length prefix on every block & end marker on every part,
+            # so that ("ab", "c") and ("a", "bc") get different keys
+            for block in part:
+                block = memoryview(block).cast("B")
+                key_hash.update(len(block).to_bytes(8, "little"))
+                key_hash.update(block)
+            key_hash.update(b"\xff" * 8)
+        return key_hash.hexdigest()
+
+    @staticmethod
+    def iter_file_blocks(file_path:str, block_size:int=1 << 20):
+        """
+        Yields the contents of a file in blocks of
+        `block_size` bytes (for hashing). For a directory
+        (e.g. a dataset saved in the "npy" format) the
+        relative path, size and contents of each of its
+        files are yielded, in sorted order.
+
+        Input Parameters ->
+        `file_path`: (str) path of the input file or directory
+        `block_size`: (int) bytes read at a time
+        """
+        if os.path.isdir(file_path):
+            paths = []
+            for root, dir_names, file_names in os.walk(file_path):
+                dir_names.sort()
+                paths.extend(os.path.join(root, file_name) for file_name in sorted(file_names))
+        else:
+            paths = [file_path]
+
+        for path in paths:
+            if path != file_path:
+                yield os.path.relpath(path, file_path).encode("utf-8")
+                yield os.path.getsize(path).to_bytes(8, "little")
+            with open(path, "rb") as file_object:
+                for block in iter(lambda: file_object.read(block_size), b""):
+                    yield block
+
+    @staticmethod
+    def _copy(source_path:str, destination_path:str):
+        """
+        Copies a file or directory, replacing
+        whatever is at the destination path.
+        """
+        if os.path.isdir(destination_path):
+            shutil.rmtree(destination_path)
+        elif os.path.exists(destination_path):
+            os.remove(destination_path)
+
+        if os.path.isdir(source_path):
+            shutil.copytree(source_path, destination_path)
+        else:
+            shutil.copyfile(source_path, destination_path)
+
+    def _get_entry_dir(self, stage:str, key:str):
+        """
+        Returns the directory of a cache entry.
+        """
+        return os.path.join(self.cache_config.cache_dir, stage, key)
+
+    def restore(self, stage:str, key:str, files:dict=None):
+        """
+        Restores the cached outputs of a stage.
+
+        Returns a dict with the cached "arrays" and "metadata"
+        if the stage's outputs are cached (cache hit),
+        otherwise None (cache miss, the stage must run).
+
+        Input Parameters ->
+        `stage`: (str) name of the stage
+        `key`: (str) hash of the stage inputs
+        `files`: (dict) output file name -> path where it is to be restored
+                 (a path can also be a directory; files not present in the cache entry are removed from
+                 their path so that the outputs match the cached run)
+        """
+        try:
+            entry_dir = self._get_entry_dir(stage, key)
+            manifest_path = os.path.join(entry_dir, "manifest.json")
+
+            if self.force or not os.path.exists(manifest_path):
+                self.summary.append((stage, key, "miss"))
+                logging.info(msg=f"Stage cache miss for `{stage}` ({key[:12]})")
+                return None
+
+            with open(manifest_path, "r") as file_object:
+                manifest = json.load(file_object)
+
+            # copy the cached output files back to where the stage would write them
+            for file_name, file_path in (files or {}).items():
+                if file_name in manifest["files"]:
+                    os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+                    self._copy(os.path.join(entry_dir, "files", file_name), file_path)
+                elif os.path.isdir(file_path):
+                    shutil.rmtree(file_path)
+                elif os.path.exists(file_path):
+                    os.remove(file_path)
+
+            arrays = {
+                array_name: np.load(os.path.join(entry_dir, f"{array_name}.npy"), allow_pickle=False)
+                for array_name in manifest["arrays"]
+            }
+            arrays.update({
+                array_name: sp.load_npz(os.path.join(entry_dir, f"{array_name}.npz")).tocsr()
+                for array_name in manifest.get("sparse_arrays", [])
+            })
+
+            self.summary.append((stage, key, "hit"))
+            logging.info(msg=f"Stage cache hit for `{stage}` ({key[:12]}), outputs restored")
+
+            return {"arrays": arrays, "metadata": manifest["metadata"]}
+
+        except Exception as e:
+            raise CustomException(error_message=e, error_detail=sys)
+
+    def store(self, stage:str, key:str, files:dict=None, arrays:dict=None, metadata:dict=None):
+        """
+        Stores the outputs of a stage under its key.
+
+        Input Parameters ->
+        `stage`: (str) name of the stage
+        `key`: (str) hash of the stage inputs
+        `files`: (dict) output file name -> path of the output file or directory
+                 (files which do not exist are skipped)
+        `arrays`: (dict) array name -> output array (or sparse matrix)
+        `metadata`: (dict) small JSON-serializable outputs
+        """
+        try:
+            entry_dir = self._get_entry_dir(stage, key)
+
+            # write everything into a temporary directory first
+            temp_dir = f"{entry_dir}.tmp"
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            os.makedirs(os.path.join(temp_dir, "files"))
+
+            stored_files = []
+            for file_name, file_path in (files or {}).items():
+                if os.path.exists(file_path):
+                    self._copy(file_path, os.path.join(temp_dir, "files", file_name))
+                    stored_files.append(file_name)
+
+            dense_arrays, sparse_arrays = [], []
+            for array_name, array in (arrays or {}).items():
+                if sp.issparse(array):
+                    sp.save_npz(os.path.join(temp_dir, f"{array_name}.npz"), array, compressed=False)
+                    sparse_arrays.append(array_name)
+                else:
+                    np.save(os.path.join(temp_dir, f"{array_name}.npy"), array, allow_pickle=False)
+                    dense_arrays.append(array_name)
+
+            with open(os.path.join(temp_dir, "manifest.json"), "w") as file_object:
+                json.dump({
+                    "files": stored_files,
+                    "arrays": dense_arrays,
+                    "sparse_arrays": sparse_arrays,
+                    "metadata": metadata or {}
+                }, file_object, indent=2)
+
+            # then move it into place in one step so that an entry is never half written
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            os.replace(temp_dir, entry_dir)
+
+            logging.info(msg=f"Outputs of stage `{stage}` cached ({key[:12]})")
+
+        except Exception as e:
+            raise CustomException(error_message=e, error_detail=sys)
+
+    def get_summary(self):
+        """
+        Returns a printable summary of
+        which stages were cache hits.
+        """
+        return "\n".join(
+            f"{stage:<22} {status:<5} {key[:12]}"
+            for stage, key, status in self.summary
+        )
@@ -0,0 +1,409 @@
+# DEPENDENCIES
+
+# for working with file paths, custom exception and custom logging
+import os
+import sys
+from src.exception import CustomException
+from src.logger import logging
+# for parsing command line arguments
+import argparse
+# for counting the categories
+from collections import Counter
+# for saving the artifacts of an unpublished run outside of `artifact`
+import tempfile
+# for defining class variables
+from dataclasses import dataclass, field
+# for working with dataframes and arrays
+import numpy as np
+import pandas as pd
+# for incremental scaling & training
+from sklearn.preprocessing import StandardScaler
+from sklearn.impute import SimpleImputer
+from sklearn.linear_model import SGDRegressor
+
+# the preprocessor specification & feature layout of the in-memory pipeline
+from src.components.data_transformation import DataTransformation
+# for the paths of the files exported next to the model
+from src.components.model_trainer import ModelTrainerConfig
+# for folding the trained linear model into a precomputed scorer
+from src.pipeline.linear_scorer import export_linear_scorer
+# for publishing the trained artifacts as a new version
+from src.pipeline.artifact_registry import ArtifactRegistry
+# utility functions
+from src.utils import save_object, iter_dataframe_chunks, format_features
+
+
+# STREAMING TRAIN CONFIG
+@dataclass
+class StreamingTrainConfig:
+    """
+    Contains the inputs of the out-of-core
+    training mode: the source dataset is read
+    in chunks, so memory stays bounded by
+    `chunk_size` and `reservoir_size` rows
+    however large the dataset is.
+    """
+    # path of the source dataset (csv, or a binary format saved by `save_dataframe`)
+    source_data_path:str = os.path.join("notebook", "data", "stud.csv")
+
+    # rows read (and transformed) at a time
+    chunk_size:int = 100_000
+
+    # fraction of rows held out for the test set & seed of the split
+    test_size:float = 0.2
+    random_state:int = 42
+
+    # rows sampled uniformly from the training rows (reservoir sampling) for the numerical
+    # medians & fitting the preprocessor (medians are exact if the training set is smaller)
+    reservoir_size:int = 100_000
+
+    # passes of `SGDRegressor.partial_fit` over the training rows
+    n_epochs:int = 5
+
+    # parameters of the `SGDRegressor`
+    sgd_parameters:dict = field(default_factory=lambda: {"alpha": 1e-4, "eta0": 0.01})
+
+    # minimum R^2 score on the test set for the model to be saved
+    min_r2_score:float = 0.6
+
+    # artifact paths (same as the in-memory pipeline, so the web app serves either)
+    preprocessor_object_file_path:str = os.path.join("artifact", "preprocessor.pkl")
+    trained_model_file_path:str = os.path.join("artifact", "model.pkl")
+
+    # directory for the artifacts of a run which is not published, so that the served
+    # artifacts are left untouched (a new temporary directory if None)
+    scratch_dir_path:str = None
+
+
+# STREAMING TRAIN PIPELINE
+class StreamingTrainPipeline:
+    """
+    Out-of-core training mode for datasets larger
+    than memory, in three passes over the source:
+
+    1. count the categories of every categorical feature
+       & keep a uniform sample of the training rows
+    2. fit the scalers incrementally (`partial_fit`) on
+       the imputed (and one hot encoded) chunks
+    3. train an `SGDRegressor` with `partial_fit`, then
+       score the test rows (R^2 accumulated over chunks)
+
+    The data preprocessor has the same structure as the
+    one of `DataTransformation` (with the categories given
+    explicitly), so the saved artifacts are served, folded
+    into a linear scorer and published the same way.
+    """
+    # variables
+    def __init__(self, config:StreamingTrainConfig=None, publish:bool=True):
+        self.streaming_config = config if config is not None else StreamingTrainConfig()
+        self.data_transformation = DataTransformation()
+        # `publish=False` leaves the served artifact version unchanged
+        self.publish = publish
+        self.artifact_registry = ArtifactRegistry()
+        # directory of the saved artifacts (the scratch directory if not published)
+        self.artifacts_dir_path = None
+
+    # methods
+    def _iter_chunks(self):
+        """
+        Yields (input features dataframe, target array,
+        test row mask) for every chunk of the source.
+
+        The split is drawn per chunk from a generator seeded
+        with (`random_state`, chunk index), so every pass
+        sees the same training & test rows.
+        """
+        streaming_config = self.streaming_config
+        for chunk_index, chunk_df in enumerate(iter_dataframe_chunks(file_path=streaming_config.source_data_path,
+                                                                     chunk_size=streaming_config.chunk_size)):
+            # same target as `DataTransformation`: average of the three scores
+            target = ((chunk_df["math_score"] + chunk_df["writing_score"] + chunk_df["reading_score"]) / 3).to_numpy(dtype=np.float64)
+            input_df = chunk_df.drop(columns=["writing_score"])
+
+            random_generator = np.random.default_rng([streaming_config.random_state, chunk_index])
+            is_test = random_generator.random(len(chunk_df)) < streaming_config.test_size
+
+            yield input_df, target, is_test
+
+    def collect_statistics(self, categorical_features:list):
+        """
+        Pass 1: returns the category counts of every
+        categorical feature and a uniform sample
+        (reservoir) of the training rows as a dataframe.
+
+        Input Parameters ->
+        `categorical_features`: (list) names of the categorical features
+        """
+        reservoir_size = self.streaming_config.reservoir_size
+        random_generator = np.random.default_rng(self.streaming_config.random_state)
+
+        category_counts = {column: Counter() for column in categorical_features}
+        reservoir = None
+        n_seen = 0
+
+        for input_df, _, is_test in self._iter_chunks():
+            train_df = input_df[~is_test]
+            for column in categorical_features:
+                category_counts[column].update(train_df[column].dropna().astype(str))
+
+            columns = {column: train_df[column].to_numpy() for column in train_df.columns}
+            if reservoir is None:
+                reservoir = {column: values[:0] for column, values in columns.items()}
+                reservoir_length = 0
+
+            # fill the reservoir, then replace random slots (row i is kept with probability k / (i + 1))
+            n_fill = min(reservoir_size - reservoir_length, len(train_df))
+            if n_fill > 0:
+                reservoir = {column: np.concatenate([reservoir[column], values[:n_fill]])
+                             for column, values in columns.items()}
+                reservoir_length += n_fill
+            row_numbers = np.arange(n_seen + n_fill, n_seen + len(train_df))
+            slots = (random_generator.random(len(row_numbers)) * (row_numbers + 1)).astype(np.int64)
+            is_kept = slots < reservoir_size
+            for column, values in columns.items():
+                reservoir[column][slots[is_kept]] = values[n_fill:][is_kept]
+
+            n_seen += len(train_df)
+
+        if not n_seen:
+            raise ValueError("No training rows in the source dataset")
+
+        logging.info(msg=f"Streaming pass 1: {n_seen} training rows, {reservoir_length} rows sampled")
+
+        return category_counts, pd.DataFrame(data=reservoir)
+
+    def build_preprocessor(self, category_counts:dict, sample_df:pd.DataFrame):
+        """
+        Returns the data preprocessor fitted on the sample,
+        with the categories and most frequent categories
+        of the full training set.
+
+        Input Parameters ->
+        `category_counts`: (dict) categorical feature -> `Counter` of its categories
+        `sample_df`: (pd.DataFrame) uniform sample of the training rows
+        """
+        data_preprocessor = self.data_transformation.get_data_transformer_object()
+        categorical_features = list(category_counts)
+        data_preprocessor.set_params(categorical_transformer__one_hot_encoder__categories=[
+            sorted(category_counts[column]) for column in categorical_features
+        ])
+        data_preprocessor.fit(sample_df)
+
+        # most frequent categories of the full training set instead of the sample
+        most_frequent_df = pd.DataFrame(data={
+            column: [category_counts[column].most_common(1)[0][0]]
+            for column in categorical_features
+        })
+        categorical_pipeline = data_preprocessor.named_transformers_["categorical_transformer"]
+        categorical_pipeline.steps[0] = ("imputer", SimpleImputer(strategy="most_frequent").fit(most_frequent_df))
+
+        return data_preprocessor
+
+    def fit_scalers(self, data_preprocessor):
+        """
+        Pass 2: replaces the scalers of the preprocessor
+        (fitted on the sample) with scalers fitted
+        incrementally on all training rows.
+
+        Input Parameters ->
+        `data_preprocessor`: fitted `ColumnTransformer` object
+        """
+        scalers = {}
+        for name, pipeline, columns in data_preprocessor.transformers_:
+            if name in ("numerical_transformer", "categorical_transformer"):
+                scalers[name] = (pipeline, columns, StandardScaler(**pipeline.steps[-1][1].get_params()))
+
+        n_rows = 0
+        for input_df, _, is_test in self._iter_chunks():
+            train_df = input_df[~is_test]
+            if train_df.empty:
+                continue
+            for pipeline, columns, scaler in scalers.values():
+                # all steps before the scaler (imputer, one hot encoder)
+                scaler.partial_fit(pipeline[:-1].transform(train_df[columns]))
+            n_rows += len(train_df)
+
+        for pipeline, _, scaler in scalers.values():
+            pipeline.steps[-1] = (pipeline.steps[-1][0], scaler)
+
+        logging.info(msg=f"Streaming pass 2: scalers fitted on {n_rows} training rows")
+
+        return data_preprocessor
+
+    def train_model(self, data_preprocessor):
+        """
+        Pass 3: trains an `SGDRegressor` on the
+        transformed chunks for `n_epochs` passes,
+        then returns it with its R^2 score on the test rows.
+
+        Input Parameters ->
+        `data_preprocessor`: fitted `ColumnTransformer` object
+        """
+        streaming_config = self.streaming_config
+        # layout of the in-memory pipeline, float64 as the linear models of `model_search`
+        feature_format = self.data_transformation.data_transformation_config.feature_format
+        model = SGDRegressor(random_state=streaming_config.random_state, **streaming_config.sgd_parameters)
+        random_generator = np.random.default_rng(streaming_config.random_state)
+
+        for epoch in range(streaming_config.n_epochs):
+            for input_df, target, is_test in self._iter_chunks():
+                is_train = ~is_test
+                if not is_train.any():
+                    continue
+                X = format_features(data_preprocessor.transform(input_df[is_train]),
+                                    feature_format=feature_format, feature_dtype="float64")
+                y = target[is_train]
+                # visit the rows of the chunk in a new random order every epoch
+                order = random_generator.permutation(len(y))
+                model.partial_fit(X[order], y[order])
+            logging.info(msg=f"Streaming pass 3: epoch {epoch + 1}/{streaming_config.n_epochs} completed")
+
+        # R^2 = 1 - (sum of squared errors) / (sum of squared deviations from the mean)
+        n_rows = 0
+        target_sum = 0.0
+        target_square_sum = 0.0
+        squared_error_sum = 0.0
+        for input_df, target, is_test in self._iter_chunks():
+            if not is_test.any():
+                continue
+            X = format_features(data_preprocessor.transform(input_df[is_test]),
+                                feature_format=feature_format, feature_dtype="float64")
+            y = target[is_test]
+            squared_error_sum += float(np.sum((y - model.predict(X)) ** 2))
+            target_sum += float(np.sum(y))
+            target_square_sum += float(np.sum(y ** 2))
+            n_rows += len(y)
+
+        if not n_rows:
+            raise ValueError("No test rows in the source dataset")
+        r2_score = 1 - squared_error_sum / (target_square_sum - target_sum ** 2 / n_rows)
+
+        logging.info(msg=f"Streaming model R^2 on {n_rows} test rows: {r2_score:.4f}")
+
+        return model, r2_score
+
+    def save_artifacts(self, model, data_preprocessor, r2_score:float):
+        """
+        Saves the preprocessor & model and exports the
+        linear scorer. If publishing, they replace the
+        served artifacts (removing exports of a previous
+        model) and are published as a new artifact version,
+        otherwise they are saved in the scratch directory.
+
+        Returns the directory of the saved artifacts.
+        """
+        streaming_config = self.streaming_config
+        trainer_config = ModelTrainerConfig()
+
+        if self.publish:
+            files = {
+                "model.pkl": streaming_config.trained_model_file_path,
+                "preprocessor.pkl": streaming_config.preprocessor_object_file_path,
+                "linear_scorer.json": trainer_config.linear_scorer_file_path
+            }
+        else:
+            scratch_dir_path = streaming_config.scratch_dir_path or tempfile.mkdtemp(prefix="streaming_train_")
+            files = {file_name: os.path.join(scratch_dir_path, file_name)
+                     for file_name in ("model.pkl", "preprocessor.pkl", "linear_scorer.json")}
+
+        save_object(file_path=files["preprocessor.pkl"], obj=data_preprocessor)
+        save_object(file_path=files["model.pkl"], obj=model)
+
+        export_linear_scorer(model=model, data_preprocessor=data_preprocessor,
+                             file_path=files["linear_scorer.json"], model_file_path=files["model.pkl"])
+
+        if not self.publish:
+            logging.info(msg=f"Streaming artifacts saved in {os.path.dirname(files['model.pkl'])} (not published)")
+            return os.path.dirname(files["model.pkl"])
+
+        # tree ensemble & prediction table of a previous model would no longer match
+        prediction_table_metadata_path = f"{os.path.splitext(trainer_config.prediction_table_file_path)[0]}.json"
+        for file_path in (trainer_config.tree_ensemble_file_path, trainer_config.prediction_table_file_path,
+                          prediction_table_metadata_path):
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+        self.artifact_registry.publish(files=files, metadata={"model_name": "SGD Regressor (streaming)",
+                                                              "r2_score": r2_score})
+
+        return os.path.dirname(files["model.pkl"])
+
+    def run(self):
+        """
+        Runs the three passes and saves the artifacts.
+
+        Returns the name of the model and its R^2 score.
+        """
+        try:
+            logging.info(msg=f"Streaming training initiated on {self.streaming_config.source_data_path}")
+
+            # categorical features of the preprocessor specification
+            categorical_features = next(
+                columns
+                for name, _, columns in self.data_transformation.get_data_transformer_object().transformers
+                if name == "categorical_transformer"
+            )
+
+            category_counts, sample_df = self.collect_statistics(categorical_features=categorical_features)
+            data_preprocessor = self.build_preprocessor(category_counts=category_counts, sample_df=sample_df)
+            data_preprocessor = self.fit_scalers(data_preprocessor=data_preprocessor)
+            model, r2_score = self.train_model(data_preprocessor=data_preprocessor)
+
+            if r2_score < self.streaming_config.min_r2_score:
+                raise ValueError(f"Streaming model R^2 {r2_score:.4f} is below {self.streaming_config.min_r2_score}")
+
+            self.artifacts_dir_path = self.save_artifacts(model=model, data_preprocessor=data_preprocessor,
+                                                          r2_score=r2_score)
+
+            logging.info(msg="Streaming training completed successfully")
+
+            return "SGD Regressor (streaming)", r2_score
+
+        except Exception as e:
+            raise CustomException(error_message=e, error_detail=sys)
+
+
+# command line entry point
+def main(argv:list=None):
+    """
+    `python -m src.pipeline.streaming_train_pipeline --source big.csv --chunk-size 100000 --epochs 5`
+
+    Input Parameters ->
+    `argv`: (list) command line arguments (default: `sys.argv[1:]`)
+    """
+    parser = argparse.ArgumentParser(description="Train on a dataset larger than memory, one chunk at a time")
+    parser.add_argument("--source", default=None, help="source dataset (csv, parquet, feather or npy)")
+    parser.add_argument("--chunk-size", type=int, default=None, help="rows read at a time")
+    parser.add_argument("--reservoir-size", type=int, default=None,
+                        help="training rows sampled for the medians & fitting the preprocessor")
+    parser.add_argument("--epochs", type=int, default=None, help="passes of SGD over the training rows")
+    parser.add_argument("--no-publish", action="store_true",
+                        help="do not publish the trained artifacts as the current version")
+    parser.add_argument("--scratch-dir", default=None,
+                        help="directory for the artifacts of a --no-publish run (default: a new temporary directory)")
+    args = parser.parse_args(argv)
+
+    streaming_config = StreamingTrainConfig()
+    if args.source is not None:
+        streaming_config.source_data_path = args.source
+    if args.chunk_size is not None:
+        streaming_config.chunk_size = args.chunk_size
+    if args.reservoir_size is not None:
+        streaming_config.reservoir_size = args.reservoir_size
+    if args.epochs is not None:
+        streaming_config.n_epochs = args.epochs
+    if args.scratch_dir is not None:
+        streaming_config.scratch_dir_path = args.scratch_dir
+
+    streaming_train_pipeline = StreamingTrainPipeline(config=streaming_config, publish=not args.no_publish)
+    model_name, model_r2_score = streaming_train_pipeline.run()
+
+    if streaming_train_pipeline.publish:
+        print(f"Serving artifact version: {streaming_train_pipeline.artifact_registry.get_current_version()}")
+    else:
+        print(f"Artifacts saved (not published) in: {streaming_train_pipeline.artifacts_dir_path}")
+    print(f"R^2 Score of trained {model_name} model: {model_r2_score:.3f}")
+
+
+if __name__ == "__main__":
+    main()
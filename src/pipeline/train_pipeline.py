@@ -0,0 +1,306 @@
+# DEPENDENCIES
+
+# for working with custom exception and custom logging
+import os
+import sys
+from src.exception import CustomException
+from src.logger import logging
+# for parsing command line arguments
+import argparse
+# for working with arrays
+import numpy as np
+import scipy.sparse as sp
+# for including library versions in the cache keys
+import sklearn
+import pandas as pd
+
+# training pipeline stages
+from src.components.data_ingestion import DataIngestion
+from src.components.data_transformation import DataTransformation
+from src.components.model_trainer import ModelTrainer
+# for skipping stages whose inputs did not change
+from src.pipeline.stage_cache import StageCache
+# for publishing the trained artifacts as a new version
+from src.pipeline.artifact_registry import ArtifactRegistry
+# for the paths of the dataset artifacts in the configured format
+from src.utils import get_dataset_path, load_arrays, DATASET_FORMATS
+
+
+# helper function to feed an array to the stage cache hash
+def _iter_array_blocks(array):
+    """
+    Yields the shape, dtype and contents of an
+    array (or CSR matrix) as bytes-like blocks
+    (for hashing). The contents of a contiguous
+    (e.g. memory-mapped) array are not copied.
+    """
+    if sp.issparse(array):
+        array = sp.csr_matrix(array)
+        yield b"csr"
+        for part in (np.asarray(array.shape), array.indptr, array.indices, array.data):
+            yield from _iter_array_blocks(part)
+        return
+    array = np.ascontiguousarray(array)
+    yield f"{array.shape}{array.dtype}".encode("utf-8")
+    yield memoryview(array.reshape(-1)).cast("B")
+
+
+# TRAINING PIPELINE
+class TrainPipeline:
+    """
+    Runs the data ingestion, data transformation
+    and model trainer stages one after another.
+
+    Every stage hashes its inputs and its outputs
+    are cached under that hash, so a rerun only
+    runs the stages whose inputs have changed.
+
+    The trained artifacts are then published as a new
+    version in the artifact registry, which running
+    web apps switch to without a restart.
+    """
+    # variables
+    def __init__(self, force:bool=False, publish:bool=True):
+        self.data_ingestion = DataIngestion()
+        self.data_transformation = DataTransformation()
+        self.model_trainer = ModelTrainer()
+        # `force=True` ignores (and overwrites) all cached stage outputs
+        self.stage_cache = StageCache(force=force)
+        # `publish=False` leaves the served artifact version unchanged
+        self.publish = publish
+        self.artifact_registry = ArtifactRegistry()
+
+    # methods
+    def run_data_ingestion(self):
+        """
+        Runs (or restores) the data ingestion stage.
+
+        Returns the file paths of the training set & test set.
+        """
+        ingestion_config = self.data_ingestion.ingestion_config
+
+        # the incremental mode keeps its own state (hashing the whole source would defeat it)
+        if ingestion_config.incremental:
+            return self.data_ingestion.initiate_incremental_data_ingestion()
+
+        # inputs: source file contents, split settings & artifact format
+        key = self.stage_cache.get_key(
+            "data_ingestion",
+            self.stage_cache.iter_file_blocks(ingestion_config.source_data_path),
+            repr(ingestion_config.test_size),
+            repr(ingestion_config.random_state),
+            repr((ingestion_config.artifact_format, ingestion_config.export_csv)),
+            pd.__version__
+        )
+        output_files = self.data_ingestion.get_output_paths()
+
+        if self.stage_cache.restore("data_ingestion", key, files=output_files) is None:
+            self.data_ingestion.initiate_data_ingestion()
+            self.stage_cache.store("data_ingestion", key, files=output_files)
+
+        return (
+            get_dataset_path(file_path=ingestion_config.train_data_path, file_format=ingestion_config.artifact_format),
+            get_dataset_path(file_path=ingestion_config.test_data_path, file_format=ingestion_config.artifact_format)
+        )
+
+    def run_data_transformation(self, train_data_path:str, test_data_path:str):
+        """
+        Runs (or restores) the data transformation stage.
+
+        Returns the transformed training set & test set
+        input features and targets (X_train, y_train, X_test, y_test).
+        """
+        transformation_config = self.data_transformation.data_transformation_config
+        preprocessor_path = transformation_config.preprocessor_object_file_path
+
+        # inputs: training & test set contents and the preprocessor specification
+        key = self.stage_cache.get_key(
+            "data_transformation",
+            self.stage_cache.iter_file_blocks(train_data_path),
+            self.stage_cache.iter_file_blocks(test_data_path),
+            repr(self.data_transformation.get_data_transformer_object().get_params(deep=True)),
+            repr((transformation_config.feature_format, transformation_config.feature_dtype,
+                  transformation_config.memory_map_arrays)),
+            sklearn.__version__
+        )
+        output_files = {"preprocessor.pkl": preprocessor_path}
+        # memory-mapped arrays are cached as files (restored under `artifact/` and mapped from there)
+        memory_map_arrays = transformation_config.memory_map_arrays
+        if memory_map_arrays:
+            output_files["transformed"] = transformation_config.transformed_data_dir_path
+
+        cached_outputs = self.stage_cache.restore("data_transformation", key, files=output_files)
+        if cached_outputs is not None:
+            if memory_map_arrays:
+                arrays = load_arrays(dir_path=transformation_config.transformed_data_dir_path)
+            else:
+                arrays = cached_outputs["arrays"]
+            return arrays["X_train"], arrays["y_train"], arrays["X_test"], arrays["y_test"]
+
+        X_train, y_train, X_test, y_test, _ = self.data_transformation.initiate_data_transformation(
+            train_path=train_data_path,
+            test_path=test_data_path
+        )
+        self.stage_cache.store("data_transformation", key, files=output_files,
+                               arrays=None if memory_map_arrays else {"X_train": X_train, "y_train": y_train,
+                                                                      "X_test": X_test, "y_test": y_test})
+
+        return X_train, y_train, X_test, y_test
+
+    def run_model_trainer(self, X_train, y_train, X_test, y_test):
+        """
+        Runs (or restores) the model trainer stage.
+
+        Returns the name of the best model and its R^2 score.
+        """
+        trainer_config = self.model_trainer.model_trainer_config
+
+        # inputs: transformed arrays, models, parameter grids & search settings
+        models_specification = {
+            model_name: model.get_params()
+            for model_name, model in self.model_trainer.get_models().items()
+        }
+        key = self.stage_cache.get_key(
+            "model_trainer",
+            _iter_array_blocks(X_train),
+            _iter_array_blocks(y_train),
+            _iter_array_blocks(X_test),
+            _iter_array_blocks(y_test),
+            repr(models_specification),
+            repr(self.model_trainer.get_parameters()),
+            repr((trainer_config.search, trainer_config.search_options)),
+            repr(trainer_config.export_prediction_table),
+            self.stage_cache.iter_file_blocks(trainer_config.preprocessor_object_file_path),
+            sklearn.__version__
+        )
+        output_files = {
+            "model.pkl": trainer_config.trained_model_file_path,
+            "linear_scorer.json": trainer_config.linear_scorer_file_path,
+            "tree_ensemble.npz": trainer_config.tree_ensemble_file_path,
+            "prediction_table.npy": trainer_config.prediction_table_file_path,
+            "prediction_table.json": f"{os.path.splitext(trainer_config.prediction_table_file_path)[0]}.json"
+        }
+
+        cached_outputs = self.stage_cache.restore("model_trainer", key, files=output_files)
+        if cached_outputs is not None:
+            return cached_outputs["metadata"]["model_name"], cached_outputs["metadata"]["r2_score"]
+
+        model_name, model_r2_score = self.model_trainer.initiate_model_trainer(X_train=X_train, y_train=y_train,
+                                                                               X_test=X_test, y_test=y_test)
+        self.stage_cache.store("model_trainer", key, files=output_files,
+                               metadata={"model_name": model_name, "r2_score": model_r2_score})
+
+        return model_name, model_r2_score
+
+    def publish_artifacts(self, model_name:str, model_r2_score:float):
+        """
+        Copies the model, preprocessor, linear scorer, tree
+        ensemble and prediction table into a new artifact version and
+        makes it the current one (all files switch at once).
+
+        Returns the name of the version.
+        """
+        trainer_config = self.model_trainer.model_trainer_config
+        files = {
+            "model.pkl": trainer_config.trained_model_file_path,
+            "preprocessor.pkl": self.data_transformation.data_transformation_config.preprocessor_object_file_path,
+            "linear_scorer.json": trainer_config.linear_scorer_file_path,
+            "tree_ensemble.npz": trainer_config.tree_ensemble_file_path,
+            "prediction_table.npy": trainer_config.prediction_table_file_path,
+            "prediction_table.json": f"{os.path.splitext(trainer_config.prediction_table_file_path)[0]}.json"
+        }
+
+        return self.artifact_registry.publish(files=files, metadata={
+            "model_name": model_name,
+            "r2_score": model_r2_score
+        })
+
+    def run(self):
+        """
+        Runs the full training pipeline.
+
+        Returns the name of the best model and its R^2 score.
+        """
+        try:
+            # once this gets executed the `artifact` folder will have
+            # `raw`, `train`, and `test` datasets inside it (`.csv` by default)
+            train_data_path, test_data_path = self.run_data_ingestion()
+
+            # transformed training set & test set features and targets
+            # (the data preprocessor object gets saved as `preprocessor.pkl`)
+            X_train, y_train, X_test, y_test = self.run_data_transformation(train_data_path=train_data_path,
+                                                                             test_data_path=test_data_path)
+
+            # training and evaluation (the best model gets saved as `model.pkl`)
+            model_name, model_r2_score = self.run_model_trainer(X_train=X_train, y_train=y_train,
+                                                                X_test=X_test, y_test=y_test)
+
+            # switch the web app over to the new model & preprocessor pair
+            if self.publish:
+                self.publish_artifacts(model_name=model_name, model_r2_score=model_r2_score)
+
+            logging.info(msg=f"Training pipeline completed, stage cache summary:\n{self.stage_cache.get_summary()}")
+
+            return model_name, model_r2_score
+
+        except Exception as e:
+            raise CustomException(error_message=e, error_detail=sys)
+
+
+# command line entry point
+def main(argv:list=None):
+    """
+    Runs the training pipeline from the command line.
+
+    Input Parameters ->
+    `argv`: (list) command line arguments (default: `sys.argv[1:]`)
+    """
+    parser = argparse.ArgumentParser(description="Train the student performance model")
+    parser.add_argument("--force", action="store_true",
+                        help="ignore cached stage outputs and rerun every stage")
+    parser.add_argument("--no-publish", action="store_true",
+                        help="do not publish the trained artifacts as the current version")
+    parser.add_argument("--format", choices=sorted(DATASET_FORMATS), default=None,
+                        help="format of the raw, train & test dataset artifacts")
+    parser.add_argument("--export-csv", action="store_true",
+                        help="also save csv copies of the datasets when using a binary format")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only ingest the rows appended to the source since the last run (hash-based split)")
+    parser.add_argument("--split-key", nargs="+", default=None,
+                        help="columns hashed for the incremental train-test split (default: all columns)")
+    parser.add_argument("--prediction-table", action="store_true",
+                        help="precompute the best model's predictions over the whole input space")
+    parser.add_argument("--feature-format", choices=["dense", "sparse"], default=None,
+                        help="layout of the transformed input features")
+    parser.add_argument("--feature-dtype", choices=["float32", "float64"], default=None,
+                        help="dtype of the transformed input features")
+    args = parser.parse_args(argv)
+
+    train_pipeline = TrainPipeline(force=args.force, publish=not args.no_publish)
+    ingestion_config = train_pipeline.data_ingestion.ingestion_config
+    if args.format is not None:
+        ingestion_config.artifact_format = args.format
+    ingestion_config.export_csv = ingestion_config.export_csv or args.export_csv
+    ingestion_config.incremental = ingestion_config.incremental or args.incremental
+    if args.split_key is not None:
+        ingestion_config.split_key_columns = tuple(args.split_key)
+    transformation_config = train_pipeline.data_transformation.data_transformation_config
+    if args.feature_format is not None:
+        transformation_config.feature_format = args.feature_format
+    if args.feature_dtype is not None:
+        transformation_config.feature_dtype = args.feature_dtype
+    if args.prediction_table:
+        train_pipeline.model_trainer.model_trainer_config.export_prediction_table = True
+    model_name, model_r2_score = train_pipeline.run()
+
+    # which stages were skipped
+    print("Stage cache summary:")
+    print(train_pipeline.stage_cache.get_summary())
+    if train_pipeline.publish:
+        print(f"Serving artifact version: {train_pipeline.artifact_registry.get_current_version()}")
+    # print r2 score
+    print(f"R^2 Score of trained {model_name} model: {model_r2_score:.3f}")
+
+
+if __name__ == "__main__":
+    main()
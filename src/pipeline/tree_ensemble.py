@@ -0,0 +1,531 @@
+# DEPENDENCIES
+
+# for working with file paths, custom exception and custom logging
+import os
+import sys
+from src.exception import CustomException
+from src.logger import logging
+# for reading the trees of an XGBoost model
+import json
+# for working with arrays
+import numpy as np
+# for measuring which batch sizes the flattened ensemble is faster for
+import time
+# for hashing the model file the ensemble was exported from
+from src.pipeline.linear_scorer import get_file_hash
+
+
+# model class name -> how the predictions of its trees are combined
+TREE_ENSEMBLE_AGGREGATIONS = {
+    "DecisionTreeRegressor": "mean",
+    "RandomForestRegressor": "mean",
+    "ExtraTreesRegressor": "mean",
+    "GradientBoostingRegressor": "sum",
+    "AdaBoostRegressor": "weighted_median",
+    "XGBRegressor": "sum"
+}
+
+# largest batch predicted with the flattened ensemble if not measured on export
+DEFAULT_MAX_ROWS = 16
+
+# XGBoost objectives whose prediction is the raw sum of the trees (identity link)
+XGB_IDENTITY_OBJECTIVES = ("reg:squarederror", "reg:absoluteerror", "reg:pseudohubererror", "reg:quantileerror")
+
+
+# helper function to check if a model can be flattened
+def is_tree_ensemble(model):
+    """
+    Returns True if the input model is a (single or
+    ensemble of) regression trees supported by
+    `FlatTreeEnsemble.from_model`.
+
+    Input Parameters ->
+    `model`: trained machine learning model
+    """
+    return type(model).__name__ in TREE_ENSEMBLE_AGGREGATIONS
+
+
+# helper function to read the nodes of a fitted sklearn tree
+def _get_sklearn_tree_nodes(tree):
+    """
+    Returns the (feature, threshold, left child, right child,
+    missing goes left, value) arrays of a fitted
+    `DecisionTreeRegressor` (-1 children mark a leaf).
+    """
+    tree_ = tree.tree_
+    missing_go_to_left = getattr(tree_, "missing_go_to_left", None)
+    if missing_go_to_left is None:
+        missing_go_to_left = np.zeros(tree_.node_count, dtype=bool)
+    return (tree_.feature, tree_.threshold, tree_.children_left, tree_.children_right,
+            np.asarray(missing_go_to_left, dtype=bool), tree_.value[:, 0, 0])
+
+
+# helper function to read the nodes of the trees of a fitted XGBoost model
+def _get_xgb_trees(model):
+    """
+    Returns the base score and the node arrays
+    (as in `_get_sklearn_tree_nodes`) of every tree
+    of a fitted `XGBRegressor`.
+    """
+    booster = model.get_booster()
+    config = json.loads(booster.save_config())
+    objective = config["learner"]["objective"]["name"]
+    if objective not in XGB_IDENTITY_OBJECTIVES:
+        raise ValueError(f"XGBoost objective `{objective}` is not supported")
+    if config["learner"]["gradient_booster"]["name"] != "gbtree":
+        raise ValueError("Only the `gbtree` XGBoost booster is supported")
+    base_score = float(str(config["learner"]["learner_model_param"]["base_score"]).strip("[]"))
+
+    model_json = json.loads(booster.save_raw(raw_format="json"))
+    trees = []
+    for tree in model_json["learner"]["gradient_booster"]["model"]["trees"]:
+        left = np.asarray(tree["left_children"], dtype=np.int64)
+        is_leaf = left == -1
+        # a leaf stores its value in `split_conditions`, thresholds & values are float32
+        split_conditions = np.asarray(tree["split_conditions"], dtype=np.float32).astype(np.float64)
+        trees.append((
+            np.where(is_leaf, -2, np.asarray(tree["split_indices"], dtype=np.int64)),
+            np.where(is_leaf, 0.0, split_conditions),
+            left,
+            np.asarray(tree["right_children"], dtype=np.int64),
+            np.asarray(tree["default_left"], dtype=bool),
+            np.where(is_leaf, split_conditions, 0.0)
+        ))
+
+    return base_score, trees
+
+
+# FLAT TREE ENSEMBLE
+class FlatTreeEnsemble:
+    """
+    Tree ensemble compiled into contiguous node arrays
+    (feature, threshold, children, leaf value) shared
+    by all trees, evaluated for many rows and all
+    trees at once:
+
+        node = root of every tree (one per row & tree)
+        repeat max depth times:
+            node = children[node][x[feature[node]] > threshold[node]]
+        prediction = combine(value[node]) over the trees
+
+    A leaf points to itself, so rows which reach a
+    leaf early simply stay there.
+
+    Both sklearn & XGBoost split on float32 feature
+    values, so every split is stored as a float32
+    `x <= threshold` test: sklearn's float64 threshold
+    rounded down to float32, XGBoost's `x < threshold`
+    as `x <=` the float32 just below it. Predictions
+    match the original model within float rounding.
+
+    Numpy traversal pays per tree level rather than per
+    node, so it wins for single rows & small batches;
+    `max_rows` is the largest batch for which it was
+    measured faster than the original model on export.
+    """
+    # variables
+    def __init__(self, arrays:dict):
+        # node arrays of all trees, child indices are global
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        # (left, right) child of every node
+        self.children = arrays["children"]
+        self.missing_left = arrays["missing_left"]
+        self.value = arrays["value"]
+        # index of the root node of every tree
+        self.roots = arrays["roots"]
+        # weight of every tree (weighted median only)
+        self.tree_weights = arrays["tree_weights"]
+
+        # "mean", "sum" (base_value + scale * sum) or "weighted_median"
+        self.aggregation = str(arrays["aggregation"])
+        self.base_value = float(arrays["base_value"])
+        self.scale = float(arrays["scale"])
+        self.max_depth = int(arrays["max_depth"])
+        self.n_features = int(arrays["n_features"])
+        # largest batch this ensemble should predict (bigger batches -> original model)
+        self.max_rows = int(arrays["max_rows"])
+        # hash of the model file this ensemble was exported from
+        self.model_hash = str(arrays["model_hash"]) or None
+
+        # flat view of `children`: child of node i is at 2 * i + (go right)
+        self._flat_children = self.children.ravel()
+
+    # methods
+    @classmethod
+    def from_model(cls, model):
+        """
+        Compiles a fitted tree model (see `is_tree_ensemble`).
+
+        Input Parameters ->
+        `model`: trained `DecisionTreeRegressor`, `RandomForestRegressor`,
+                 `ExtraTreesRegressor`, `GradientBoostingRegressor`,
+                 `AdaBoostRegressor` (of trees) or `XGBRegressor`
+        """
+        try:
+            model_class_name = type(model).__name__
+            if not is_tree_ensemble(model):
+                raise ValueError(f"{model_class_name} cannot be flattened into a tree ensemble")
+
+            comparison = "le"
+            base_value = 0.0
+            scale = 1.0
+            tree_weights = None
+
+            if model_class_name == "DecisionTreeRegressor":
+                trees = [_get_sklearn_tree_nodes(model)]
+            elif model_class_name in ("RandomForestRegressor", "ExtraTreesRegressor"):
+                trees = [_get_sklearn_tree_nodes(tree) for tree in model.estimators_]
+            elif model_class_name == "GradientBoostingRegressor":
+                # raw prediction = init + learning rate * sum of the stage trees
+                if isinstance(model.init_, str) and model.init_ == "zero":
+                    base_value = 0.0
+                elif type(model.init_).__name__ == "DummyRegressor":
+                    base_value = float(model.init_.predict(np.zeros((1, model.n_features_in_)))[0])
+                else:
+                    raise ValueError("Only a constant `init` estimator is supported")
+                scale = float(model.learning_rate)
+                trees = [_get_sklearn_tree_nodes(tree) for tree in model.estimators_[:, 0]]
+            elif model_class_name == "AdaBoostRegressor":
+                # prediction = weighted median of the tree predictions
+                if not all(type(tree).__name__ == "DecisionTreeRegressor" for tree in model.estimators_):
+                    raise ValueError("Only AdaBoost of decision trees is supported")
+                trees = [_get_sklearn_tree_nodes(tree) for tree in model.estimators_]
+                tree_weights = np.asarray(model.estimator_weights_[:len(model.estimators_)], dtype=np.float64)
+            else:
+                comparison = "lt"
+                base_value, trees = _get_xgb_trees(model)
+
+            # concatenate the trees, shifting the child indices by the tree's offset
+            roots = []
+            node_arrays = [[] for _ in range(6)]
+            max_depth = 0
+            offset = 0
+            for feature, threshold, left, right, missing_left, value in trees:
+                left = np.asarray(left)
+                right = np.asarray(right)
+                node_ids = np.arange(len(left)) + offset
+                is_leaf = left < 0
+
+                # float32 `x <= threshold` test (see class docstring)
+                float32_threshold = np.asarray(threshold, dtype=np.float64).astype(np.float32)
+                if comparison == "le":
+                    rounded_up = float32_threshold.astype(np.float64) > threshold
+                else:
+                    rounded_up = np.ones(len(left), dtype=bool)
+                float32_threshold = np.where(rounded_up, np.nextafter(float32_threshold, np.float32(-np.inf)),
+                                             float32_threshold)
+
+                node_arrays[0].append(np.where(is_leaf, 0, feature))
+                node_arrays[1].append(np.where(is_leaf, np.float32(0), float32_threshold))
+                node_arrays[2].append(np.where(is_leaf, node_ids, left + offset))
+                node_arrays[3].append(np.where(is_leaf, node_ids, right + offset))
+                node_arrays[4].append(np.asarray(missing_left, dtype=bool))
+                node_arrays[5].append(np.where(is_leaf, value, 0.0))
+
+                roots.append(offset)
+                max_depth = max(max_depth, cls._get_depth(left=left, right=right))
+                offset += len(left)
+
+            # `2 * node + 1` must fit the index dtype
+            index_dtype = np.int32 if 2 * offset < 2**31 else np.int64
+            arrays = {
+                "feature": np.concatenate(node_arrays[0]).astype(index_dtype),
+                "threshold": np.concatenate(node_arrays[1]).astype(np.float32),
+                "children": np.stack([np.concatenate(node_arrays[2]),
+                                      np.concatenate(node_arrays[3])], axis=1).astype(index_dtype),
+                "missing_left": np.concatenate(node_arrays[4]),
+                "value": np.concatenate(node_arrays[5]).astype(np.float64),
+                "roots": np.asarray(roots, dtype=index_dtype),
+                "tree_weights": tree_weights if tree_weights is not None else np.ones(len(roots)),
+                "aggregation": np.array(TREE_ENSEMBLE_AGGREGATIONS[model_class_name]),
+                "base_value": np.array(base_value),
+                "scale": np.array(scale),
+                "max_depth": np.array(max_depth),
+                "n_features": np.array(model.n_features_in_),
+                "max_rows": np.array(DEFAULT_MAX_ROWS),
+                "model_hash": np.array("")
+            }
+
+            return cls(arrays=arrays)
+
+        except Exception as e:
+            raise CustomException(error_message=e, error_detail=sys)
+
+    @staticmethod
+    def _get_depth(left, right):
+        """
+        Returns the number of splits on the longest
+        path from the root (node 0) to a leaf.
+        """
+        depth = 0
+        level = np.array([0])
+        while True:
+            level = level[left[level] >= 0]
+            if len(level) == 0:
+                return depth
+            level = np.concatenate([left[level], right[level]])
+            depth += 1
+
+    def get_arrays(self):
+        """
+        Returns the node arrays and settings as a dict (for saving).
+        """
+        return {
+            "feature": self.feature, "threshold": self.threshold,
+            "children": self.children, "missing_left": self.missing_left,
+            "value": self.value, "roots": self.roots, "tree_weights": self.tree_weights,
+            "aggregation": np.array(self.aggregation),
+            "base_value": np.array(self.base_value), "scale": np.array(self.scale),
+            "max_depth": np.array(self.max_depth), "n_features": np.array(self.n_features),
+            "max_rows": np.array(self.max_rows), "model_hash": np.array(self.model_hash or "")
+        }
+
+    @classmethod
+    def load(cls, file_path:str):
+        """
+        Loads an ensemble saved by `export_tree_ensemble`.
+
+        Input Parameters ->
+        `file_path`: (str) path of the ensemble `.npz` file
+        """
+        try:
+            with np.load(file_path, allow_pickle=False) as npz_file:
+                return cls(arrays={name: npz_file[name] for name in npz_file.files})
+
+        except Exception as e:
+            raise CustomException(error_message=e, error_detail=sys)
+
+    def _get_leaf_values(self, X):
+        """
+        Returns the leaf value reached by every
+        row in every tree (rows x trees).
+        """
+        n_rows = X.shape[0]
+        flat_X = X.ravel()
+        index_dtype = self.roots.dtype
+        # position of each row's first feature in `flat_X`
+        row_offsets = (np.arange(n_rows, dtype=index_dtype) * self.n_features)[:, np.newaxis]
+        has_missing = bool(np.isnan(flat_X).any())
+
+        node = np.repeat(self.roots[np.newaxis, :], n_rows, axis=0)
+        for _ in range(self.max_depth):
+            x = flat_X[row_offsets + self.feature[node]]
+            go_right = x > self.threshold[node]
+            if has_missing:
+                go_right = np.where(np.isnan(x), ~self.missing_left[node], go_right)
+            node = self._flat_children[2 * node + go_right]
+
+        return self.value[node]
+
+    def _aggregate(self, leaf_values):
+        """
+        Combines the leaf values of the trees
+        into one prediction per row.
+        """
+        if self.aggregation == "mean":
+            return leaf_values.mean(axis=1)
+        if self.aggregation == "sum":
+            return self.base_value + self.scale * leaf_values.sum(axis=1)
+
+        # weighted median (as `AdaBoostRegressor`): prediction of the tree at which
+        # the cumulative weight of the sorted predictions reaches half of the total
+        rows = np.arange(leaf_values.shape[0])
+        sorted_index = np.argsort(leaf_values, axis=1)
+        weight_cdf = np.cumsum(self.tree_weights[sorted_index], axis=1)
+        median_or_above = weight_cdf >= 0.5 * weight_cdf[:, -1][:, np.newaxis]
+        median_trees = sorted_index[rows, median_or_above.argmax(axis=1)]
+        return leaf_values[rows, median_trees]
+
+    def measure_max_rows(self, model, X, largest_batch:int=4096, repeat:int=3):
+        """
+        Times this ensemble against the original model on
+        batches of 1, 2, 4, ... rows and returns the largest
+        batch size up to which the ensemble is faster
+        (0 if it is slower even for a single row).
+
+        Input Parameters ->
+        `model`: the model this ensemble was compiled from
+        `X`: (array) transformed input features to time with (repeated if too few rows)
+        `largest_batch`: (int) largest batch size to try
+        `repeat`: (int) timings per batch size (the fastest one counts)
+        """
+        X = np.asarray(X.toarray() if hasattr(X, "toarray") else X, dtype=np.float32)
+        max_rows = 0
+        n_rows = 1
+        while n_rows <= largest_batch:
+            batch = np.resize(X, (n_rows, X.shape[1]))
+            timings = {}
+            for name, predict_function in (("model", model.predict), ("ensemble", self.predict)):
+                predict_function(batch)
+                timings[name] = min(
+                    self._time_call(predict_function, batch) for _ in range(repeat)
+                )
+            if timings["ensemble"] >= timings["model"]:
+                break
+            max_rows = n_rows
+            n_rows *= 2
+
+        return max_rows
+
+    @staticmethod
+    def _time_call(function, argument):
+        start_time = time.perf_counter()
+        function(argument)
+        return time.perf_counter() - start_time
+
+    def predict(self, X, batch_size:int=2048):
+        """
+        Returns the predictions (array) for the
+        transformed input features.
+
+        Input Parameters ->
+        `X`: (array or sparse matrix) transformed input features
+        `batch_size`: (int) rows evaluated together (bounds the rows x trees work arrays)
+        """
+        if hasattr(X, "toarray"):
+            X = X.toarray()
+        # sklearn & XGBoost both split on float32 feature values
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"X has {X.shape[1]} features, the ensemble expects {self.n_features}")
+
+        if X.shape[0] <= batch_size:
+            return self._aggregate(self._get_leaf_values(X))
+
+        predictions = np.empty(X.shape[0], dtype=np.float64)
+        for start in range(0, X.shape[0], batch_size):
+            stop = start + batch_size
+            predictions[start:stop] = self._aggregate(self._get_leaf_values(X[start:stop]))
+        return predictions
+
+
+# TREE ENSEMBLE CACHE
+class TreeEnsembleCache:
+    """
+    Process-wide cache for the exported tree ensemble.
+
+    The ensemble is used only if it was exported from
+    the model file currently on disk, so an ensemble
+    left behind by an older training run is never served.
+    """
+    # variables
+    def __init__(self, ensemble_path:str, model_path:str):
+        self.ensemble_path = ensemble_path
+        self.model_path = model_path
+        # (signature of ensemble & model files, ensemble or None)
+        self._entry = None
+
+    # methods
+    def _get_signature(self):
+        """
+        Returns the modification time & size of the
+        ensemble and model files (None if the ensemble does not exist).
+        """
+        try:
+            ensemble_stats = os.stat(self.ensemble_path)
+            model_stats = os.stat(self.model_path)
+        except FileNotFoundError:
+            return None
+        return (ensemble_stats.st_mtime_ns, ensemble_stats.st_size,
+                model_stats.st_mtime_ns, model_stats.st_size)
+
+    def get_ensemble(self):
+        """
+        Returns the current `FlatTreeEnsemble`, or None if
+        there is no ensemble matching the saved model.
+        """
+        signature = self._get_signature()
+        if signature is None:
+            return None
+
+        entry = self._entry
+        if entry is not None and entry[0] == signature:
+            return entry[1]
+
+        tree_ensemble = FlatTreeEnsemble.load(file_path=self.ensemble_path)
+        if tree_ensemble.model_hash != get_file_hash(self.model_path):
+            logging.info(msg="Tree ensemble does not match the saved model, ignoring it")
+            tree_ensemble = None
+        else:
+            logging.info(msg="Tree ensemble loaded")
+
+        self._entry = (signature, tree_ensemble)
+        return tree_ensemble
+
+
+# export step
+def export_tree_ensemble(model, file_path:str, model_file_path:str=None, X_sample=None):
+    """
+    Flattens the fitted tree model into a
+    `FlatTreeEnsemble` and saves it as a `.npz` file.
+
+    Input Parameters ->
+    `model`: trained tree model (see `is_tree_ensemble`)
+    `file_path`: (str) path where the ensemble `.npz` file is to be saved
+    `model_file_path`: (str) path of the saved model, its hash is stored
+                       so that a stale ensemble can be detected
+    `X_sample`: (array) transformed input features, if given the batch sizes
+                the ensemble is used for are measured on them (see `measure_max_rows`)
+    """
+    try:
+        tree_ensemble = FlatTreeEnsemble.from_model(model)
+        tree_ensemble.model_hash = None if model_file_path is None else get_file_hash(model_file_path)
+        if X_sample is not None:
+            tree_ensemble.max_rows = tree_ensemble.measure_max_rows(model=model, X=X_sample)
+
+        # save the ensemble through a temporary file so that readers never see a partial file
+        os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+        temp_file_path = f"{file_path}.tmp.npz"
+        np.savez(temp_file_path, **tree_ensemble.get_arrays())
+        os.replace(temp_file_path, file_path)
+
+        logging.info(msg=f"Tree ensemble of {len(tree_ensemble.roots)} trees "
+                         f"({len(tree_ensemble.feature)} nodes) exported to {file_path}, "
+                         f"used for batches of up to {tree_ensemble.max_rows} rows")
+
+        return tree_ensemble
+
+    except Exception as e:
+        raise CustomException(error_message=e, error_detail=sys)
+
+
+if __name__ == "__main__":
+    # flatten each tree model family trained on the saved artifacts and compare it against the original
+    import pandas as pd
+    from src.utils import load_object
+    from src.components.model_trainer import create_model
+
+    data_preprocessor = load_object(file_path=os.path.join("artifact", "preprocessor.pkl"))
+    train_df = pd.read_csv(os.path.join("artifact", "train.csv"))
+    test_df = pd.read_csv(os.path.join("artifact", "test.csv"))
+    X_train = data_preprocessor.transform(train_df).astype(np.float32)
+    X_test = data_preprocessor.transform(test_df).astype(np.float32)
+    y_train = train_df["writing_score"].to_numpy()
+
+    for model_name, parameters in (("Decision Tree", {}),
+                                   ("Random Forest Regressor", {"n_estimators": 128}),
+                                   ("Gradient Boost Regressor", {"n_estimators": 128, "subsample": 0.8}),
+                                   ("Ada Boost Regressor", {"n_estimators": 64}),
+                                   ("XGB Regressor", {"n_estimators": 128})):
+        model = create_model(model_name, **parameters).fit(X_train, y_train)
+        tree_ensemble = FlatTreeEnsemble.from_model(model)
+
+        max_difference = np.max(np.abs(tree_ensemble.predict(X_test) - model.predict(X_test)))
+        max_rows = tree_ensemble.measure_max_rows(model=model, X=X_test)
+
+        timings = []
+        for n_rows in (1, 64, 10000):
+            batch = np.resize(X_test, (n_rows, X_test.shape[1]))
+            number = max(1, 200 // n_rows)
+            timings.append([
+                min(sum(FlatTreeEnsemble._time_call(predict_function, batch) for _ in range(number))
+                    for _ in range(3)) / number * 1e3
+                for predict_function in (model.predict, tree_ensemble.predict)
+            ])
+
+        print(f"{model_name:<25} max abs difference {max_difference:.2e} | faster up to {max_rows:>4} rows | "
+              + " | ".join(f"{n_rows} rows {model_time:.3f} -> {ensemble_time:.3f} ms"
+                           for n_rows, (model_time, ensemble_time) in zip((1, 64, 10000), timings)))
@@ -6,14 +6,25 @@ import sys
 from src.exception import CustomException
 from src.logger import logging
 # for working with dataframes and arrays
+# (sklearn, scipy & the model search are imported inside the functions using them,
+# so that loading objects for serving does not pay for importing them)
 import pandas as pd
 import numpy as np
-# for machine learning model evaluation
-from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
-# for hyperparameter tuning
-from sklearn.model_selection import GridSearchCV
 # for saving objects
 import dill
+# for saving dataset schemas
+import json
+# for replacing dataset directories
+import shutil
+
+
+# file extension (or directory suffix) of each dataset artifact format
+DATASET_FORMATS = {
+    "csv": ".csv",           # human readable, types are re-parsed on load
+    "parquet": ".parquet",   # columnar & compressed, needs `pyarrow`
+    "feather": ".feather",   # columnar & memory-mappable, needs `pyarrow`
+    "npy": "_npy"            # directory with one (memory-mappable) `.npy` file per column
+}
 
 
 # utility function 1
@@ -33,10 +44,15 @@ def save_object(file_path:str, obj):
         # create directory if it does not exist already
         os.makedirs(dir_path, exist_ok=True)
 
-        # save the object (write byte mode)
-        with open(file_path, "wb") as file_object:
+        # save the object (write byte mode) into a temporary file first
+        temp_file_path = f"{file_path}.tmp"
+        with open(temp_file_path, "wb") as file_object:
             dill.dump(obj, file_object)
 
+        # then move it onto the final path in a single (atomic) step
+        # so that readers never see a partially written object
+        os.replace(temp_file_path, file_path)
+
         logging.info(msg="Object saved successfully")
         
     except Exception as e:
@@ -47,14 +63,19 @@ def save_object(file_path:str, obj):
 def evaluate_model(X_train, y_train,
                    X_test, y_test,
                    models:dict, params:dict,
-                   cv=3):
+                   cv=3, n_jobs=None,
+                   search:str="grid", search_options:dict=None,
+                   warm_start:bool=True):
     """
     Trains the input machine learning models,
     evaluates its performance on Test set
     using R^2 (Coefficient of Determination) metric.
 
-    Returns a `report` (dict) containing
-    model's name as key and R^2 score as value.
+    Returns a dict containing model's name as key
+    and a `ModelSearchResult` as value, which holds
+    the best model (already refit on the training set),
+    its best parameters, test set R^2 score (`test_score`)
+    and the table of cross validated parameter sets.
     
     Input Parameters ->
     X_train, y_train: (array) Training set
@@ -66,50 +87,39 @@ def evaluate_model(X_train, y_train,
             hyperparameter tuning using Grid search CV.
             key: model name (str)
             value: (dict) parameter grid
+    n_jobs: (int) if given, all models' (parameter set, CV fold) fits
+            are spread over this many processes (-1 -> all cores),
+            otherwise models are grid searched one after another
+    search: (str) "grid" for exhaustive grid search, or "halving" for
+            budget-aware successive halving (see `successive_halving_search`)
+    search_options: (dict) extra options for the halving search,
+            e.g. {"max_fits": 500, "time_budget": 60, "factor": 3}
+    warm_start: (bool) if True, ensembles (Random Forest, Gradient Boosting,
+            Ada Boost, XGBoost) are fit once per combination of their other
+            parameters and scored at every `n_estimators` in the grid
     """
     try:
-        # for storing the evaluation scores for each model
-        report = {}
-
-        models_names:str = list(models.keys())      # Names of models
-        models_objects = list(models.values())      # Instances of models
-
-        # iterate over all models and train-predict-evaluate
-        for i in range(len(models_names)):
-            # get the model object
-            model = models_objects[i]
-
-            # get parameter grid
-            parameter_grid = params[models_names[i]]
-
-            # create grid search cv object
-            gs = GridSearchCV(estimator=model, param_grid=parameter_grid,
-                              cv=cv, verbose=False)
-            # fit to training set to find best hyperparameter values
-            gs.fit(X_train, y_train)
-
-            # get best parameter values' dict
-            best_parameters:dict = gs.best_params_
-            
-            # set model's parameters to the values found by Grid search
-            model.set_params(**best_parameters)
+        # for hyperparameter tuning
+        from src.model_search import parallel_grid_search, successive_halving_search
 
-            # fit model to training set
-            model.fit(X_train, y_train)
-            
-            # predict on training and test sets
-            y_train_predictions = model.predict(X_train)
-            y_test_predictions = model.predict(X_test)
+        # successive halving search (drops bad parameter sets early on subsamples)
+        if search == "halving":
+            return successive_halving_search(X_train=X_train, y_train=y_train,
+                                             X_test=X_test, y_test=y_test,
+                                             models=models, params=params,
+                                             cv=cv, n_jobs=1 if n_jobs is None else n_jobs,
+                                             warm_start=warm_start,
+                                             **(search_options or {}))
+        elif search != "grid":
+            raise ValueError(f"Unknown search method: {search}")
 
-            # evaluate model performance
-            train_model_score = r2_score(y_true=y_train, y_pred=y_train_predictions)
-            test_model_score = r2_score(y_true=y_test, y_pred=y_test_predictions)
-
-            # store test set evaluation result for current model
-            report[models_names[i]] = test_model_score
-
-        return report
-          
+        # exhaustive grid search across models, parameter sets and CV folds
+        # (runs in this process, one fit after another, if `n_jobs` is None)
+        return parallel_grid_search(X_train=X_train, y_train=y_train,
+                                    X_test=X_test, y_test=y_test,
+                                    models=models, params=params,
+                                    cv=cv, n_jobs=1 if n_jobs is None else n_jobs,
+                                    warm_start=warm_start)
 
     except Exception as e:
         raise CustomException(error_message=e, error_detail=sys)
@@ -133,3 +143,349 @@ def load_object(file_path):
 
     except Exception as e:
         raise CustomException(error_message=e, error_detail=sys)
+
+
+# utility function 4
+def get_dataset_path(file_path:str, file_format:str):
+    """
+    Returns the path of a dataset artifact
+    in the given format, e.g.
+    `artifact/train.csv` -> `artifact/train.parquet`.
+
+    Input Parameters ->
+    `file_path`: (str) path of the dataset (any format)
+    `file_format`: (str) one of `DATASET_FORMATS`
+    """
+    if file_format not in DATASET_FORMATS:
+        raise ValueError(f"Unknown dataset format: {file_format}")
+
+    # strip the suffix of whichever format the input path has
+    for suffix in DATASET_FORMATS.values():
+        if file_path.endswith(suffix):
+            file_path = file_path[:-len(suffix)]
+            break
+
+    return file_path + DATASET_FORMATS[file_format]
+
+
+# utility function 5
+def get_dataset_format(file_path:str):
+    """
+    Returns the format of a dataset
+    artifact from its file extension,
+    e.g. `artifact/train.parquet` -> `parquet`.
+
+    Input Parameters ->
+    `file_path`: (str) path of the dataset
+    """
+    for file_format, suffix in DATASET_FORMATS.items():
+        if file_path.endswith(suffix):
+            return file_format
+    raise ValueError(f"Unknown dataset format of {file_path}")
+
+
+# utility function 6
+def save_dataframe(df:pd.DataFrame, file_path:str):
+    """
+    Generic utility function for saving
+    a dataframe in the format given by
+    the file extension (see `DATASET_FORMATS`).
+
+    Binary formats keep the column dtypes,
+    including categorical columns.
+
+    Input Parameters ->
+    `df`: (dataframe) The dataframe to be saved
+    `file_path`: (str) The relative path where dataframe is to be saved
+    """
+    try:
+        file_format = get_dataset_format(file_path)
+        os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+
+        if file_format == "csv":
+            df.to_csv(file_path, index=False, header=True)
+
+        elif file_format == "parquet":
+            df.to_parquet(file_path, index=False)
+
+        elif file_format == "feather":
+            # feather needs a default index
+            df.reset_index(drop=True).to_feather(file_path)
+
+        elif file_format == "npy":
+            # write into a temporary directory first, then move it into place
+            temp_dir_path = f"{file_path}.tmp"
+            shutil.rmtree(temp_dir_path, ignore_errors=True)
+            os.makedirs(temp_dir_path)
+
+            schema = []
+            for i, column in enumerate(df.columns):
+                column_file_name = f"{i}.npy"
+                if isinstance(df[column].dtype, pd.CategoricalDtype) or df[column].dtype == object:
+                    # categorical column -> integer codes + list of categories
+                    categorical_column = df[column].astype("category")
+                    np.save(os.path.join(temp_dir_path, column_file_name),
+                            categorical_column.cat.codes.to_numpy())
+                    schema.append({"name": column, "file": column_file_name,
+                                   "categories": categorical_column.cat.categories.tolist()})
+                else:
+                    np.save(os.path.join(temp_dir_path, column_file_name), df[column].to_numpy())
+                    schema.append({"name": column, "file": column_file_name})
+
+            with open(os.path.join(temp_dir_path, "schema.json"), "w") as file_object:
+                json.dump(schema, file_object, indent=2)
+
+            shutil.rmtree(file_path, ignore_errors=True)
+            os.replace(temp_dir_path, file_path)
+
+        logging.info(msg=f"Dataframe saved as {file_format} successfully")
+
+    except Exception as e:
+        raise CustomException(error_message=e, error_detail=sys)
+
+
+# utility function 7
+def load_dataframe(file_path:str, memory_map:bool=True):
+    """
+    Generic utility function for loading
+    a dataframe saved by `save_dataframe`.
+
+    Input Parameters ->
+    `file_path`: (str) The relative path where dataframe exists
+    `memory_map`: (bool) memory-map binary files instead of
+                  reading them into memory (where the format allows it)
+    """
+    try:
+        file_format = get_dataset_format(file_path)
+
+        if file_format == "csv":
+            return pd.read_csv(file_path)
+
+        if file_format == "parquet":
+            return pd.read_parquet(file_path, memory_map=memory_map)
+
+        if file_format == "feather":
+            from pyarrow import feather
+            return feather.read_table(file_path, memory_map=memory_map).to_pandas()
+
+        # npy: one array per column
+        with open(os.path.join(file_path, "schema.json"), "r") as file_object:
+            schema = json.load(file_object)
+
+        columns = {}
+        for column in schema:
+            values = np.load(os.path.join(file_path, column["file"]),
+                             mmap_mode="r" if memory_map else None)
+            if "categories" in column:
+                values = pd.Categorical.from_codes(values, categories=column["categories"])
+            columns[column["name"]] = values
+
+        return pd.DataFrame(data=columns, copy=False)
+
+    except Exception as e:
+        raise CustomException(error_message=e, error_detail=sys)
+
+
+# utility function 8
+def save_arrays(arrays:dict, dir_path:str):
+    """
+    Generic utility function for saving arrays
+    (and CSR matrices) as `.npy` files in a directory,
+    so that they can be memory-mapped by `load_arrays`.
+
+    Input Parameters ->
+    `arrays`: (dict) array name -> array or CSR matrix
+    `dir_path`: (str) The relative path of the directory where arrays are to be saved
+    """
+    try:
+        import scipy.sparse as sp
+
+        # write into a temporary directory first, then move it into place
+        temp_dir_path = f"{dir_path}.tmp"
+        shutil.rmtree(temp_dir_path, ignore_errors=True)
+        os.makedirs(temp_dir_path)
+
+        schema = {}
+        for array_name, array in arrays.items():
+            if sp.issparse(array):
+                # a CSR matrix is saved as its three component arrays
+                array = sp.csr_matrix(array)
+                for part in ("data", "indices", "indptr"):
+                    np.save(os.path.join(temp_dir_path, f"{array_name}.{part}.npy"), getattr(array, part))
+                schema[array_name] = {"format": "csr", "shape": list(array.shape)}
+            else:
+                np.save(os.path.join(temp_dir_path, f"{array_name}.npy"), np.ascontiguousarray(array))
+                schema[array_name] = {"format": "dense"}
+
+        with open(os.path.join(temp_dir_path, "schema.json"), "w") as file_object:
+            json.dump(schema, file_object, indent=2)
+
+        shutil.rmtree(dir_path, ignore_errors=True)
+        os.replace(temp_dir_path, dir_path)
+
+        logging.info(msg=f"Arrays {list(arrays)} saved successfully")
+
+    except Exception as e:
+        raise CustomException(error_message=e, error_detail=sys)
+
+
+# utility function 9
+def load_arrays(dir_path:str, memory_map:bool=True):
+    """
+    Generic utility function for loading
+    arrays saved by `save_arrays`.
+
+    Memory-mapped arrays are read-only and their pages
+    are shared by every process which opens them (joblib
+    passes them to worker processes by file name instead
+    of pickling their contents).
+
+    Input Parameters ->
+    `dir_path`: (str) The relative path of the directory where arrays exist
+    `memory_map`: (bool) memory-map the arrays instead of reading them into memory
+    """
+    try:
+        with open(os.path.join(dir_path, "schema.json"), "r") as file_object:
+            schema = json.load(file_object)
+
+        mmap_mode = "r" if memory_map else None
+        arrays = {}
+        if any(array_schema["format"] == "csr" for array_schema in schema.values()):
+            import scipy.sparse as sp
+        for array_name, array_schema in schema.items():
+            if array_schema["format"] == "csr":
+                data, indices, indptr = (
+                    np.load(os.path.join(dir_path, f"{array_name}.{part}.npy"), mmap_mode=mmap_mode)
+                    for part in ("data", "indices", "indptr")
+                )
+                arrays[array_name] = sp.csr_matrix((data, indices, indptr),
+                                                   shape=tuple(array_schema["shape"]), copy=False)
+            else:
+                arrays[array_name] = np.load(os.path.join(dir_path, f"{array_name}.npy"), mmap_mode=mmap_mode)
+
+        return arrays
+
+    except Exception as e:
+        raise CustomException(error_message=e, error_detail=sys)
+
+
+# utility function 10
+def iter_dataframe_chunks(file_path:str, chunk_size:int=100_000):
+    """
+    Generic utility function for reading a dataset
+    saved by `save_dataframe` (or any csv file) in
+    chunks of at most `chunk_size` rows, so that only
+    one chunk is held in memory at a time.
+
+    Input Parameters ->
+    `file_path`: (str) The relative path where dataframe exists
+    `chunk_size`: (int) maximum number of rows per chunk
+    """
+    try:
+        file_format = get_dataset_format(file_path)
+
+        if file_format == "csv":
+            with pd.read_csv(file_path, chunksize=chunk_size) as reader:
+                yield from reader
+            return
+
+        if file_format == "parquet":
+            from pyarrow import parquet
+            parquet_file = parquet.ParquetFile(file_path)
+            for record_batch in parquet_file.iter_batches(batch_size=chunk_size):
+                yield record_batch.to_pandas()
+            return
+
+        # feather & npy are memory-mapped, a chunk only reads its own rows
+        df = load_dataframe(file_path, memory_map=True)
+        for start in range(0, len(df), chunk_size):
+            yield df.iloc[start:start + chunk_size].reset_index(drop=True)
+
+    except Exception as e:
+        raise CustomException(error_message=e, error_detail=sys)
+
+
+# helper function to check that rows have the columns of a dataset
+def _check_columns(df:pd.DataFrame, columns:list, file_path:str):
+    missing_columns = [column for column in columns if column not in df.columns]
+    extra_columns = [column for column in df.columns if column not in columns]
+    if missing_columns or extra_columns:
+        raise ValueError(f"Rows appended to {file_path} do not have its columns "
+                         f"(missing: {missing_columns}, unexpected: {extra_columns})")
+
+
+# utility function 11
+def append_dataframe(df:pd.DataFrame, file_path:str):
+    """
+    Generic utility function for appending
+    rows to a dataset saved by `save_dataframe`
+    (the dataset is created if it does not exist).
+
+    csv files are appended in place, so the cost is
+    proportional to the new rows; binary formats are
+    loaded, extended and saved again. The rows are
+    written in the column order of the dataset, a
+    ValueError is raised if the columns differ.
+
+    Input Parameters ->
+    `df`: (dataframe) The rows to be appended (same columns as the dataset, in any order)
+    `file_path`: (str) The relative path where dataframe exists
+    """
+    try:
+        file_format = get_dataset_format(file_path)
+
+        if not os.path.exists(file_path):
+            save_dataframe(df=df, file_path=file_path)
+            return
+
+        if file_format == "csv":
+            # header only: the rows of the file are not read
+            columns = list(pd.read_csv(file_path, nrows=0).columns)
+            _check_columns(df=df, columns=columns, file_path=file_path)
+            df[columns].to_csv(file_path, mode="a", index=False, header=False)
+            logging.info(msg=f"{len(df)} rows appended to {file_path} successfully")
+            return
+
+        # read fully into memory: the file is replaced below
+        existing_df = load_dataframe(file_path, memory_map=False)
+        _check_columns(df=df, columns=list(existing_df.columns), file_path=file_path)
+        categorical_columns = [
+            column for column in existing_df.columns
+            if isinstance(existing_df[column].dtype, pd.CategoricalDtype)
+        ]
+        combined_df = pd.concat([existing_df, df[existing_df.columns]], ignore_index=True)
+        # categoricals with different categories are concatenated as objects
+        for column in categorical_columns:
+            combined_df[column] = combined_df[column].astype("category")
+
+        save_dataframe(df=combined_df, file_path=file_path)
+
+    except Exception as e:
+        raise CustomException(error_message=e, error_detail=sys)
+
+
+# utility function 12
+def format_features(features, feature_format:str="dense", feature_dtype:str="float32"):
+    """
+    Generic utility function for returning the
+    transformed input features in the input layout
+    (dense array or CSR matrix) and dtype, without
+    copying if they already are.
+
+    Input Parameters ->
+    `features`: (array or sparse matrix) output of a data preprocessor
+    `feature_format`: (str) "dense" (2D array) or "sparse" (CSR matrix)
+    `feature_dtype`: (str) dtype of the returned features
+    """
+    import scipy.sparse as sp
+
+    feature_dtype = np.dtype(feature_dtype)
+
+    if feature_format == "sparse":
+        return sp.csr_matrix(features, dtype=feature_dtype)
+    if feature_format == "dense":
+        if sp.issparse(features):
+            return features.toarray().astype(feature_dtype, copy=False)
+        return np.ascontiguousarray(features, dtype=feature_dtype)
+
+    raise ValueError(f"Unknown feature format: {feature_format}")
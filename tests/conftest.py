@@ -0,0 +1,62 @@
+# DEPENDENCIES
+
+# for working with file paths
+import os
+# for working with dataframes
+import pandas as pd
+import pytest
+
+# DataTransformation specification of the preprocessor
+from src.components.data_transformation import DataTransformation
+# for loading the shipped artifacts
+from src.utils import load_object
+
+
+# shipped artifacts the parity tests run against
+ARTIFACT_DIR_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "artifact")
+
+
+@pytest.fixture(scope="session")
+def train_df():
+    return pd.read_csv(os.path.join(ARTIFACT_DIR_PATH, "train.csv"))
+
+
+@pytest.fixture(scope="session")
+def test_df():
+    return pd.read_csv(os.path.join(ARTIFACT_DIR_PATH, "test.csv"))
+
+
+@pytest.fixture(scope="session")
+def data_preprocessor():
+    return load_object(file_path=os.path.join(ARTIFACT_DIR_PATH, "preprocessor.pkl"))
+
+
+@pytest.fixture(scope="session")
+def model():
+    return load_object(file_path=os.path.join(ARTIFACT_DIR_PATH, "model.pkl"))
+
+
+@pytest.fixture(scope="session")
+def ignore_unknown_preprocessor(train_df):
+    # same specification as the shipped preprocessor, but unseen categories become all-zero features
+    data_preprocessor = DataTransformation().get_data_transformer_object()
+    data_preprocessor.set_params(categorical_transformer__one_hot_encoder__handle_unknown="ignore")
+    return data_preprocessor.fit(train_df)
+
+
+@pytest.fixture(scope="session")
+def missing_values_df(test_df):
+    # every input column missing in some rows (imputed by the preprocessor)
+    df = test_df.head(40).copy()
+    for i, column in enumerate(["math_score", "reading_score", "gender", "race_ethnicity",
+                                "parental_level_of_education", "lunch", "test_preparation_course"]):
+        df.loc[df.index[i::7], column] = None
+    return df
+
+
+@pytest.fixture(scope="session")
+def unseen_categories_df(test_df):
+    df = test_df.head(10).copy()
+    df.loc[df.index[::2], "race_ethnicity"] = "group Z"
+    df.loc[df.index[1::3], "lunch"] = "unknown lunch"
+    return df
@@ -0,0 +1,60 @@
+# DEPENDENCIES
+
+# for working with file paths & custom exceptions
+import os
+import sys
+import pytest
+
+from src.exception import CustomException
+from src.pipeline.predict_pipeline import PredictPipeline
+from tests.conftest import ARTIFACT_DIR_PATH
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # the artifact cache serves `artifact/` relative to the project directory
+    monkeypatch.chdir(os.path.dirname(ARTIFACT_DIR_PATH))
+    from application import app
+    return app.test_client()
+
+
+@pytest.fixture
+def records(test_df):
+    return test_df.head(3).to_dict(orient="records")
+
+
+def test_predict_batch(client, records):
+    response = client.post("/api/predict_batch", json={"records": records})
+
+    assert response.status_code == 200
+    assert response.get_json()["count"] == 3
+
+
+def test_invalid_input_is_a_client_error_with_a_clean_message(client, records):
+    response = client.post("/api/predict_batch", json=[{"gender": "female"}])
+    assert response.status_code == 400
+    assert response.get_json()["error"].startswith("Missing input features: ")
+
+    records[1] = {**records[1], "gender": "other", "math_score": "abc"}
+    response = client.post("/api/predict_batch", json=records)
+    assert response.status_code == 400
+    assert response.get_json()["invalid_records"] == [
+        {"index": 1, "error": "math_score `abc` is not a number; unknown gender `other`"}
+    ]
+
+    response = client.post("/api/predict_batch", data="not,a\ncsv", content_type="text/plain")
+    assert response.status_code == 400
+
+
+def test_server_side_failure_is_a_generic_server_error(client, records, monkeypatch):
+    def failing_predict(self, features):
+        try:
+            raise ValueError("X has 18 features, but LinearRegression is expecting 19 features as input")
+        except Exception as e:
+            raise CustomException(error_message=e, error_detail=sys)
+
+    monkeypatch.setattr(PredictPipeline, "predict", failing_predict)
+    response = client.post("/api/predict_batch", json=records)
+
+    assert response.status_code == 500
+    assert response.get_json() == {"error": "Internal server error"}
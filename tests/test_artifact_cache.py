@@ -0,0 +1,130 @@
+# DEPENDENCIES
+
+# for working with file paths & switching threads more often
+import os
+import sys
+# for serving requests from several threads
+import threading
+import pytest
+# for fitting a second model to publish
+from sklearn.linear_model import Ridge
+
+# artifact cache serving the shipped artifacts
+from src.pipeline.artifact_cache import ArtifactCache, ArtifactCacheConfig
+from src.pipeline.artifact_registry import ArtifactRegistry, ArtifactRegistryConfig
+from src.utils import save_object
+from tests.conftest import ARTIFACT_DIR_PATH
+
+
+@pytest.fixture
+def artifact_registry(tmp_path):
+    artifact_registry = ArtifactRegistry(config=ArtifactRegistryConfig(
+        versions_dir_path=str(tmp_path / "versions"), current_pointer_path=str(tmp_path / "CURRENT")
+    ))
+    # first version: the shipped artifacts
+    artifact_registry.publish(files={
+        "model.pkl": os.path.join(ARTIFACT_DIR_PATH, "model.pkl"),
+        "preprocessor.pkl": os.path.join(ARTIFACT_DIR_PATH, "preprocessor.pkl")
+    })
+    return artifact_registry
+
+
+# helper function to publish a version with another model file (not activated)
+def _publish_model(artifact_registry, model_path):
+    return artifact_registry.publish(files={
+        "model.pkl": str(model_path),
+        "preprocessor.pkl": os.path.join(ARTIFACT_DIR_PATH, "preprocessor.pkl")
+    }, activate=False)
+
+
+# helper function to wait for the background reload of the cache to finish
+def _wait_for_reload(artifact_cache):
+    reload_thread = artifact_cache._reload_thread
+    if reload_thread is not None:
+        reload_thread.join(timeout=30)
+        assert not reload_thread.is_alive()
+
+
+def test_counters_are_exact_under_concurrent_requests(tmp_path):
+    artifact_cache = ArtifactCache(config=ArtifactCacheConfig(
+        model_path=os.path.join(ARTIFACT_DIR_PATH, "model.pkl"),
+        preprocessor_path=os.path.join(ARTIFACT_DIR_PATH, "preprocessor.pkl"),
+        # nothing published -> the files above are served
+        registry_config=ArtifactRegistryConfig(versions_dir_path=str(tmp_path),
+                                               current_pointer_path=os.path.join(tmp_path, "CURRENT"))
+    ))
+    # first request loads the artifacts (1 miss)
+    artifact_cache.get_artifacts()
+
+    n_threads, n_requests = 8, 2_000
+    # switch threads as often as possible so that unguarded increments would lose updates
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        threads = [threading.Thread(target=lambda: [artifact_cache.get_version() for _ in range(n_requests)])
+                   for _ in range(n_threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+
+    assert artifact_cache.get_stats() == {"hits": n_threads * n_requests, "misses": 1,
+                                          "reloads": 0, "failed_reloads": 0}
+
+
+def test_activated_version_is_served_after_its_warm_up(artifact_registry, data_preprocessor, train_df, tmp_path):
+    artifact_cache = ArtifactCache(config=ArtifactCacheConfig(registry_config=artifact_registry.registry_config))
+    first_version = artifact_cache.get_version()
+    assert first_version.version == artifact_registry.get_current_version()
+    first_version.get_artifacts()
+
+    model_path = tmp_path / "model.pkl"
+    save_object(file_path=str(model_path),
+                obj=Ridge(alpha=1.0).fit(data_preprocessor.transform(train_df), train_df["math_score"]))
+    second_version = _publish_model(artifact_registry, model_path)
+
+    # the warm-up of the new version waits until the test lets it finish
+    warm_up_started, finish_warm_up = threading.Event(), threading.Event()
+    def warm_up(artifact_version):
+        if artifact_version.version == second_version:
+            warm_up_started.set()
+            assert finish_warm_up.wait(timeout=30)
+    artifact_cache.register_warm_up(warm_up)
+
+    artifact_registry.activate(second_version)
+    try:
+        assert artifact_cache.get_version() is first_version
+        assert warm_up_started.wait(timeout=30)
+        # new version loaded but not warmed up yet -> requests keep the previous version
+        assert artifact_cache.get_version() is first_version
+        assert artifact_cache.get_served_version() == first_version.version
+    finally:
+        finish_warm_up.set()
+    _wait_for_reload(artifact_cache)
+
+    assert artifact_cache.get_version().version == second_version
+    assert isinstance(artifact_cache.get_artifacts()[0], Ridge)
+    assert artifact_cache.get_stats()["reloads"] == 1
+
+
+def test_version_failing_to_load_keeps_the_previous_one(artifact_registry, tmp_path):
+    artifact_cache = ArtifactCache(config=ArtifactCacheConfig(registry_config=artifact_registry.registry_config))
+    first_version = artifact_cache.get_version()
+    first_version.get_artifacts()
+
+    model_path = tmp_path / "model.pkl"
+    model_path.write_bytes(b"not a pickled model")
+    artifact_registry.activate(_publish_model(artifact_registry, model_path))
+
+    assert artifact_cache.get_version() is first_version
+    _wait_for_reload(artifact_cache)
+
+    # the broken version is not retried on every request
+    for _ in range(3):
+        assert artifact_cache.get_version() is first_version
+        _wait_for_reload(artifact_cache)
+    assert artifact_cache.get_stats()["failed_reloads"] == 1
+    assert artifact_cache.get_stats()["reloads"] == 0
+
@@ -0,0 +1,48 @@
+# DEPENDENCIES
+
+# for working with file paths
+import os
+
+from src.pipeline.artifact_registry import ArtifactRegistry, ArtifactRegistryConfig
+
+
+# helper function to publish a version whose single file has the input contents
+def _publish(artifact_registry, tmp_path, contents, activate=True):
+    file_path = tmp_path / "model.pkl"
+    file_path.write_text(contents)
+    return artifact_registry.publish(files={"model.pkl": str(file_path)}, activate=activate)
+
+
+def test_publish_activates_the_version_and_reuses_unchanged_artifacts(tmp_path):
+    artifact_registry = ArtifactRegistry(config=ArtifactRegistryConfig(
+        versions_dir_path=str(tmp_path / "versions"), current_pointer_path=str(tmp_path / "CURRENT")
+    ))
+    assert artifact_registry.get_current_version() is None
+
+    first_version = _publish(artifact_registry, tmp_path, contents="first model")
+    second_version = _publish(artifact_registry, tmp_path, contents="second model", activate=False)
+    assert artifact_registry.get_current_version() == first_version
+
+    # same files again -> the existing version is activated instead of copied
+    assert _publish(artifact_registry, tmp_path, contents="second model") == second_version
+    assert artifact_registry.get_current_version() == second_version
+    assert sorted(artifact_registry.list_versions()) == sorted([first_version, second_version])
+    with open(os.path.join(artifact_registry.get_version_path(second_version), "model.pkl")) as file_object:
+        assert file_object.read() == "second model"
+
+
+def test_prune_never_removes_the_current_version(tmp_path):
+    artifact_registry = ArtifactRegistry(config=ArtifactRegistryConfig(
+        versions_dir_path=str(tmp_path / "versions"), current_pointer_path=str(tmp_path / "CURRENT"),
+        keep_versions=1
+    ))
+    current_version = _publish(artifact_registry, tmp_path, contents="model 0")
+
+    # newer versions which are not activated (e.g. rejected updates)
+    for i in range(1, 4):
+        _publish(artifact_registry, tmp_path, contents=f"model {i}", activate=False)
+        versions = artifact_registry.list_versions()
+        assert current_version in versions
+        assert len(versions) == 2
+
+    assert artifact_registry.get_current_version() == current_version
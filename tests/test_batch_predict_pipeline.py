@@ -0,0 +1,81 @@
+# DEPENDENCIES
+
+# for working with file paths
+import os
+# for working with dataframes
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.exception import CustomException
+from src.pipeline.batch_predict_pipeline import BatchPredictConfig, BatchPredictPipeline
+from src.pipeline.predict_pipeline import CustomBatchData, PredictPipeline
+from tests.conftest import ARTIFACT_DIR_PATH
+
+
+# rows of the input file which cannot be scored
+UNKNOWN_CATEGORY_ROW, NOT_A_NUMBER_ROW = 3, 11
+
+
+@pytest.fixture
+def input_path(test_df, tmp_path, monkeypatch):
+    # the artifact cache serves `artifact/` relative to the project directory
+    monkeypatch.chdir(os.path.dirname(ARTIFACT_DIR_PATH))
+    df = test_df.head(15).astype({"math_score": object})
+    # a blank score is imputed, an unknown category or a score which is not a number cannot be scored
+    df.loc[7, "math_score"] = None
+    df.loc[UNKNOWN_CATEGORY_ROW, "gender"] = "other"
+    df.loc[NOT_A_NUMBER_ROW, "math_score"] = "abc"
+    input_path = str(tmp_path / "students.csv")
+    df.to_csv(input_path, index=False)
+    return input_path
+
+
+# helper function to run the batch scorer with the input settings
+def _score(input_path, output_path, **settings):
+    batch_summary = BatchPredictPipeline(config=BatchPredictConfig(**settings)).run(input_path=input_path,
+                                                                                     output_path=output_path)
+    return batch_summary, pd.read_csv(output_path)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2])
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_predictions_match_the_prediction_pipeline(input_path, tmp_path, chunk_size, n_jobs):
+    batch_summary, output_df = _score(input_path, str(tmp_path / "scores.csv"), chunk_size=chunk_size, n_jobs=n_jobs)
+
+    input_df = pd.read_csv(input_path)
+    assert batch_summary["n_rows"] == len(input_df)
+    assert batch_summary["n_errors"] == 2
+    # input rows are written in input order
+    pd.testing.assert_frame_equal(output_df[["gender", "reading_score"]], input_df[["gender", "reading_score"]])
+
+    is_error = np.zeros(len(input_df), dtype=bool)
+    is_error[[UNKNOWN_CATEGORY_ROW, NOT_A_NUMBER_ROW]] = True
+    assert output_df["prediction_error"].notna().to_numpy().tolist() == is_error.tolist()
+    assert output_df.loc[UNKNOWN_CATEGORY_ROW, "prediction_error"] == "unknown gender `other`"
+    assert output_df.loc[NOT_A_NUMBER_ROW, "prediction_error"] == "math_score `abc` is not a number"
+    assert output_df.loc[is_error, "predicted_avg_score"].isna().all()
+
+    features_df = CustomBatchData(data_df=input_df[~is_error]).get_data_as_dataframe()
+    # the shipped `LinearRegression` has huge cancelling coefficients, so its own
+    # predictions change in the 3rd decimal with the batch size
+    np.testing.assert_allclose(output_df.loc[~is_error, "predicted_avg_score"],
+                               PredictPipeline().predict(features_df), rtol=0, atol=5e-3)
+
+
+def test_rows_which_cannot_be_scored_can_be_skipped(input_path, tmp_path):
+    batch_summary, output_df = _score(input_path, str(tmp_path / "scores.csv"), chunk_size=4, on_error="skip",
+                                      predictions_only=True)
+
+    assert batch_summary["n_errors"] == 2
+    assert list(output_df.columns) == ["predicted_avg_score"]
+    assert len(output_df) == batch_summary["n_rows"] - 2
+    assert output_df["predicted_avg_score"].notna().all()
+
+
+def test_failed_run_writes_no_output(input_path, tmp_path):
+    output_path = str(tmp_path / "scores.csv")
+    with pytest.raises(CustomException, match="Row 4 cannot be scored: unknown gender"):
+        BatchPredictPipeline(config=BatchPredictConfig(chunk_size=2, on_error="fail")).run(input_path=input_path,
+                                                                                           output_path=output_path)
+    assert os.listdir(tmp_path) == ["students.csv"]
@@ -0,0 +1,50 @@
+# DEPENDENCIES
+
+# for working with arrays
+import numpy as np
+import pytest
+
+from src.pipeline.compiled_preprocessor import CompiledPreprocessor
+
+
+# helper function to transform every record of a dataframe with the compiled preprocessor
+def _transform_records(compiled_preprocessor, df):
+    return np.vstack([
+        compiled_preprocessor.transform_record(record=record)
+        for record in df.to_dict(orient="records")
+    ])
+
+
+# helper function to get the dense output of `preprocessor.transform`
+def _transform(data_preprocessor, df):
+    features = data_preprocessor.transform(df)
+    return features.toarray() if hasattr(features, "toarray") else features
+
+
+def test_matches_transform_on_test_set(data_preprocessor, test_df):
+    compiled_preprocessor = CompiledPreprocessor.from_column_transformer(data_preprocessor)
+    # bit-for-bit, not approximately
+    assert np.array_equal(_transform_records(compiled_preprocessor, test_df),
+                          _transform(data_preprocessor, test_df))
+
+
+def test_matches_transform_with_missing_values(data_preprocessor, missing_values_df):
+    compiled_preprocessor = CompiledPreprocessor.from_column_transformer(data_preprocessor)
+    assert np.array_equal(_transform_records(compiled_preprocessor, missing_values_df),
+                          _transform(data_preprocessor, missing_values_df))
+
+
+def test_unseen_categories_raise_like_transform(data_preprocessor, unseen_categories_df):
+    # the shipped one hot encoder uses `handle_unknown="error"`
+    compiled_preprocessor = CompiledPreprocessor.from_column_transformer(data_preprocessor)
+    record = unseen_categories_df.iloc[[0]]
+    with pytest.raises(ValueError):
+        data_preprocessor.transform(record)
+    with pytest.raises(ValueError):
+        compiled_preprocessor.transform_record(record=record.to_dict(orient="records")[0])
+
+
+def test_matches_transform_with_ignored_unseen_categories(ignore_unknown_preprocessor, unseen_categories_df):
+    compiled_preprocessor = CompiledPreprocessor.from_column_transformer(ignore_unknown_preprocessor)
+    assert np.array_equal(_transform_records(compiled_preprocessor, unseen_categories_df),
+                          _transform(ignore_unknown_preprocessor, unseen_categories_df))
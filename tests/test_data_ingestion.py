@@ -0,0 +1,96 @@
+# DEPENDENCIES
+
+# for working with file paths
+import os
+# for working with dataframes
+import pandas as pd
+import pytest
+
+from src.components.data_ingestion import DataIngestion
+from src.utils import load_dataframe
+# shipped artifacts the parity tests run against
+from tests.conftest import ARTIFACT_DIR_PATH
+
+
+# source dataset of the ingestion
+SOURCE_DATA_PATH = os.path.join(os.path.dirname(ARTIFACT_DIR_PATH), "notebook", "data", "stud.csv")
+
+
+# helper function to read the lines of the source dataset
+def _read_source_lines():
+    with open(SOURCE_DATA_PATH, "rb") as file_object:
+        return file_object.read().splitlines(keepends=True)
+
+
+# helper function to set up an incremental data ingestion in a directory
+def _get_data_ingestion(source_data_path, artifact_dir_path, artifact_format="csv"):
+    data_ingestion = DataIngestion()
+    ingestion_config = data_ingestion.ingestion_config
+    ingestion_config.source_data_path = str(source_data_path)
+    ingestion_config.raw_data_path = str(artifact_dir_path / "raw.csv")
+    ingestion_config.train_data_path = str(artifact_dir_path / "train.csv")
+    ingestion_config.test_data_path = str(artifact_dir_path / "test.csv")
+    ingestion_config.ingestion_state_path = str(artifact_dir_path / "ingestion_state.json")
+    ingestion_config.artifact_format = artifact_format
+    ingestion_config.incremental = True
+    return data_ingestion
+
+
+# helper function to load an ingested dataset (categoricals as plain values)
+def _load_dataset(file_path):
+    df = load_dataframe(file_path, memory_map=False)
+    return df.astype({column: object for column in df.select_dtypes(include="category").columns})
+
+
+@pytest.mark.parametrize("artifact_format", ["csv", "parquet"])
+def test_appended_rows_do_not_move_ingested_rows(artifact_format, tmp_path):
+    lines = _read_source_lines()
+    source_data_path = tmp_path / "stud.csv"
+    source_data_path.write_bytes(b"".join(lines[:601]))
+    data_ingestion = _get_data_ingestion(source_data_path, tmp_path / "artifact", artifact_format=artifact_format)
+
+    train_data_path, test_data_path = data_ingestion.initiate_incremental_data_ingestion()
+    first_train_df, first_test_df = _load_dataset(train_data_path), _load_dataset(test_data_path)
+    assert len(first_train_df) + len(first_test_df) == 600
+
+    with open(source_data_path, "ab") as file_object:
+        file_object.write(b"".join(lines[601:]))
+    train_data_path, test_data_path = data_ingestion.initiate_incremental_data_ingestion()
+    train_df, test_df = _load_dataset(train_data_path), _load_dataset(test_data_path)
+    assert len(train_df) + len(test_df) == len(lines) - 1
+    assert len(test_df) > len(first_test_df)
+
+    # rows ingested by the first run keep their set and their order
+    pd.testing.assert_frame_equal(test_df.head(len(first_test_df)), first_test_df)
+    pd.testing.assert_frame_equal(train_df.head(len(first_train_df)), first_train_df)
+
+    # ingesting the whole source at once reproduces the split
+    full_ingestion = _get_data_ingestion(source_data_path, tmp_path / "full_artifact", artifact_format=artifact_format)
+    full_train_data_path, full_test_data_path = full_ingestion.initiate_incremental_data_ingestion()
+    pd.testing.assert_frame_equal(_load_dataset(full_test_data_path), test_df)
+    pd.testing.assert_frame_equal(_load_dataset(full_train_data_path), train_df)
+
+
+def test_partial_last_line_is_ingested_by_the_next_run(tmp_path):
+    lines = _read_source_lines()
+    source_data_path = tmp_path / "stud.csv"
+    # the writer of the source is in the middle of the 101st row
+    partial_line = lines[101][:len(lines[101]) // 2]
+    source_data_path.write_bytes(b"".join(lines[:101]) + partial_line)
+    data_ingestion = _get_data_ingestion(source_data_path, tmp_path / "artifact")
+
+    data_ingestion.initiate_incremental_data_ingestion()
+    raw_data_path = data_ingestion.ingestion_config.raw_data_path
+    assert len(load_dataframe(raw_data_path)) == 100
+
+    with open(source_data_path, "ab") as file_object:
+        file_object.write(lines[101][len(partial_line):] + b"".join(lines[102:201]))
+    train_data_path, test_data_path = data_ingestion.initiate_incremental_data_ingestion()
+
+    source_df = pd.read_csv(source_data_path)
+    pd.testing.assert_frame_equal(load_dataframe(raw_data_path), source_df)
+
+    full_ingestion = _get_data_ingestion(source_data_path, tmp_path / "full_artifact")
+    full_train_data_path, full_test_data_path = full_ingestion.initiate_incremental_data_ingestion()
+    pd.testing.assert_frame_equal(load_dataframe(test_data_path), load_dataframe(full_test_data_path))
+    pd.testing.assert_frame_equal(load_dataframe(train_data_path), load_dataframe(full_train_data_path))
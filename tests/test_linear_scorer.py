@@ -0,0 +1,74 @@
+# DEPENDENCIES
+
+# for evaluating the model without rounding errors
+from fractions import Fraction
+# for working with arrays
+import numpy as np
+import pytest
+from sklearn.linear_model import Ridge
+
+from src.pipeline.linear_scorer import export_linear_scorer, LinearScorer
+
+
+# helper function to score every record of a dataframe with the linear scorer
+def _score_records(linear_scorer, df):
+    return np.array([linear_scorer.score_record(record=record) for record in df.to_dict(orient="records")])
+
+
+# helper function to evaluate a linear model exactly on the transformed features
+def _exact_predictions(model, data_preprocessor, df):
+    features = data_preprocessor.transform(df)
+    coefficients = [Fraction(float(coef)) for coef in model.coef_]
+    intercept = Fraction(float(np.ravel(model.intercept_)[0]))
+    return np.array([
+        float(intercept + sum(coef * Fraction(float(value)) for coef, value in zip(coefficients, row)))
+        for row in features
+    ])
+
+
+def test_matches_exact_model_on_test_set(model, data_preprocessor, test_df, tmp_path):
+    # the shipped `LinearRegression` has huge cancelling coefficients, so `model.predict` itself
+    # rounds; the scorer is folded exactly and must match the exact evaluation of the model
+    linear_scorer = export_linear_scorer(model=model, data_preprocessor=data_preprocessor,
+                                         file_path=str(tmp_path / "linear_scorer.json"))
+    scorer_predictions = _score_records(linear_scorer, test_df)
+    np.testing.assert_allclose(scorer_predictions, _exact_predictions(model, data_preprocessor, test_df),
+                               rtol=0, atol=1e-9)
+    np.testing.assert_allclose(scorer_predictions, model.predict(data_preprocessor.transform(test_df)),
+                               rtol=0, atol=1e-2)
+
+
+def test_matches_predict_with_missing_values(data_preprocessor, train_df, missing_values_df, tmp_path):
+    features = data_preprocessor.transform(train_df)
+    target = (train_df["math_score"] + train_df["writing_score"] + train_df["reading_score"]) / 3
+    ridge_model = Ridge(alpha=1.0).fit(features, target)
+
+    export_linear_scorer(model=ridge_model, data_preprocessor=data_preprocessor,
+                         file_path=str(tmp_path / "linear_scorer.json"))
+    # also checks the saved `.json` round trip
+    linear_scorer = LinearScorer.load(file_path=str(tmp_path / "linear_scorer.json"))
+    np.testing.assert_allclose(_score_records(linear_scorer, missing_values_df),
+                               ridge_model.predict(data_preprocessor.transform(missing_values_df)),
+                               rtol=0, atol=1e-9)
+
+
+def test_unseen_category_raises(model, data_preprocessor, unseen_categories_df, tmp_path):
+    linear_scorer = export_linear_scorer(model=model, data_preprocessor=data_preprocessor,
+                                         file_path=str(tmp_path / "linear_scorer.json"))
+    with pytest.raises(ValueError):
+        linear_scorer.score_record(record=unseen_categories_df.to_dict(orient="records")[0])
+
+
+def test_matches_predict_with_ignored_unseen_categories(ignore_unknown_preprocessor, train_df, unseen_categories_df,
+                                                        tmp_path):
+    features = ignore_unknown_preprocessor.transform(train_df)
+    target = (train_df["math_score"] + train_df["writing_score"] + train_df["reading_score"]) / 3
+    ridge_model = Ridge(alpha=1.0).fit(features, target)
+
+    export_linear_scorer(model=ridge_model, data_preprocessor=ignore_unknown_preprocessor,
+                         file_path=str(tmp_path / "linear_scorer.json"))
+    linear_scorer = LinearScorer.load(file_path=str(tmp_path / "linear_scorer.json"))
+    np.testing.assert_allclose(_score_records(linear_scorer, unseen_categories_df),
+                               ridge_model.predict(ignore_unknown_preprocessor.transform(unseen_categories_df)),
+                               rtol=0, atol=1e-9)
+
@@ -0,0 +1,48 @@
+# DEPENDENCIES
+
+# for running the logger in a fresh process (it is configured from environment variables on import)
+import os
+import sys
+import json
+import subprocess
+
+
+# project root (the `src` package)
+PROJECT_DIR_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# helper function to log an exception in a fresh process and return the log file contents
+def _log_exception(tmp_path, **environment):
+    script = (
+        "from src.logger import logging\n"
+        "try:\n"
+        "    1 / 0\n"
+        "except ZeroDivisionError:\n"
+        "    logging.exception('division failed for %s', 'student 42')\n"
+    )
+    subprocess.run([sys.executable, "-c", script], cwd=tmp_path, check=True,
+                   env={**os.environ, "PYTHONPATH": PROJECT_DIR_PATH, **environment})
+    with open(os.path.join(tmp_path, "logs", "ml.log"), "r") as file_object:
+        return file_object.read()
+
+
+def test_async_json_log_keeps_the_exception_field(tmp_path):
+    log_record = json.loads(_log_exception(tmp_path, LOG_MODE="async", LOG_FORMAT="json").strip())
+    assert log_record["message"] == "division failed for student 42"
+    assert "ZeroDivisionError" in log_record["exception"]
+
+
+def test_async_text_log_keeps_the_traceback(tmp_path):
+    log_text = _log_exception(tmp_path, LOG_MODE="async", LOG_FORMAT="text")
+    assert "division failed for student 42" in log_text
+    assert "Traceback" in log_text and "ZeroDivisionError" in log_text
+
+
+def test_stderr_destination_writes_no_log_file(tmp_path):
+    script = "from src.logger import logging\nlogging.info('scored a batch')\n"
+    completed_process = subprocess.run([sys.executable, "-c", script], cwd=tmp_path, check=True,
+                                       capture_output=True, text=True,
+                                       env={**os.environ, "PYTHONPATH": PROJECT_DIR_PATH,
+                                            "LOG_DESTINATION": "stderr", "LOG_FORMAT": "json"})
+    assert json.loads(completed_process.stderr.strip())["message"] == "scored a batch"
+    assert not os.path.exists(os.path.join(tmp_path, "logs"))
@@ -0,0 +1,56 @@
+# DEPENDENCIES
+
+# for running worker processes
+import multiprocessing
+
+from src.metrics import MetricsRegistry
+
+
+# helper function to record the metrics of requests in a separate (forked) worker process
+def _handle_requests(metrics, n_requests):
+    process = multiprocessing.get_context("fork").Process(target=_record_requests, args=(metrics, n_requests))
+    process.start()
+    process.join()
+    return process.pid
+
+
+# helper function to record the metrics of requests & save them for the other processes
+def _record_requests(metrics, n_requests):
+    for _ in range(n_requests):
+        metrics.increment("requests_total", help_text="Number of handled requests", endpoint="predict")
+        metrics.observe("request_duration_seconds", 0.003, help_text="Time spent handling a request")
+    metrics.flush()
+
+
+def test_render_sums_the_metrics_of_all_processes(tmp_path):
+    metrics = MetricsRegistry(multiprocess_dir=str(tmp_path))
+    metrics.register_collector(lambda: [("memory_bytes", "gauge", "Memory of the process", {}, 100)])
+
+    worker_pids = [_handle_requests(metrics, n_requests) for n_requests in (3, 4)]
+    _record_requests(metrics, 1)
+    output = metrics.render()
+
+    assert 'ml_requests_total{endpoint="predict"} 8' in output
+    assert 'ml_request_duration_seconds_bucket{le="0.005"} 8' in output
+    assert "ml_request_duration_seconds_count 8" in output
+    # gauges are per process
+    for pid in worker_pids:
+        assert f'ml_memory_bytes{{pid="{pid}"}} 100' in output
+
+    # an exited worker keeps counting, but its gauges are dropped
+    metrics.mark_process_dead(worker_pids[0])
+    output = metrics.render()
+    assert 'ml_requests_total{endpoint="predict"} 8' in output
+    assert f'ml_memory_bytes{{pid="{worker_pids[0]}"}}' not in output
+    assert f'ml_memory_bytes{{pid="{worker_pids[1]}"}} 100' in output
+
+
+def test_render_without_multiprocess_dir_is_per_process():
+    metrics = MetricsRegistry()
+    metrics.register_collector(lambda: [("memory_bytes", "gauge", "Memory of the process", {}, 100)])
+    for _ in range(2):
+        metrics.increment("requests_total", endpoint="predict")
+
+    output = metrics.render()
+    assert 'ml_requests_total{endpoint="predict"} 2' in output
+    assert "ml_memory_bytes 100" in output
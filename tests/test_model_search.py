@@ -0,0 +1,27 @@
+# DEPENDENCIES
+
+# for working with arrays
+import numpy as np
+from sklearn.linear_model import LinearRegression
+from sklearn.tree import DecisionTreeRegressor
+
+from src.utils import evaluate_model
+
+
+def test_linear_models_are_fitted_on_float64(data_preprocessor, train_df, test_df):
+    # float32 features (the default `feature_dtype`) must not make the coefficients float32
+    X_train = data_preprocessor.transform(train_df).astype(np.float32)
+    X_test = data_preprocessor.transform(test_df).astype(np.float32)
+    y_train = ((train_df["math_score"] + train_df["writing_score"] + train_df["reading_score"]) / 3).to_numpy()
+    y_test = ((test_df["math_score"] + test_df["writing_score"] + test_df["reading_score"]) / 3).to_numpy()
+
+    model_results = evaluate_model(X_train=X_train, y_train=y_train, X_test=X_test, y_test=y_test,
+                                   models={"Linear Regression": LinearRegression(),
+                                           "Decision Tree": DecisionTreeRegressor(random_state=0)},
+                                   params={"Linear Regression": {}, "Decision Tree": {}})
+
+    linear_model = model_results["Linear Regression"].best_estimator
+    assert linear_model.coef_.dtype == np.float64
+    expected_model = LinearRegression().fit(X_train.astype(np.float64), y_train)
+    np.testing.assert_array_equal(linear_model.predict(X_test.astype(np.float64)),
+                                  expected_model.predict(X_test.astype(np.float64)))
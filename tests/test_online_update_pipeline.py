@@ -0,0 +1,71 @@
+# DEPENDENCIES
+
+# for working with file paths & copying the shipped artifacts
+import os
+import shutil
+import pytest
+
+from src.exception import CustomException
+from src.pipeline.online_update_pipeline import OnlineUpdateConfig, OnlineUpdatePipeline
+from tests.conftest import ARTIFACT_DIR_PATH
+
+
+@pytest.fixture
+def artifact_dir(tmp_path, monkeypatch):
+    # every default artifact path is relative -> resolved inside `tmp_path`
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("artifact")
+    for file_name in ("model.pkl", "preprocessor.pkl"):
+        shutil.copy(os.path.join(ARTIFACT_DIR_PATH, file_name), os.path.join("artifact", file_name))
+    return tmp_path / "artifact"
+
+
+def test_update_is_scored_on_held_out_rows(artifact_dir, test_df):
+    # the new rows drifted: the current model underestimates them
+    new_df = test_df.assign(writing_score=test_df["writing_score"] + 6)
+
+    update_summary = OnlineUpdatePipeline(publish=False).run(df=new_df)
+
+    assert update_summary["n_holdout_rows"] == 40
+    assert update_summary["n_rows"] == len(new_df) - 40
+    assert update_summary["r2_score_after"] > update_summary["r2_score_before"]
+
+
+def test_update_of_the_shipped_linear_regression_is_published(artifact_dir, model, test_df):
+    # rows from the training distribution: the SGD continuation scores a bit below the exact
+    # least squares fit it continues, within `max_r2_drop`
+    assert type(model).__name__ == "LinearRegression"
+
+    online_update_pipeline = OnlineUpdatePipeline()
+    update_summary = online_update_pipeline.run(df=test_df)
+
+    assert update_summary["r2_score_after"] >= update_summary["r2_score_before"] - OnlineUpdateConfig().max_r2_drop
+    assert update_summary["version"] is not None
+    assert online_update_pipeline.artifact_registry.get_current_version() == update_summary["version"]
+
+
+def test_update_worse_on_held_out_rows_is_refused(artifact_dir, test_df):
+    # a learning rate far too large makes SGD diverge (the R^2 floor is disabled)
+    online_config = OnlineUpdateConfig(sgd_parameters={"alpha": 1e-4, "eta0": 100.0}, min_r2_score=float("-inf"))
+
+    with pytest.raises(CustomException, match="below the current model's"):
+        OnlineUpdatePipeline(config=online_config, publish=False).run(df=test_df)
+
+
+def test_too_few_rows_to_hold_out_are_refused(artifact_dir, test_df):
+    with pytest.raises(CustomException, match="Too few new rows"):
+        OnlineUpdatePipeline(publish=False).run(df=test_df.head(2))
+
+
+def test_unpublished_update_leaves_the_served_artifacts_untouched(artifact_dir, test_df, tmp_path):
+    served_files = {file_name: (artifact_dir / file_name).read_bytes() for file_name in os.listdir(artifact_dir)}
+    new_df = test_df.assign(writing_score=test_df["writing_score"] + 6)
+    scratch_dir_path = str(tmp_path / "scratch")
+
+    update_summary = OnlineUpdatePipeline(config=OnlineUpdateConfig(scratch_dir_path=scratch_dir_path),
+                                          publish=False).run(df=new_df)
+
+    assert update_summary["version"] is None
+    assert update_summary["artifacts_dir_path"] == scratch_dir_path
+    assert sorted(os.listdir(scratch_dir_path)) == ["linear_scorer.json", "model.pkl", "preprocessor.pkl"]
+    assert {file_name: (artifact_dir / file_name).read_bytes() for file_name in os.listdir(artifact_dir)} == served_files
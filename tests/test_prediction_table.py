@@ -0,0 +1,48 @@
+# DEPENDENCIES
+
+# for working with arrays
+import numpy as np
+from sklearn.linear_model import Ridge
+
+from src.pipeline.prediction_table import export_prediction_table
+
+
+# small score ranges keep the exported table (and the test) small
+NUMERICAL_RANGES = {"math_score": (40, 80), "reading_score": (40, 80)}
+
+
+def test_lookups_match_the_model(data_preprocessor, train_df, test_df, tmp_path):
+    # a well-conditioned model: the shipped `LinearRegression` has huge cancelling coefficients,
+    # so its own predictions already change in the 3rd decimal with the batch size
+    features = data_preprocessor.transform(train_df)
+    target = (train_df["math_score"] + train_df["writing_score"] + train_df["reading_score"]) / 3
+    model = Ridge(alpha=1.0).fit(features, target)
+
+    prediction_table = export_prediction_table(model=model, data_preprocessor=data_preprocessor,
+                                               file_path=str(tmp_path / "prediction_table.npy"),
+                                               numerical_ranges=NUMERICAL_RANGES)
+
+    in_range = np.ones(len(test_df), dtype=bool)
+    for column, (low, high) in NUMERICAL_RANGES.items():
+        in_range &= test_df[column].between(low, high).to_numpy()
+    in_range_df = test_df[in_range]
+    assert len(in_range_df) > 0
+
+    table_predictions = np.array([prediction_table.lookup(record=record)
+                                  for record in in_range_df.to_dict(orient="records")])
+    # float64 storage: only the summation order of the batched `predict` may differ
+    # (a float32 table would be off by up to ~4e-6 near 100)
+    np.testing.assert_allclose(table_predictions, model.predict(data_preprocessor.transform(in_range_df)),
+                               rtol=0, atol=1e-11)
+
+
+def test_records_outside_the_table_return_none(model, data_preprocessor, test_df, unseen_categories_df, tmp_path):
+    prediction_table = export_prediction_table(model=model, data_preprocessor=data_preprocessor,
+                                               file_path=str(tmp_path / "prediction_table.npy"),
+                                               numerical_ranges=NUMERICAL_RANGES)
+    record = test_df.to_dict(orient="records")[0]
+
+    assert prediction_table.lookup(record={**record, "math_score": 81}) is None
+    assert prediction_table.lookup(record={**record, "math_score": 60.5, "reading_score": 60}) is None
+    assert prediction_table.lookup(record={**record, "reading_score": None}) is None
+    assert prediction_table.lookup(record=unseen_categories_df.to_dict(orient="records")[0]) is None
@@ -0,0 +1,63 @@
+# DEPENDENCIES
+
+# for working with file paths & measuring the memory used while hashing
+import os
+import tracemalloc
+# for working with arrays
+import numpy as np
+import scipy.sparse as sp
+
+from src.pipeline.stage_cache import StageCache
+from src.pipeline.train_pipeline import _iter_array_blocks
+
+
+def test_key_depends_on_the_contents_not_on_how_they_are_split():
+    assert StageCache.get_key("ab", "c") != StageCache.get_key("a", "bc")
+    assert StageCache.get_key("abc") == StageCache.get_key(b"abc")
+    assert StageCache.get_key([b"ab", b"c"], "d") == StageCache.get_key([b"ab", b"c"], "d")
+    assert StageCache.get_key([b"ab", b"c"], "d") != StageCache.get_key([b"ab"], [b"c", b"d"])
+
+
+def test_directory_key_depends_on_file_names_and_contents(tmp_path):
+    for dir_name, files in (("a", {"x.npy": b"12", "y.npy": b"3"}), ("b", {"x.npy": b"1", "y.npy": b"23"}),
+                            ("c", {"x.npy": b"12", "z.npy": b"3"}), ("d", {"x.npy": b"12", "y.npy": b"3"})):
+        os.makedirs(tmp_path / dir_name)
+        for file_name, contents in files.items():
+            (tmp_path / dir_name / file_name).write_bytes(contents)
+
+    keys = {dir_name: StageCache.get_key(StageCache.iter_file_blocks(str(tmp_path / dir_name)))
+            for dir_name in "abcd"}
+    assert keys["a"] == keys["d"]
+    assert len({keys["a"], keys["b"], keys["c"]}) == 3
+
+
+def test_array_key_matches_for_memory_mapped_and_in_memory_arrays(tmp_path):
+    array = np.arange(12, dtype=np.float32).reshape(3, 4)
+    np.save(tmp_path / "array.npy", array)
+    memory_mapped_array = np.load(tmp_path / "array.npy", mmap_mode="r")
+
+    assert (StageCache.get_key(_iter_array_blocks(memory_mapped_array))
+            == StageCache.get_key(_iter_array_blocks(array)))
+    assert (StageCache.get_key(_iter_array_blocks(array))
+            != StageCache.get_key(_iter_array_blocks(array.reshape(4, 3))))
+    assert (StageCache.get_key(_iter_array_blocks(sp.csr_matrix(array)))
+            != StageCache.get_key(_iter_array_blocks(array)))
+
+
+def test_hashing_does_not_copy_the_inputs(tmp_path):
+    # 32 MB file and memory-mapped array
+    array = np.lib.format.open_memmap(tmp_path / "array.npy", mode="w+", dtype=np.float64, shape=(4_000_000,))
+    array[:] = 1.0
+    array.flush()
+    memory_mapped_array = np.load(tmp_path / "array.npy", mmap_mode="r")
+
+    tracemalloc.start()
+    try:
+        StageCache.get_key(StageCache.iter_file_blocks(str(tmp_path / "array.npy")),
+                           _iter_array_blocks(memory_mapped_array))
+        _, peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    # a few 1 MB read blocks at most
+    assert peak_bytes < 4 * 2**20
@@ -0,0 +1,22 @@
+# DEPENDENCIES
+
+# for working with file paths
+import os
+
+from src.pipeline.streaming_train_pipeline import StreamingTrainConfig, StreamingTrainPipeline
+from tests.conftest import ARTIFACT_DIR_PATH
+
+
+def test_unpublished_run_leaves_the_served_artifacts_untouched(tmp_path, monkeypatch):
+    # every default artifact path is relative -> resolved inside `tmp_path`
+    monkeypatch.chdir(tmp_path)
+    scratch_dir_path = str(tmp_path / "scratch")
+    streaming_config = StreamingTrainConfig(source_data_path=os.path.join(ARTIFACT_DIR_PATH, "train.csv"),
+                                            chunk_size=300, n_epochs=2, scratch_dir_path=scratch_dir_path)
+
+    streaming_train_pipeline = StreamingTrainPipeline(config=streaming_config, publish=False)
+    streaming_train_pipeline.run()
+
+    assert streaming_train_pipeline.artifacts_dir_path == scratch_dir_path
+    assert sorted(os.listdir(scratch_dir_path)) == ["linear_scorer.json", "model.pkl", "preprocessor.pkl"]
+    assert not os.path.exists(tmp_path / "artifact")
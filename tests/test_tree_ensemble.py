@@ -0,0 +1,74 @@
+# DEPENDENCIES
+
+# for working with arrays
+import numpy as np
+import pytest
+
+# tree model families as created by the model trainer
+from src.components.model_trainer import create_model
+from src.pipeline.tree_ensemble import FlatTreeEnsemble, export_tree_ensemble, is_tree_ensemble
+
+
+# model name -> (constructor parameters, largest allowed difference to the model's own predictions)
+TREE_MODELS = {
+    "Decision Tree": ({"random_state": 0}, 1e-10),
+    "Random Forest Regressor": ({"n_estimators": 32, "random_state": 0}, 1e-10),
+    "Gradient Boost Regressor": ({"n_estimators": 32, "subsample": 0.8, "random_state": 0}, 1e-10),
+    "Ada Boost Regressor": ({"n_estimators": 16, "random_state": 0}, 1e-10),
+    # XGBoost sums its float32 leaf values in float32
+    "XGB Regressor": ({"n_estimators": 32, "random_state": 0}, 1e-4)
+}
+
+
+# helper function to train a model on the transformed training split
+def _fit(model_name, data_preprocessor, train_df):
+    parameters, _ = TREE_MODELS[model_name]
+    X_train = data_preprocessor.transform(train_df).astype(np.float32)
+    return create_model(model_name, **parameters).fit(X_train, train_df["writing_score"].to_numpy())
+
+
+@pytest.mark.parametrize("model_name", TREE_MODELS)
+def test_predictions_match_the_model(model_name, data_preprocessor, train_df, test_df, missing_values_df):
+    model = _fit(model_name, data_preprocessor, train_df)
+    assert is_tree_ensemble(model)
+    tree_ensemble = FlatTreeEnsemble.from_model(model)
+
+    _, tolerance = TREE_MODELS[model_name]
+    for df in (test_df, missing_values_df):
+        X = data_preprocessor.transform(df).astype(np.float32)
+        # a small batch size also covers the batched evaluation
+        np.testing.assert_allclose(tree_ensemble.predict(X, batch_size=64), model.predict(X),
+                                   rtol=0, atol=tolerance)
+    # single row
+    np.testing.assert_allclose(tree_ensemble.predict(X[0]), model.predict(X[:1]), rtol=0, atol=tolerance)
+
+
+@pytest.mark.parametrize("model_name", ["Decision Tree", "XGB Regressor"])
+def test_missing_feature_values_follow_the_model(model_name, data_preprocessor, train_df, test_df):
+    # both families learn a direction for missing values when trained with them
+    X_train = data_preprocessor.transform(train_df).astype(np.float32)
+    X_train[::5, -1] = np.nan
+    X_train[1::7, -2] = np.nan
+    parameters, tolerance = TREE_MODELS[model_name]
+    model = create_model(model_name, **parameters).fit(X_train, train_df["writing_score"].to_numpy())
+
+    X = data_preprocessor.transform(test_df).astype(np.float32)
+    X[::3, -1] = np.nan
+    X[1::4, -2] = np.nan
+    np.testing.assert_allclose(FlatTreeEnsemble.from_model(model).predict(X), model.predict(X),
+                               rtol=0, atol=tolerance)
+
+
+def test_exported_ensemble_loads_back(data_preprocessor, train_df, test_df, tmp_path):
+    model = _fit("Random Forest Regressor", data_preprocessor, train_df)
+    file_path = str(tmp_path / "tree_ensemble.npz")
+    tree_ensemble = export_tree_ensemble(model=model, file_path=file_path)
+
+    loaded_ensemble = FlatTreeEnsemble.load(file_path)
+    X = data_preprocessor.transform(test_df)
+    np.testing.assert_array_equal(loaded_ensemble.predict(X), tree_ensemble.predict(X))
+    assert loaded_ensemble.max_rows == tree_ensemble.max_rows
+
+
+def test_other_models_are_not_flattened(model):
+    assert not is_tree_ensemble(model)
@@ -0,0 +1,28 @@
+# DEPENDENCIES
+
+# for working with dataframes
+import pandas as pd
+import pytest
+
+from src.exception import CustomException
+from src.utils import append_dataframe, load_dataframe
+
+
+@pytest.mark.parametrize("file_name", ["rows.csv", "rows.feather"])
+def test_append_dataframe_follows_the_column_order_of_the_dataset(file_name, tmp_path):
+    file_path = str(tmp_path / file_name)
+    append_dataframe(df=pd.DataFrame(data={"gender": ["female"], "math_score": [72]}), file_path=file_path)
+    append_dataframe(df=pd.DataFrame(data={"math_score": [69], "gender": ["male"]}), file_path=file_path)
+
+    pd.testing.assert_frame_equal(load_dataframe(file_path, memory_map=False),
+                                  pd.DataFrame(data={"gender": ["female", "male"], "math_score": [72, 69]}))
+
+
+@pytest.mark.parametrize("columns", [["gender"], ["gender", "math_score", "reading_score"]])
+def test_append_dataframe_rejects_other_columns(columns, tmp_path):
+    file_path = str(tmp_path / "rows.csv")
+    append_dataframe(df=pd.DataFrame(data={"gender": ["female"], "math_score": [72]}), file_path=file_path)
+
+    with pytest.raises(CustomException, match="do not have its columns"):
+        append_dataframe(df=pd.DataFrame(data={column: [0] for column in columns}), file_path=file_path)
+    assert len(load_dataframe(file_path)) == 1